@@ -1,23 +1,51 @@
-"""Control the hue lamps from Philips using Python."""
+"""Control the hue lamps from Philips using Python.
+
+The heavy submodules are imported on first use, so that the command line
+interface only pays for what a subcommand needs.
+"""
 
-from lively_lights import environment
-from lively_lights import scenes
 from lively_lights.cli import get_parser
-from lively_lights.environment import ReachableLights
-from lively_lights.phue import Bridge
 import configparser
 import contextlib
-import daemon
-import lockfile
+import importlib
 import os
+import sys
 
 
-from ._version import get_versions
-__version__ = get_versions()['version']
-del get_versions
-
 args = None
 
+_lazy_attributes = {
+    'Bridge': ('lively_lights.phue', 'Bridge'),
+    'ReachableLights': ('lively_lights.environment', 'ReachableLights'),
+    'environment': ('lively_lights.environment', None),
+    'scenes': ('lively_lights.scenes', None),
+}
+"""Attributes of the package imported on first access:
+`name: (module, attribute)`."""
+
+
+def __getattr__(name):
+    if name == '__version__':
+        # Versioneer calls git in a source checkout.
+        from lively_lights._version import get_versions
+        globals()[name] = get_versions()['version']
+        return globals()[name]
+    if name not in _lazy_attributes:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(
+            __name__, name))
+    module_name, attribute = _lazy_attributes[name]
+    value = importlib.import_module(module_name)
+    if attribute:
+        value = getattr(value, attribute)
+    globals()[name] = value
+    return value
+
+
+def _lazy(name):
+    """Look up a lazily imported attribute of the package. Unlike a global
+    name, the lookup also finds attributes replaced by `mock.patch`."""
+    return getattr(sys.modules[__name__], name)
+
 
 def lights_info(bridge):
     for light in bridge.lights:
@@ -62,6 +90,14 @@ class Configuration(object):
         return '{}_{}_{}'.format(self.environ_prefix, section.upper(),
                                  key.upper())
 
+    def bridge_names(self):
+        """The names of the bridges configured in sections
+        `[bridge:<name>]` of the configuration file."""
+        if not hasattr(self, 'config'):
+            return []
+        return [section.split(':', 1)[1] for section in self.config.sections()
+                if section.startswith('bridge:')]
+
     def get(self, section, key):
         value = None
         envrion_key = self._envrion_key(section, key)
@@ -90,7 +126,9 @@ class Hue(object):
     def __init__(self, ip=None, username=None,
                  config_file_path=None,
                  config_environ_prefix=None, verbosity_level=0,
-                 colorize_output=False):
+                 colorize_output=False, pool_size=4, light_rate=10,
+                 group_rate=1, cache_ttl=1, shadow_ttl=30,
+                 event_stream=False):
         """
         :param str ip: The IP address of the Hue bridge. IP address as dotted
           quad.
@@ -101,26 +139,111 @@ class Hue(object):
         :param str config_environ_prefix: The environment variable prefix
           `lively_lights` should look for configuration, by default
           `LIVELY_LIGHTS_`.
+        :param int pool_size: The maximum number of persistent HTTP
+          connections to the Hue bridge.
+        :param float light_rate: The maximum number of light commands per
+          second.
+        :param float group_rate: The maximum number of group commands per
+          second.
+        :param float cache_ttl: Read the state of lights, groups and sensors
+          from a snapshot of the bridge state not older than n seconds. `0`
+          disables the cache.
+        :param float shadow_ttl: Leave fields out of light commands if they
+          were sent with the same value in the last n seconds. `0` disables
+          it.
+        :param bool event_stream: Keep the state cache up to date with the
+          event stream of the bridge instead of polling, see
+          :class:`lively_lights.events.EventStream`. The streams are started
+          by :meth:`lively_lights.Hue.start_event_streams`.
         """
 
         self.config = Configuration(config_file_path, config_environ_prefix)
         """:class:`lively_lights.Configuration`"""
 
-        if not ip:
-            ip = self.config.get('bridge', 'ip')
+        Bridge = _lazy('Bridge')
+
+        def get_bridge(ip, username):
+            return Bridge(ip, username, verbosity_level=verbosity_level,
+                          colorize_output=colorize_output,
+                          pool_size=pool_size, light_rate=light_rate,
+                          group_rate=group_rate, cache_ttl=cache_ttl,
+                          shadow_ttl=shadow_ttl)
+
+        bridge_names = self.config.bridge_names()
+        if not ip and bridge_names:
+            from lively_lights.multibridge import MultiBridge
+            self.bridge = MultiBridge(
+                (name, get_bridge(
+                    self.config.get('bridge:' + name, 'ip'),
+                    self.config.get('bridge:' + name, 'username')))
+                for name in bridge_names)
+            bridges = list(self.bridge.bridges.values())
+        else:
+            if not ip:
+                ip = self.config.get('bridge', 'ip')
+
+            if not username:
+                username = self.config.get('bridge', 'username')
+
+            self.bridge = get_bridge(ip, username)
+            """:class:`lively_lights.phue.Bridge` or, if several bridges are
+            configured in sections `[bridge:<name>]`, a
+            :class:`lively_lights.multibridge.MultiBridge`."""
+            bridges = [self.bridge]
 
-        if not username:
-            username = self.config.get('bridge', 'username')
+        self.event_streams = []
+        """The :class:`lively_lights.events.EventStream` objects, one for
+        each bridge."""
 
-        self.bridge = Bridge(ip, username, verbosity_level=verbosity_level,
-                             colorize_output=colorize_output)
-        """:class:`lively_lights.phue.Bridge`"""
+        if event_stream:
+            from lively_lights.events import EventStream
+            for bridge in bridges:
+                self.event_streams.append(EventStream(bridge))
+
+    def start_event_streams(self):
+        """Start listening to the event streams in background threads.
+
+        Call it in the process that uses the bridge, i. e. after
+        daemonizing: threads do not survive a fork."""
+        for stream in self.event_streams:
+            stream.start()
+
+    def close(self):
+        """Stop the event streams and close the connections to the
+        bridge."""
+        for stream in self.event_streams:
+            stream.stop()
+        self.bridge.close()
 
 
 def main():
     global args
     args = get_parser().parse_args()
 
+    if args.subcommand == 'benchmark':
+        from lively_lights import benchmark
+        benchmark.main(args)
+        return
+
+    if args.dry_run:
+        from lively_lights import simulation
+        simulation.main(args)
+        return
+
+    if args.subcommand == 'daemon' and args.daemon != 'serve':
+        from lively_lights import control
+        control.main(args)
+        return
+
+    if args.subcommand in ('scene', 'launch') and not args.no_daemon:
+        from lively_lights import control
+        client = control.ControlClient(args.socket)
+        if client.is_running():
+            control.forward(client, args)
+            return
+
+    from lively_lights import environment
+
     config = Configuration(config_file_path=args.config_file)
     day_night = environment.DayNight(
         config.get('location', 'latitude'),
@@ -135,67 +258,85 @@ def main():
     hue = Hue(ip=args.ip, username=args.username,
               config_file_path=args.config_file,
               verbosity_level=args.verbosity_level,
-              colorize_output=args.colorize)
-
-    reachable_lights = ReachableLights(
-        hue.bridge,
-        day_night,
-        not_at_night=args.not_at_night,
-        not_during_daytime=args.not_during_daytime,
-        not_host_up=args.not_host_up,
-        turn_off=args.turn_off,
-    )
-
-    if args.lights:
-        reachable_lights.light_ids = args.lights
-
-    if args.subcommand == 'info':
-        if args.info == 'lights':
-            lights_info(hue.bridge)
-        elif args.info == 'groups':
-            groups_info(hue.bridge)
-        return
-
-    if args.daemonize:
-        ctx_mgr = daemon.DaemonContext(
-            pidfile=lockfile.FileLock('/tmp/hue.pid'),
+              colorize_output=args.colorize,
+              event_stream=args.event_stream)
+
+    try:
+        from lively_lights import scenes
+
+        reachable_lights = environment.ReachableLights(
+            hue.bridge,
+            day_night,
+            not_at_night=args.not_at_night,
+            not_during_daytime=args.not_during_daytime,
+            not_host_up=args.not_host_up,
+            host_mode=args.host_mode,
+            turn_off=args.turn_off,
         )
-    else:
-        ctx_mgr = contextlib.suppress()
-
-    with ctx_mgr:
-        if args.subcommand == 'scene':
-            if args.scene == 'breath':
-                Scene = scenes.SceneBreath
-            elif args.scene == 'pendulum':
-                Scene = scenes.ScenePendulum
-            elif args.scene == 'sequence':
-                Scene = scenes.SceneSequence
-
-            scene = Scene(
-                hue.bridge,
-                reachable_lights,
-            )
-            scene.get_properties_from_args(args)
-            scene.scene_reporter(args.verbosity_level)
-            scene.start(duration=args.duration)
-            if args.verbosity_level > 0 and args.duration and \
-               scene.actual_duration:
-                print('duration: {}'.format(scene.duration))
-                print('actual_duration: {0:.2f}'.format(scene.actual_duration))
-
-        elif args.subcommand == 'launch':
-            launcher = scenes.Launcher(
-                hue.bridge,
-                reachable_lights,
-                scene_configs_file=args.yamlfile,
-                verbosity_level=args.verbosity_level
-            )
-            launcher.launch(
-                randomized=args.randomized,
-                endless=args.endless,
-                duration=args.duration,
+
+        if args.lights:
+            reachable_lights.light_ids = args.lights
+
+        if args.subcommand == 'info':
+            if args.info == 'lights':
+                lights_info(hue.bridge)
+            elif args.info == 'groups':
+                groups_info(hue.bridge)
+            return
+
+        if args.daemonize:
+            import daemon
+            import lockfile
+            ctx_mgr = daemon.DaemonContext(
+                pidfile=lockfile.FileLock(args.pidfile),
             )
+        else:
+            ctx_mgr = contextlib.suppress()
+
+        with ctx_mgr:
+            hue.start_event_streams()
+
+            if args.subcommand == 'daemon':
+                from lively_lights import control
+                control.serve(hue.bridge, reachable_lights, args.socket,
+                              verbosity_level=args.verbosity_level)
+
+            elif args.subcommand == 'scene':
+                if args.scene == 'breath':
+                    Scene = scenes.SceneBreath
+                elif args.scene == 'pendulum':
+                    Scene = scenes.ScenePendulum
+                elif args.scene == 'sequence':
+                    Scene = scenes.SceneSequence
+
+                scene = Scene(
+                    hue.bridge,
+                    reachable_lights,
+                )
+                scene.get_properties_from_args(args)
+                scene.scene_reporter(args.verbosity_level)
+                scene.start(duration=args.duration)
+                if args.verbosity_level > 0 and args.duration and \
+                   scene.actual_duration:
+                    print('duration: {}'.format(scene.duration))
+                    print('actual_duration: {0:.2f}'.format(
+                        scene.actual_duration))
+
+            elif args.subcommand == 'launch':
+                launcher = scenes.Launcher(
+                    hue.bridge,
+                    reachable_lights,
+                    scene_configs_file=args.yamlfile,
+                    verbosity_level=args.verbosity_level
+                )
+                launcher.launch(
+                    randomized=args.randomized,
+                    endless=args.endless,
+                    duration=args.duration,
+                )
+
+    finally:
+        hue.close()
 
 
 if __name__ == '__main__':
@@ -1,23 +1,67 @@
+"""Random scene parameters.
+
+A :class:`lively_lights._random.Generator` draws one value or a batch of
+values per call. The batch methods take the bounds apart once and draw
+all values with one call of :meth:`random.Random.choices`, which is
+several times faster than calling :meth:`random.Random.randint` per
+value. Each scene has its own generator, a seed makes the scene
+reproducible.
+"""
+
 import random
 
-shuffle = random.shuffle
 
+class Generator(object):
+    """Draw random integers and times, one at a time or in batches.
+
+    :param int seed: Seed of the generator, None to seed from the system.
+    """
+
+    def __init__(self, seed=None):
+        self.seed = seed
+        """The seed of the generator."""
+
+        self.random = random.Random(seed)
+        """:class:`random.Random`"""
+
+    def integers(self, min, max, count):
+        """A list of `count` random integers between `min` and `max`
+        (both included)."""
+        return self.random.choices(range(min, max + 1), k=count)
+
+    def times(self, min, max, count, decimal_places=1):
+        """A list of `count` random times in seconds between `min` and
+        `max`, rounded to `decimal_places`."""
+        base = 10 ** decimal_places
+        return [value / base for value in self.integers(
+            int(round(min * base)), int(round(max * base)), count)]
+
+    def brightness(self, min=1, max=254):
+        return self.random.randint(min, max)
+
+    def hue(self, min=0, max=65535):
+        return self.random.randint(min, max)
+
+    def time(self, min, max, decimal_places=1):
+        return self.times(min, max, 1, decimal_places)[0]
+
+    def shuffle(self, items):
+        self.random.shuffle(items)
+
+
+_generator = Generator()
+"""Used by the functions of the module."""
 
-def _float_range(min, max, decimal_places=1):
-    base = 10 ** decimal_places
-    min = min * base
-    max = max * base
-    return random.randint(min, max) / base
+shuffle = _generator.shuffle
 
 
 def brightness(min=1, max=254):
-    return random.randint(min, max)
+    return _generator.brightness(min, max)
 
 
 def hue(min=0, max=65535):
-    return random.randint(min, max)
+    return _generator.hue(min, max)
 
 
 def time(min, max, decimal_places=1):
-    result = _float_range(min, max, decimal_places=1)
-    return result
+    return _generator.time(min, max, decimal_places)
@@ -1,18 +1,23 @@
-from colors import colors as ansicolors
-from pygments import highlight, lexers, formatters
+from lively_lights.metrics import RequestHook
 import json
 import re
 
 
 def set_light_multiple(bridge, light_id, data):
-    return bridge.request(
-        mode='PUT',
-        address='/api/{}/lights/{}/state'.format(bridge.username, light_id),
-        data=data,
-    )
+    """Queue a state change of one light in the rate limited dispatcher of
+    the bridge (:class:`lively_lights.dispatcher.Dispatcher`)."""
+    bridge.dispatcher.set_light(light_id, data)
 
 
-class RestDebug(object):
+def set_lights_multiple(bridge, light_ids, data):
+    """Queue the same state change for several lights. The dispatcher sends
+    it as one group action if possible."""
+    bridge.dispatcher.set_lights(light_ids, data)
+
+
+class RestDebug(RequestHook):
+    """Print the requests and the responses on the command line (request
+    hook of the bridge)."""
 
     def __init__(self, verbosity_level=0, colorize_output=False):
         self.verbosity_level = verbosity_level
@@ -25,6 +30,7 @@ class RestDebug(object):
             formatted_json = json.dumps(data, sort_keys=True, indent=4)
 
         if self.colorize_output:
+            from pygments import highlight, lexers, formatters
             return highlight(
                 formatted_json,
                 lexers.JsonLexer(),
@@ -40,6 +46,7 @@ class RestDebug(object):
 
     @staticmethod
     def _colorize_rest_mode(mode):
+        from colors import colors as ansicolors
         if mode == 'GET':
             color = 'Crimson'
         elif mode == 'PUT':
@@ -71,3 +78,10 @@ class RestDebug(object):
             out.append(self._format_json(data))
 
         print(join_phrase.join(out))
+
+    def before(self, event):
+        self.print_request(event.method, event.path, event.data)
+
+    def after(self, event):
+        if event.result is not None:
+            self.print_json(event.result)
@@ -0,0 +1,354 @@
+"""Benchmark the bridge client and the scenes against the local bridge
+emulator (:class:`lively_lights.emulator.EmulatedBridge`).
+
+.. code-block:: shell
+
+    lively-lights.py benchmark --light-counts 10 30 --output results.json
+    lively-lights.py benchmark --compare results.json
+
+The results are stored as JSON to compare them between releases.
+"""
+
+from lively_lights import scenes
+from lively_lights._version import get_versions
+from lively_lights.emulator import EmulatedBridge
+from lively_lights.environment import ReachableLights
+from lively_lights.metrics import RequestHook
+from lively_lights.phue import Bridge
+import datetime
+import json
+import platform
+import threading
+import time
+import tracemalloc
+
+
+SCENE_PROPERTIES = {
+    'breath': {
+        'time_range': (0.5, 1),
+    },
+    'pendulum': {
+        'sleep_time': 0.5,
+        'transition_time': 0.2,
+    },
+    'sequence': {
+        'hue_sequence': (0, 20000, 40000),
+        'sleep_time': 0.5,
+        'transition_time': 0.2,
+    },
+}
+"""Fast paced scene properties to get many ticks in a short time."""
+
+HIGHER_IS_BETTER = ('commands_per_second',)
+"""Metrics that improve if they grow. All others improve if they shrink."""
+
+
+def percentile(values, percent):
+    """The nearest-rank percentile of a list of numbers.
+
+    :param list values: The numbers.
+    :param float percent: A value between 0 and 100.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    index = int(round(percent / 100 * (len(values) - 1)))
+    return values[index]
+
+
+def summarize(values):
+    """p50, p95, p99 and max of a list of numbers."""
+    return {
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': max(values) if values else None,
+    }
+
+
+class Recorder(RequestHook):
+    """Record the latency of every request of a bridge and the time of
+    every command a scene sends.
+
+    :param bridge: The bridge object.
+    :type bridge: lively_lights.phue.Bridge
+    """
+
+    def __init__(self, bridge):
+        self.latencies = []
+        """Request latencies in seconds."""
+
+        self.ticks = {}
+        """Command times and data by light ID (or tuple of light IDs).
+
+        .. code-block:: python
+
+            self.ticks = {
+                1: [(0.0, {'hue': 1, 'transitiontime': 8}), ...],
+                (1, 2): [(0.0, {'hue': 1, 'transitiontime': 2}), ...],
+            }
+
+        """
+
+        self._lock = threading.Lock()
+        bridge.add_hook(self)
+        self._wrap(bridge.dispatcher, 'set_light', self._record_tick)
+        self._wrap(bridge.dispatcher, 'set_lights', self._record_tick)
+
+    @staticmethod
+    def _wrap(obj, name, record):
+        function = getattr(obj, name)
+
+        def wrapper(*args, **kwargs):
+            begin = time.perf_counter()
+            result = function(*args, **kwargs)
+            record(begin, time.perf_counter(), args)
+            return result
+
+        setattr(obj, name, wrapper)
+
+    def after(self, event):
+        with self._lock:
+            self.latencies.append(event.latency)
+
+    def _record_tick(self, begin, end, args):
+        light_id, data = args[:2]
+        if not isinstance(light_id, int):
+            light_id = tuple(light_id)
+        with self._lock:
+            self.ticks.setdefault(light_id, []).append((begin, dict(data)))
+
+    def tick_jitter(self, interval=None):
+        """Deviations in seconds between the actual and the expected time of
+        every tick. The expected time is the time of the previous tick of
+        the same light plus `interval` or, if no interval is given, plus the
+        transition time of the previous command and 0.2 seconds (breath
+        scene)."""
+        deviations = []
+        for ticks in self.ticks.values():
+            for (previous, data), (current, _) in zip(ticks, ticks[1:]):
+                if interval is None:
+                    expected = data.get('transitiontime', 0) / 10 + 0.2
+                else:
+                    expected = interval
+                deviations.append(abs(current - previous - expected))
+        return deviations
+
+
+def _bridge(emulator, **kwargs):
+    return Bridge(emulator.address, emulator.username, **kwargs)
+
+
+def benchmark_client(light_count=10, requests=500, threads=4, latency=0):
+    """Send light commands as fast as possible with the raw bridge client.
+
+    :return: A dictionary with the metrics `commands_per_second`,
+      `latency` and `memory_peak`.
+    """
+    with EmulatedBridge(light_count=light_count, latency=latency) as emulator:
+        bridge = _bridge(emulator, pool_size=threads)
+        recorder = Recorder(bridge)
+
+        def send(offset):
+            for index in range(offset, requests, threads):
+                light_id = index % light_count + 1
+                bridge.request(
+                    'PUT',
+                    '/api/{}/lights/{}/state'.format(bridge.username,
+                                                     light_id),
+                    {'bri': index % 254 + 1},
+                )
+
+        tracemalloc.start()
+        begin = time.perf_counter()
+        workers = [threading.Thread(target=send, args=(offset,))
+                   for offset in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - begin
+        _, memory_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        bridge.close()
+
+    return {
+        'requests': requests,
+        'threads': threads,
+        'commands_per_second': requests / elapsed,
+        'latency': summarize(recorder.latencies),
+        'memory_peak': memory_peak,
+    }
+
+
+def benchmark_scene(scene_name, light_count=10, duration=5, latency=0,
+                    light_rate=10, group_rate=1):
+    """Play one scene against the emulator.
+
+    :return: A dictionary with the metrics `commands_per_second`,
+      `latency`, `tick_jitter`, `drift` (how much longer than `duration`
+      the scene played), `max_drift` (the latest step) and `memory_peak`.
+    """
+    with EmulatedBridge(light_count=light_count, latency=latency) as emulator:
+        bridge = _bridge(emulator, light_rate=light_rate,
+                         group_rate=group_rate)
+        recorder = Recorder(bridge)
+        reachable_lights = ReachableLights(bridge, None)
+        Scene = scenes.Launcher._get_scene_class(scene_name)
+        scene = Scene(bridge, reachable_lights,
+                      **SCENE_PROPERTIES[scene_name])
+
+        tracemalloc.start()
+        begin = time.perf_counter()
+        scene.start(duration)
+        bridge.dispatcher.flush(duration)
+        elapsed = time.perf_counter() - begin
+        _, memory_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        stats = emulator.stats()
+        bridge.close()
+
+    commands = stats.get('PUT lights', 0) + stats.get('PUT groups', 0)
+    deviations = recorder.tick_jitter(getattr(scene, 'sleep_time', None))
+    return {
+        'lights': light_count,
+        'duration': duration,
+        'commands': commands,
+        'commands_per_second': commands / elapsed,
+        'latency': summarize(recorder.latencies),
+        'tick_jitter': summarize(deviations),
+        'drift': scene.actual_duration - duration,
+        'max_drift': scene.max_drift or 0,
+        'memory_peak': memory_peak,
+    }
+
+
+def run(light_counts=(10, 30), duration=5, latency=0, scene_names=None,
+        requests=500, light_rate=10, group_rate=1):
+    """Run the whole benchmark suite.
+
+    :return: The results as a dictionary.
+    """
+    if scene_names is None:
+        scene_names = sorted(SCENE_PROPERTIES)
+    results = {
+        'version': get_versions()['version'],
+        'python': platform.python_version(),
+        'created': datetime.datetime.now().isoformat(),
+        'options': {
+            'light_counts': list(light_counts),
+            'duration': duration,
+            'latency': latency,
+            'requests': requests,
+            'light_rate': light_rate,
+            'group_rate': group_rate,
+        },
+        'client': benchmark_client(light_count=max(light_counts),
+                                   requests=requests, latency=latency),
+        'scenes': {},
+    }
+    for scene_name in scene_names:
+        for light_count in light_counts:
+            key = '{}-{}'.format(scene_name, light_count)
+            results['scenes'][key] = benchmark_scene(
+                scene_name, light_count=light_count, duration=duration,
+                latency=latency, light_rate=light_rate, group_rate=group_rate,
+            )
+    return results
+
+
+def _flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        name = prefix + key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and \
+                not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(old, new, threshold=0.1):
+    """Compare two benchmark results.
+
+    :param dict old: The reference results.
+    :param dict new: The current results.
+    :param float threshold: Relative changes larger than this are
+      regressions or improvements.
+
+    :return: A list of tuples `(metric, old, new, change, verdict)`. The
+      verdict is `regression`, `improvement` or an empty string.
+    """
+    old_flat = _flatten({'client': old.get('client', {}),
+                         'scenes': old.get('scenes', {})})
+    new_flat = _flatten({'client': new.get('client', {}),
+                         'scenes': new.get('scenes', {})})
+    rows = []
+    for metric in sorted(set(old_flat) & set(new_flat)):
+        before = old_flat[metric]
+        after = new_flat[metric]
+        if not before:
+            continue
+        change = (after - before) / abs(before)
+        better = change > 0 if metric.endswith(HIGHER_IS_BETTER) \
+            else change < 0
+        verdict = ''
+        if abs(change) > threshold:
+            verdict = 'improvement' if better else 'regression'
+        rows.append((metric, before, after, change, verdict))
+    return rows
+
+
+def format_results(results):
+    out = []
+    client = results['client']
+    out.append('client: {:.1f} commands/s, latency p50 {:.4f} s, '
+               'p95 {:.4f} s, p99 {:.4f} s'.format(
+                   client['commands_per_second'], client['latency']['p50'],
+                   client['latency']['p95'], client['latency']['p99']))
+    for key, scene in sorted(results['scenes'].items()):
+        jitter = scene['tick_jitter']
+        out.append('{}: {:.1f} commands/s, tick jitter p50 {} s, p95 {} s, '
+                   'drift {:.3f} s, memory peak {} bytes'.format(
+                       key, scene['commands_per_second'],
+                       _round(jitter['p50']), _round(jitter['p95']),
+                       scene['drift'], scene['memory_peak']))
+    return '\n'.join(out)
+
+
+def format_comparison(rows):
+    out = []
+    for metric, before, after, change, verdict in rows:
+        out.append('{}: {} -> {} ({:+.1%}) {}'.format(
+            metric, _round(before), _round(after), change, verdict).rstrip())
+    return '\n'.join(out)
+
+
+def _round(value):
+    if isinstance(value, float):
+        return round(value, 4)
+    return value
+
+
+def main(args):
+    """Run the benchmark from the command line interface.
+
+    :param args: The parsed arguments of the `benchmark` subcommand.
+    """
+    results = run(
+        light_counts=args.light_counts,
+        duration=args.duration or 5,
+        latency=args.latency,
+        scene_names=args.scenes,
+        requests=args.requests,
+    )
+    print(format_results(results))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    if args.compare:
+        with open(args.compare) as reference:
+            rows = compare(json.load(reference), results, args.threshold)
+        print(format_comparison(rows))
@@ -0,0 +1,244 @@
+"""Cache the full state of the Hue bridge."""
+
+import copy
+import threading
+import time
+
+
+LIGHT_STATE_FIELDS = ('on', 'bri', 'hue', 'sat', 'xy', 'ct', 'effect',
+                      'alert', 'colormode')
+"""Fields of a group action that change the state of the member lights."""
+
+UNKNOWN = object()
+"""A pushed value meaning the field has changed to an unknown value. The
+light (or group) is fetched again when it is read."""
+
+
+class StateCache(object):
+    """A snapshot of the full state of the bridge (lights, groups, sensors,
+    config ...) fetched with one `GET /api/<username>` request.
+
+    Successful writes are applied to the snapshot, so it stays valid until
+    the time to live expires. While an event stream of the bridge is
+    connected (see :class:`lively_lights.events.EventStream`) the changes are
+    pushed into the snapshot and it does not expire.
+
+    :param bridge: The bridge object.
+    :type bridge: lively_lights.phue.Bridge
+
+    :param float ttl: Fetch a new snapshot after n seconds. `0` disables the
+      cache.
+    """
+
+    def __init__(self, bridge, ttl=1):
+        self.bridge = bridge
+        """The bridge object: :class:`lively_lights.phue.Bridge`"""
+
+        self.ttl = ttl
+        """Fetch a new snapshot after n seconds."""
+
+        self.live = False
+        """True while an event stream keeps the snapshot up to date. The
+        time to live is ignored then."""
+
+        self.pushed_at = None
+        """Monotonic time of the last change pushed by an event stream."""
+
+        self._snapshot = None
+        self._fetched_at = None
+        self._stale = set()
+        """`(kind, id)` tuples of resources with unknown values, e. g.
+        `('lights', '1')`."""
+        self._lock = threading.RLock()
+        self._counters = {
+            'hits': 0,
+            'fetches': 0,
+            'invalidations': 0,
+            'pushed': 0,
+            'refreshes': 0,
+        }
+
+    @property
+    def enabled(self):
+        return bool(self.ttl)
+
+    def _expired(self):
+        if self._snapshot is None:
+            return True
+        return not self.live and \
+            time.monotonic() - self._fetched_at >= self.ttl
+
+    def snapshot(self):
+        """Return the (cached) full state of the bridge. The dictionary is
+        the snapshot itself and changes with the next update, use
+        :meth:`lively_lights.cache.StateCache.get` to read a value.
+
+        :return: The dictionary returned by `GET /api/<username>` or None if
+          the cache is disabled or the bridge returned an error.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            if self._expired():
+                snapshot = self.bridge.get_api()
+                self._counters['fetches'] += 1
+                if not isinstance(snapshot, dict):
+                    # An error like “unauthorized user”.
+                    self._snapshot = None
+                    return None
+                self._snapshot = snapshot
+                self._fetched_at = time.monotonic()
+                self._stale.clear()
+            else:
+                self._counters['hits'] += 1
+            return self._snapshot
+
+    def get(self, *keys):
+        """Look up a value in the snapshot, e. g.
+        `cache.get('lights', '1', 'state')`.
+
+        :return: A copy of the value, so the caller can neither change the
+          snapshot nor see it change. None if it is not in the snapshot.
+        """
+        with self._lock:
+            value = self.snapshot()
+            if value is not None and self._stale:
+                self._refresh(keys)
+                value = self.snapshot()
+            for key in keys:
+                if not isinstance(value, dict) or str(key) not in value:
+                    return None
+                value = value[str(key)]
+            return copy.deepcopy(value)
+
+    def _refresh(self, keys):
+        """Fetch the stale resources a lookup leads to again: one resource
+        with one request, several resources of a kind with one request for
+        all of them. Must be called with the lock held."""
+        keys = [str(key) for key in keys[:2]]
+        for kind in sorted({kind for kind, _ in self._stale}):
+            if keys and keys[0] != kind:
+                continue
+            resource_ids = [resource_id for stale_kind, resource_id
+                            in self._stale if stale_kind == kind]
+            if len(keys) == 2:
+                if keys[1] not in resource_ids:
+                    continue
+                resource_ids = [keys[1]]
+            address = '/api/{}/{}'.format(self.bridge.username, kind)
+            if len(resource_ids) == 1:
+                address += '/' + resource_ids[0]
+            value = self.bridge.request('GET', address)
+            self._counters['refreshes'] += 1
+            if not isinstance(value, dict) or \
+               not isinstance(self._snapshot.get(kind), dict):
+                # An error like “resource not available”.
+                self.invalidate()
+                return
+            if len(resource_ids) == 1:
+                self._snapshot[kind][resource_ids[0]] = value
+                self._stale.discard((kind, resource_ids[0]))
+            else:
+                self._snapshot[kind] = value
+                self._stale = {stale for stale in self._stale
+                               if stale[0] != kind}
+
+    def invalidate(self):
+        """Discard the snapshot. The next read fetches a new one."""
+        with self._lock:
+            self._snapshot = None
+            self._stale.clear()
+            self._counters['invalidations'] += 1
+
+    def _set(self, keys, value):
+        node = self._snapshot
+        for key in keys[:-1]:
+            if not isinstance(node, dict) or key not in node:
+                return
+            node = node[key]
+        if isinstance(node, dict):
+            node[keys[-1]] = value
+
+    def _apply_group_action(self, group_id, field, value):
+        if field not in LIGHT_STATE_FIELDS:
+            return
+        lights = self._snapshot.get('lights', {})
+        if group_id == '0':
+            light_ids = list(lights)
+        else:
+            group = self._snapshot.get('groups', {}).get(group_id, {})
+            light_ids = group.get('lights', [])
+        for light_id in light_ids:
+            self._set(['lights', light_id, 'state', field], value)
+
+    def update(self, mode, response):
+        """Apply the response of a write request to the snapshot.
+
+        The bridge answers a `PUT` request with a list of successfully
+        changed values:
+
+        .. code-block:: python
+
+            [
+                {'success': {'/lights/1/state/bri': 200}},
+                {'success': {'/lights/1/state/on': True}},
+            ]
+
+        Other write requests (`POST`, `DELETE`) discard the snapshot.
+
+        :param str mode: The HTTP method.
+        :param response: The decoded response of the bridge.
+        """
+        if not self.enabled or mode == 'GET':
+            return
+        with self._lock:
+            if self._snapshot is None:
+                return
+            if mode != 'PUT' or not isinstance(response, list):
+                self.invalidate()
+                return
+            for item in response:
+                if not isinstance(item, dict) or 'success' not in item:
+                    continue
+                for path, value in item['success'].items():
+                    keys = path.strip('/').split('/')
+                    self._set(keys, value)
+                    if len(keys) == 4 and keys[0] == 'groups' and \
+                       keys[2] == 'action':
+                        self._apply_group_action(keys[1], keys[3], value)
+
+    def push(self, changes):
+        """Apply changes pushed by the bridge to the snapshot.
+
+        :param list changes: `(keys, value)` tuples, e. g.
+          `(['lights', '1', 'state', 'reachable'], False)`. The value
+          :data:`lively_lights.cache.UNKNOWN` marks the resource as stale.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._snapshot is None:
+                return
+            for keys, value in changes:
+                if value is UNKNOWN:
+                    self._stale.add(tuple(keys[:2]))
+                else:
+                    self._set(keys, value)
+            self._counters['pushed'] += len(changes)
+            self.pushed_at = time.monotonic()
+
+    def stats(self):
+        """Return cache statistics.
+
+        .. code-block:: python
+
+            {
+                'hits': 120,
+                'fetches': 3,
+                'invalidations': 1,
+                'pushed': 42,
+                'refreshes': 2,
+            }
+        """
+        with self._lock:
+            return dict(self._counters)
@@ -36,10 +36,42 @@ def get_parser():
         help='Fork the process in the background.',
     )
 
+    parser.add_argument(
+        '--dry-run',
+        type=float,
+        metavar='SECONDS',
+        help='Simulate the subcommand “scene” or “launch” for n seconds on '
+        'a virtual clock. No commands are sent to the bridge, the request '
+        'rates are printed instead.',
+    )
+
+    parser.add_argument(
+        '--dry-run-log',
+        metavar='FILE',
+        help='Write the commands of a dry run to a file.',
+    )
+
+    parser.add_argument(
+        '--event-stream',
+        action='store_true',
+        help='Learn state changes from the event stream of the bridge '
+        'instead of polling the bridge.',
+    )
+
     parser.add_argument(
         '-H', '--not-host-up',
         default=False,
-        help='Do nothing if an external host is up and reachable.',
+        help='Do nothing if an external host is up and reachable. Check '
+        'if a host has an open TCP port (e. g. 192.168.3.11:22) or is '
+        'pingable (e. g. 192.168.3.11). Separate several hosts by commas.',
+    )
+
+    parser.add_argument(
+        '--host-mode',
+        choices=('any', 'all'),
+        default='any',
+        help='Do nothing if any (default) or all of the hosts of '
+        '--not-host-up are up.',
     )
 
     parser.add_argument(
@@ -62,6 +94,27 @@ def get_parser():
         'location in the configuration file.',
     )
 
+    parser.add_argument(
+        '--no-daemon',
+        action='store_true',
+        help='Run the subcommand “scene” or “launch” in this process even if '
+        'a daemon is running.',
+    )
+
+    parser.add_argument(
+        '--pidfile',
+        default='/tmp/hue.pid',
+        help='The PID file of a process forked in the background with '
+        '--daemonize (default: /tmp/hue.pid).',
+    )
+
+    parser.add_argument(
+        '--socket',
+        default='~/.lively-lights.sock',
+        help='The control socket of the daemon '
+        '(default: ~/.lively-lights.sock).',
+    )
+
     parser.add_argument(
         '-u', '--username',
         type=str,
@@ -105,6 +158,118 @@ def get_parser():
 
     subcommand.required = True
 
+    ###########################################################################
+    # benchmark
+    ###########################################################################
+
+    benchmark = subcommand.add_parser(
+        'benchmark',
+        help='Benchmark the scenes and the bridge client against a local '
+        'bridge emulator. Use --duration to set the duration of each scene.',
+    )
+
+    benchmark.add_argument(
+        '-c', '--compare',
+        help='Compare the results with the results of a previous run '
+        '(JSON file).',
+    )
+
+    benchmark.add_argument(
+        '-L', '--latency',
+        type=float,
+        default=0,
+        help='Latency of the emulated bridge in seconds.',
+    )
+
+    benchmark.add_argument(
+        '-l', '--light-counts',
+        nargs='+',
+        type=int,
+        default=[10, 30],
+        help='Benchmark each scene with n emulated lights '
+        '(e. g.: -l 10 30).',
+    )
+
+    benchmark.add_argument(
+        '-o', '--output',
+        help='Write the results to a JSON file.',
+    )
+
+    benchmark.add_argument(
+        '-r', '--requests',
+        type=int,
+        default=500,
+        help='Number of requests to send with the raw bridge client.',
+    )
+
+    benchmark.add_argument(
+        '-s', '--scenes',
+        nargs='+',
+        choices=('breath', 'pendulum', 'sequence'),
+        help='Benchmark only these scenes.',
+    )
+
+    benchmark.add_argument(
+        '-t', '--threshold',
+        type=float,
+        default=0.1,
+        help='Relative change of a metric to report a regression or an '
+        'improvement (default 0.1).',
+    )
+
+    ###########################################################################
+    # daemon
+    ###########################################################################
+
+    daemon_parser = subcommand.add_parser(
+        'daemon',
+        help='Run a resident daemon that keeps the bridge connections warm '
+        'or control it. The subcommands “scene” and “launch” are sent to a '
+        'running daemon.',
+    )
+    daemon = daemon_parser.add_subparsers(dest='daemon')
+    daemon.required = True
+
+    daemon.add_parser(
+        'metrics',
+        help='Print the request metrics of the daemon in the Prometheus '
+        'text format.',
+    )
+
+    daemon.add_parser(
+        'serve',
+        help='Listen on the control socket (use --daemonize to fork it in '
+        'the background).',
+    )
+
+    daemon.add_parser(
+        'status',
+        help='Print the running scene and the statistics of the daemon.',
+    )
+
+    daemon.add_parser(
+        'stop',
+        help='Stop the running scene.',
+    )
+
+    daemon_set = daemon.add_parser(
+        'set',
+        help='Change properties of the running scene.',
+    )
+
+    daemon_set.add_argument(
+        'properties',
+        nargs='+',
+        metavar='NAME=VALUE',
+        help='Property assignments, the values are JSON '
+        '(e. g.: hue_range=[0,20000] brightness=100).',
+    )
+
+    daemon.add_parser(
+        'shutdown',
+        help='Stop the daemon.',
+    )
+
     ###########################################################################
     # info
     ###########################################################################
@@ -0,0 +1,268 @@
+"""Pause the scenes while conditions like the night or a host being up are
+active.
+
+A :class:`lively_lights.conditions.Condition` knows when its value can
+change next: the next sunrise or sunset, the next probe of a host. The
+:class:`lively_lights.conditions.ConditionEngine` evaluates a condition
+only when it is due, sleeps until the next transition and notifies the
+subscribed scenes when they have to pause or may resume.
+
+.. code-block:: python
+
+    engine = ConditionEngine([Night(day_night),
+                              HostUp(HostProber('192.168.3.11:22'))])
+    if engine.paused:
+        engine.wait_resumed()
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+TRANSITION_DELAY = 0.001
+"""Sunrise and sunset still belong to the night: evaluate the day and night
+conditions this many seconds after the transition."""
+
+RETRY_INTERVAL = 60
+"""Evaluate a condition again after n seconds if it raised an exception."""
+
+
+def _wall_time():
+    # Looked up on every call, so that tests can freeze the time.
+    return time.time()
+
+
+class Condition(object):
+    """The base class of the conditions."""
+
+    name = None
+    """The name of the condition, e. g. `night`."""
+
+    def check(self, now):
+        """Evaluate the condition. Should be overwritten: the base class
+        never pauses the scenes.
+
+        :param float now: The current time stamp.
+
+        :return: A tuple `(active, next_check)`: True if the condition
+          pauses the scenes and the time stamp the value can change next.
+          A `next_check` of None means the value only changes on
+          :meth:`lively_lights.conditions.ConditionEngine.refresh`.
+        """
+        return (False, None)
+
+    def bind(self, engine):
+        """Called once by the engine. Conditions pushed by a source (e. g. a
+        background prober) subscribe to it here and call
+        :meth:`lively_lights.conditions.ConditionEngine.refresh`."""
+        pass
+
+
+class Night(Condition):
+    """Active at night.
+
+    :param day_night: :class:`lively_lights.environment.DayNight`
+    """
+
+    name = 'night'
+
+    def __init__(self, day_night):
+        self.day_night = day_night
+
+    def _next_check(self, now):
+        transition = self.day_night.next_transition()
+        if transition is None:
+            # Polar day or night: look again tomorrow.
+            return now + 86400
+        return transition[0].timestamp() + TRANSITION_DELAY
+
+    def check(self, now):
+        return self.day_night.is_night(), self._next_check(now)
+
+
+class Daytime(Night):
+    """Active during the day.
+
+    :param day_night: :class:`lively_lights.environment.DayNight`
+    """
+
+    name = 'daytime'
+
+    def check(self, now):
+        return self.day_night.is_day(), self._next_check(now)
+
+
+class HostUp(Condition):
+    """Active while the hosts of a prober are up. The cached result of the
+    prober is read, the engine is refreshed when it changes.
+
+    :param prober: :class:`lively_lights.environment.HostProber`
+    """
+
+    name = 'host_up'
+
+    def __init__(self, prober):
+        self.prober = prober
+
+    def check(self, now):
+        return self.prober.is_up(), None
+
+    def bind(self, engine):
+        self.prober.subscribe(lambda up: engine.refresh())
+        self.prober.start()
+
+
+class ConditionEngine(object):
+    """Combine conditions: the scenes pause while one condition is active.
+
+    :param list conditions: :class:`lively_lights.conditions.Condition`
+      objects.
+
+    :param time_function: A function returning the current time stamp, by
+      default :func:`time.time`.
+    """
+
+    def __init__(self, conditions=(), time_function=None):
+        self.conditions = tuple(conditions)
+        self._time = time_function or _wall_time
+        self._condition = threading.Condition()
+        self._states = [None] * len(self.conditions)
+        """`(active, next_check)` of each condition."""
+        self._paused = None
+        self._listeners = []
+        self._thread = None
+        for condition in self.conditions:
+            condition.bind(self)
+
+    def _update(self, force=False):
+        """Evaluate the due conditions. Must be called with the lock held.
+
+        :return: True if the paused state changed.
+        """
+        now = self._time()
+        for index, condition in enumerate(self.conditions):
+            state = self._states[index]
+            if not force and state is not None and \
+               (state[1] is None or state[1] > now):
+                continue
+            try:
+                self._states[index] = condition.check(now)
+            except Exception:
+                logger.exception('The condition “{}” failed.'.format(
+                    condition.name))
+                active = state[0] if state is not None else False
+                self._states[index] = (active, now + RETRY_INTERVAL)
+        paused = any(state[0] for state in self._states)
+        changed = self._paused is not None and paused != self._paused
+        self._paused = paused
+        if changed:
+            self._condition.notify_all()
+        return changed
+
+    def _timeout(self):
+        """Seconds until the next condition is due or None."""
+        checks = [state[1] for state in self._states
+                  if state is not None and state[1] is not None]
+        if not checks:
+            return None
+        return max(min(checks) - self._time(), 0)
+
+    def _notify(self, paused):
+        for callback in list(self._listeners):
+            try:
+                callback(paused)
+            except Exception:
+                logger.exception('The condition listener {} failed.'.format(
+                    callback))
+
+    @property
+    def paused(self):
+        """True if one of the conditions is active. Only due conditions are
+        evaluated."""
+        with self._condition:
+            changed = self._update()
+            paused = self._paused
+        if changed:
+            self._notify(paused)
+        return paused
+
+    @property
+    def active(self):
+        """The names of the active conditions."""
+        with self._condition:
+            self._update()
+            return [condition.name for condition, state
+                    in zip(self.conditions, self._states) if state[0]]
+
+    def refresh(self):
+        """Evaluate all conditions now, e. g. after a host was probed."""
+        with self._condition:
+            changed = self._update(force=True)
+            paused = self._paused
+        if changed:
+            self._notify(paused)
+
+    def wakeup(self):
+        """Wake up the threads waiting in
+        :meth:`lively_lights.conditions.ConditionEngine.wait_resumed`, e. g.
+        to let them check their stop event."""
+        with self._condition:
+            self._condition.notify_all()
+
+    def wait_resumed(self, timeout=None, stop=None):
+        """Sleep until no condition is active.
+
+        :param float timeout: Wait n seconds at most.
+        :param stop: Return early if this :class:`threading.Event` is set.
+
+        :return: True if the scenes may resume.
+        """
+        end = None if timeout is None else self._time() + timeout
+        while True:
+            if not self.paused:
+                return True
+            if stop is not None and stop.is_set():
+                return False
+            with self._condition:
+                if not self._paused:
+                    continue
+                wait = self._timeout()
+                if end is not None:
+                    remaining = end - self._time()
+                    if remaining <= 0:
+                        return False
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._condition.wait(wait)
+
+    def subscribe(self, callback):
+        """Call `callback(paused)` when the scenes have to pause or may
+        resume. A background thread sleeps until the next transition as
+        long as there are subscribers."""
+        with self._condition:
+            self._listeners.append(callback)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='lively-lights-conditions')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def unsubscribe(self, callback):
+        with self._condition:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+            self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._listeners:
+                    self._thread = None
+                    return
+                changed = self._update()
+                paused = self._paused
+                if not changed:
+                    self._condition.wait(self._timeout())
+                    continue
+            self._notify(paused)
@@ -0,0 +1,178 @@
+"""Persistent HTTP connections to the Hue bridge."""
+
+import collections
+import http.client
+import threading
+import time
+
+
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    http.client.ImproperConnectionState,
+    BrokenPipeError,
+    ConnectionAbortedError,
+    ConnectionResetError,
+)
+"""Errors raised by a kept alive connection the bridge has already closed.
+A request failing with one of these errors on a reused connection is sent
+again on a fresh connection."""
+
+
+class ConnectionPool(object):
+    """A thread-safe pool of persistent HTTP/1.1 connections to one host.
+
+    :param str host: The host name or IP address of the Hue bridge.
+
+    :param int size: The maximum number of simultaneously open connections.
+      Further requests wait until a connection is released.
+
+    :param float timeout: The socket timeout in seconds.
+
+    :param float idle_timeout: Connections idling longer than this number of
+      seconds are closed instead of being reused.
+    """
+
+    def __init__(self, host, size=4, timeout=10, idle_timeout=30):
+        if size < 1:
+            raise ValueError('The pool size must be greater or equal to 1.')
+
+        self.host = host
+        """The host name or IP address of the Hue bridge."""
+
+        self.size = size
+        """The maximum number of simultaneously open connections."""
+
+        self.timeout = timeout
+        """The socket timeout in seconds."""
+
+        self.idle_timeout = idle_timeout
+        """Close connections idling longer than n seconds."""
+
+        self._idle = collections.deque()
+        """Idle connections as `(connection, released_at)` tuples. The most
+        recently used connection is reused first."""
+
+        self.closed = False
+        """True after :meth:`lively_lights.connection.ConnectionPool.close`.
+        Requests are still sent, but their connections are closed right
+        after."""
+
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._counters = {
+            'created': 0,
+            'reused': 0,
+            'reconnects': 0,
+            'discarded': 0,
+            'requests': 0,
+        }
+
+    def _count(self, key):
+        with self._lock:
+            self._counters[key] += 1
+
+    def _new_connection(self):
+        self._count('created')
+        return http.client.HTTPConnection(self.host, timeout=self.timeout)
+
+    def _acquire(self):
+        """Return a tuple `(connection, reused)`."""
+        self._slots.acquire()
+        now = time.monotonic()
+        with self._lock:
+            self._in_use += 1
+            while self._idle:
+                connection, released_at = self._idle.pop()
+                if now - released_at < self.idle_timeout:
+                    self._counters['reused'] += 1
+                    return connection, True
+                connection.close()
+                self._counters['discarded'] += 1
+        return self._new_connection(), False
+
+    def _release(self, connection, reusable=True):
+        with self._lock:
+            self._in_use -= 1
+            reusable = reusable and not self.closed
+            if reusable:
+                self._idle.append((connection, time.monotonic()))
+            else:
+                self._counters['discarded'] += 1
+        if not reusable:
+            connection.close()
+        self._slots.release()
+
+    @staticmethod
+    def _send(connection, method, address, body, headers):
+        connection.request(method, address, body, headers)
+        response = connection.getresponse()
+        return response.status, response.read(), not response.will_close
+
+    def request(self, method, address, body=None, headers=None):
+        """Send one request over a pooled connection.
+
+        :param str method: The HTTP method, e. g. `GET` or `PUT`.
+        :param str address: The request path, e. g. `/api/<username>/lights`.
+        :param body: The request body.
+        :type body: str or bytes
+        :param dict headers: Additional request headers.
+
+        :return: A tuple `(status, body)`.
+        """
+        if headers is None:
+            headers = {}
+        self._count('requests')
+        connection, reused = self._acquire()
+        try:
+            try:
+                status, data, keep_alive = self._send(connection, method,
+                                                      address, body, headers)
+            except STALE_CONNECTION_ERRORS:
+                if not reused:
+                    raise
+                connection.close()
+                self._count('reconnects')
+                connection = self._new_connection()
+                status, data, keep_alive = self._send(connection, method,
+                                                      address, body, headers)
+        except Exception:
+            self._release(connection, reusable=False)
+            raise
+        self._release(connection, reusable=keep_alive)
+        return status, data
+
+    def close(self):
+        """Close all idle connections. Connections in use are closed when
+        they are released."""
+        with self._lock:
+            self.closed = True
+            while self._idle:
+                connection, _ = self._idle.pop()
+                connection.close()
+
+    def stats(self):
+        """Return pool statistics.
+
+        .. code-block:: python
+
+            {
+                'size': 4,
+                'in_use': 1,
+                'idle': 2,
+                'created': 3,
+                'reused': 120,
+                'reconnects': 1,
+                'discarded': 0,
+                'requests': 123,
+            }
+        """
+        with self._lock:
+            stats = {
+                'size': self.size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+            }
+            stats.update(self._counters)
+            return stats
@@ -0,0 +1,468 @@
+"""A resident daemon controlled over a local Unix socket.
+
+Every call of `lively-lights.py` reads the configuration, connects to the
+bridge and fetches the lights from scratch. The daemon does this once and
+keeps the bridge connections, the caches, the reachable states and the
+scheduler warm. The subcommands `scene` and `launch` are sent to a running
+daemon, so they return after a few milliseconds.
+
+.. code-block:: shell
+
+    lively-lights.py daemon serve &
+    lively-lights.py scene breath --time-range 1 3
+    lively-lights.py daemon set hue_range='[0, 20000]'
+    lively-lights.py daemon status
+    lively-lights.py daemon metrics
+    lively-lights.py daemon stop
+
+The protocol: one JSON object per line in both directions. A request names
+its command, the response reports if it succeeded.
+
+.. code-block:: python
+
+    {'command': 'scene', 'scene': 'breath', 'properties': {}}
+    {'ok': True}
+    {'command': 'set', 'properties': {'brightness': 300}}
+    {'ok': False, 'error': 'Invalid brightness value: 300 ...'}
+"""
+
+from lively_lights import scenes, types
+from lively_lights.metrics import RequestMetrics, format_stats
+from lively_lights.scheduler import Scheduler
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET_PATH = '~/.lively-lights.sock'
+"""The path of the control socket."""
+
+
+class Controller(object):
+    """Run one scene or playlist at a time in a background thread and
+    answer the requests of the control clients.
+
+    :param bridge: The bridge object.
+    :type bridge: lively_lights.phue.Bridge
+
+    :param reachable_lights: An object containing the specified and
+      reachable lights.
+    :type reachable_lights: lively_lights.environment.ReachableLights
+
+    :param int verbosity_level: The verbosity level of the scenes.
+
+    :param float stop_timeout: Wait n seconds for a stopped scene to end.
+    """
+
+    def __init__(self, bridge, reachable_lights, verbosity_level=0,
+                 stop_timeout=10):
+        self.bridge = bridge
+        self.reachable_lights = reachable_lights
+        self.verbosity_level = verbosity_level
+        self.stop_timeout = stop_timeout
+
+        self.scheduler = Scheduler()
+        """The event loop shared by all scenes of the daemon
+        :class:`lively_lights.scheduler.Scheduler`"""
+
+        self.request_metrics = RequestMetrics()
+        """Collects the metrics of the requests to the bridge
+        :class:`lively_lights.metrics.RequestMetrics`"""
+
+        self._light_ids = reachable_lights.light_ids
+        """The lights of the daemon if a request names no lights."""
+
+        self._lock = threading.Lock()
+        self._runner = None
+        """The running scene or launcher."""
+        self._thread = None
+        self._started_at = None
+
+        self._commands = {
+            'launch': self.launch,
+            'metrics': self.metrics,
+            'ping': self.ping,
+            'scene': self.start_scene,
+            'set': self.set_properties,
+            'status': self.status,
+            'stop': self.stop,
+        }
+
+    def start(self):
+        """Start the shared scheduler and the background refresh of the
+        reachable states. Collect the request metrics."""
+        self.bridge.add_hook(self.request_metrics)
+        self.scheduler.start()
+        self.reachable_lights.start_refresh_thread()
+
+    def close(self):
+        """Stop the running scene and the background threads."""
+        self.stop()
+        self.reachable_lights.stop_refresh_thread()
+        self.scheduler.stop()
+        self.bridge.dispatcher.flush(self.stop_timeout)
+        self.bridge.remove_hook(self.request_metrics)
+
+    def _use_lights(self, light_ids):
+        if light_ids:
+            if not isinstance(light_ids, list):
+                raise ValueError('The lights have to be a list of light '
+                                 'IDs.')
+            # JSON has no tuples: `('living', 3)` arrives as a list.
+            light_ids = list(types.light_id_list(light_ids))
+        self.reachable_lights.light_ids = light_ids or self._light_ids
+
+    def _run(self, runner, target):
+        self.stop()
+        thread = threading.Thread(target=self._run_target,
+                                  args=(runner, target),
+                                  name='lively-lights-scene')
+        thread.daemon = True
+        with self._lock:
+            self._runner = runner
+            self._thread = thread
+            self._started_at = time.monotonic()
+        thread.start()
+
+    def _run_target(self, runner, target):
+        try:
+            target()
+        except Exception:
+            logger.exception('The scene {} failed.'.format(runner))
+        finally:
+            with self._lock:
+                if self._runner is runner:
+                    self._runner = None
+                    self._thread = None
+                    self._started_at = None
+
+    def _current_scene(self):
+        runner = self._runner
+        if isinstance(runner, scenes.Launcher):
+            return runner.scene
+        return runner
+
+    def handle(self, request):
+        """Answer one request.
+
+        :param dict request: The decoded request, the key `command` names
+          the method to call, the other keys are its arguments.
+
+        :return: The response dictionary.
+        """
+        if not isinstance(request, dict) or 'command' not in request:
+            raise ValueError('A request needs a “command”.')
+        arguments = dict(request)
+        command = arguments.pop('command')
+        if command not in self._commands:
+            raise ValueError('Unknown command “{}”.'.format(command))
+        response = {'ok': True}
+        response.update(self._commands[command](**arguments) or {})
+        return response
+
+    def ping(self):
+        return {'pid': os.getpid()}
+
+    def start_scene(self, scene, properties=None, duration=None,
+                    lights=None):
+        """Start a scene and stop the running one.
+
+        :param str scene: The name of the scene, e. g. `breath`.
+        :param dict properties: The properties of the scene.
+        :param float duration: Play the scene n seconds, by default endless.
+        :param list lights: The IDs of the lights, by default the lights of
+          the daemon.
+        """
+        Scene = scenes.Launcher._get_scene_class(scene)
+        self._use_lights(lights)
+        instance = Scene(self.bridge, self.reachable_lights,
+                         scheduler=self.scheduler)
+        instance.get_properties_from_dict(properties or {})
+        self._run(instance, lambda: instance.start(duration))
+
+    def launch(self, yamlfile, randomized=False, endless=False,
+               duration=None, lights=None):
+        """Launch a playlist and stop the running scene.
+
+        :param str yamlfile: The path of a yaml file containing the scene
+          configurations. The daemon reads the file.
+        """
+        self._use_lights(lights)
+        launcher = scenes.Launcher(
+            self.bridge,
+            self.reachable_lights,
+            scene_configs_file=yamlfile,
+            verbosity_level=self.verbosity_level,
+            scheduler=self.scheduler,
+        )
+        self._run(launcher, lambda: launcher.launch(
+            randomized=randomized,
+            endless=endless,
+            duration=duration,
+        ))
+
+    def set_properties(self, properties):
+        """Change properties of the running scene."""
+        scene = self._current_scene()
+        if scene is None:
+            raise ValueError('No scene is running.')
+        scene.set_properties(properties)
+
+    def stop(self):
+        """Stop the running scene or playlist.
+
+        :return: `stopped`: False if nothing was running.
+        """
+        with self._lock:
+            runner = self._runner
+            thread = self._thread
+        if runner is None:
+            return {'stopped': False}
+        runner.stop()
+        thread.join(self.stop_timeout)
+        return {'stopped': True}
+
+    def metrics(self):
+        """The request metrics and the statistics of the dispatcher, the
+        cache and the connection pool in the Prometheus text format.
+
+        :return: `text`
+        """
+        return {'text': ''.join((
+            self.request_metrics.prometheus(),
+            format_stats('dispatcher', self.bridge.dispatcher.stats()),
+            format_stats('cache', self.bridge.state_cache.stats()),
+            format_stats('connections', self.bridge.pool_stats()),
+        ))}
+
+    def status(self):
+        """The running scene, its properties and the statistics of the
+        bridge client."""
+        with self._lock:
+            started_at = self._started_at
+        scene = self._current_scene()
+        status = {
+            'pid': os.getpid(),
+            'scene': None,
+            'lights': self.reachable_lights.light_ids,
+            'dispatcher': self.bridge.dispatcher.stats(),
+            'cache': self.bridge.state_cache.stats(),
+            'connections': self.bridge.pool_stats(),
+        }
+        if started_at is not None:
+            status['running'] = time.monotonic() - started_at
+        if scene is not None:
+            status['scene'] = scene.name
+            status['title'] = scene.title
+            status['properties'] = {
+                name: getattr(scene, name) for name in scene.properties}
+        return status
+
+
+class ControlRequestHandler(socketserver.StreamRequestHandler):
+    """Read JSON requests line by line and write one JSON response per
+    request."""
+
+    def _respond(self, line):
+        try:
+            request = json.loads(line.decode('utf-8'))
+            if isinstance(request, dict) and \
+               request.get('command') == 'shutdown':
+                threading.Thread(target=self.server.shutdown).start()
+                return {'ok': True}
+            return self.server.controller.handle(request)
+        except (ValueError, TypeError, KeyError) as error:
+            return {'ok': False, 'error': str(error)}
+        except Exception as error:
+            logger.exception('The request {!r} failed.'.format(line))
+            return {'ok': False, 'error': str(error)}
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response = self._respond(line)
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class ControlServer(socketserver.ThreadingMixIn,
+                    socketserver.UnixStreamServer):
+    """Listen on a Unix socket only the current user can connect to.
+
+    :param str socket_path: The path of the socket.
+
+    :param controller: Answers the requests.
+    :type controller: lively_lights.control.Controller
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, controller):
+        self.socket_path = os.path.expanduser(socket_path)
+        self.controller = controller
+        if os.path.exists(self.socket_path):
+            if ControlClient(self.socket_path).is_running():
+                raise RuntimeError('A daemon is already listening on '
+                                   '“{}”.'.format(self.socket_path))
+            # Left behind by a daemon that was killed.
+            os.unlink(self.socket_path)
+        socketserver.UnixStreamServer.__init__(self, self.socket_path,
+                                               ControlRequestHandler)
+        os.chmod(self.socket_path, 0o600)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class ControlClient(object):
+    """Send requests to a running daemon.
+
+    :param str socket_path: The path of the socket of the daemon.
+    :param float timeout: Wait n seconds for a response.
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, timeout=15):
+        self.socket_path = os.path.expanduser(socket_path)
+        self.timeout = timeout
+
+    def request(self, command, **arguments):
+        """Send one request.
+
+        :return: The response dictionary without the key `ok`.
+
+        :raises OSError: If no daemon is listening.
+        :raises ValueError: If the daemon rejects the request.
+        """
+        request = dict(arguments, command=command)
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(self.timeout)
+        try:
+            connection.connect(self.socket_path)
+            connection.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            with connection.makefile('rb') as stream:
+                line = stream.readline()
+        finally:
+            connection.close()
+        if not line:
+            raise ConnectionError('The daemon closed the connection.')
+        response = json.loads(line.decode('utf-8'))
+        if not response.pop('ok'):
+            raise ValueError(response['error'])
+        return response
+
+    def is_running(self):
+        """True if a daemon answers on the socket."""
+        if not os.path.exists(self.socket_path):
+            return False
+        try:
+            self.request('ping')
+            return True
+        except (OSError, ValueError):
+            return False
+
+
+def serve(bridge, reachable_lights, socket_path=DEFAULT_SOCKET_PATH,
+          verbosity_level=0):
+    """Run the daemon until the command `shutdown` is received."""
+    controller = Controller(bridge, reachable_lights, verbosity_level)
+    server = ControlServer(socket_path, controller)
+    controller.start()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        controller.close()
+
+
+def properties_from_args(args):
+    """The scene properties given on the command line."""
+    Scene = scenes.Launcher._get_scene_class(args.scene)
+    return {name: getattr(args, name) for name in Scene.properties
+            if getattr(args, name, None)}
+
+
+def parse_assignments(assignments):
+    """Convert `name=value` strings into a dictionary. The values are
+    decoded as JSON if possible, e. g. `hue_range=[0,20000]`."""
+    properties = {}
+    for assignment in assignments:
+        if '=' not in assignment:
+            raise ValueError('Expected “name=value”: {}'.format(assignment))
+        name, value = assignment.split('=', 1)
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+        properties[name.strip().replace('-', '_')] = value
+    return properties
+
+
+def format_status(status):
+    out = []
+    out.append('pid: {}'.format(status['pid']))
+    out.append('scene: {}'.format(status['scene'] or '-'))
+    if status.get('title'):
+        out.append('title: {}'.format(status['title']))
+    if 'running' in status:
+        out.append('running: {:.0f} s'.format(status['running']))
+    for name, value in sorted(status.get('properties', {}).items()):
+        out.append('{}: {}'.format(name, value))
+    for section in ('dispatcher', 'cache', 'connections'):
+        values = ', '.join('{}={}'.format(key, value)
+                           for key, value in status[section].items())
+        out.append('{}: {}'.format(section, values))
+    return '\n'.join(out)
+
+
+def forward(client, args):
+    """Send the subcommand `scene` or `launch` to a running daemon."""
+    if args.subcommand == 'scene':
+        client.request(
+            'scene',
+            scene=args.scene,
+            properties=properties_from_args(args),
+            duration=args.duration,
+            lights=args.lights,
+        )
+    else:
+        client.request(
+            'launch',
+            yamlfile=os.path.abspath(args.yamlfile),
+            randomized=args.randomized,
+            endless=args.endless,
+            duration=args.duration,
+            lights=args.lights,
+        )
+
+
+def main(args):
+    """The client side of the subcommand `daemon`.
+
+    :param args: The parsed arguments.
+    """
+    client = ControlClient(args.socket)
+    try:
+        if args.daemon == 'status':
+            print(format_status(client.request('status')))
+        elif args.daemon == 'metrics':
+            print(client.request('metrics')['text'], end='')
+        elif args.daemon == 'stop':
+            client.request('stop')
+        elif args.daemon == 'set':
+            client.request('set',
+                           properties=parse_assignments(args.properties))
+        elif args.daemon == 'shutdown':
+            client.request('shutdown')
+    except OSError:
+        raise SystemExit('No daemon is listening on “{}”.'.format(
+            client.socket_path))
+    except ValueError as error:
+        raise SystemExit(str(error))
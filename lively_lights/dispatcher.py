@@ -0,0 +1,857 @@
+"""Send light and group commands to the bridge without exceeding its
+command budget."""
+
+from lively_lights.store import LightStateStore
+import collections
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SHADOW_FIELDS = ('on', 'bri', 'hue', 'sat', 'xy', 'ct', 'effect')
+"""Light state fields that are left out of a command if the light already
+has the value. Other fields (`alert`, `transitiontime`, `bri_inc` ...) are
+actions and always sent."""
+
+_UNKNOWN = object()
+
+
+class TokenBucket(object):
+    """A token bucket rate limiter.
+
+    :param float rate: Tokens added per second.
+
+    :param float burst: The capacity of the bucket, by default the rate (but
+      at least one token).
+
+    :param clock: A function returning monotonic seconds.
+    """
+
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        if rate <= 0:
+            raise ValueError('The rate must be greater than 0.')
+        if burst is None:
+            burst = max(1, rate)
+        self.rate = rate
+        """Tokens added per second."""
+        self.burst = burst
+        """The capacity of the bucket."""
+        self._clock = clock
+        self._tokens = burst
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.burst,
+                           self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self):
+        """Seconds to wait until the next token is available."""
+        self._refill()
+        if self._tokens >= 1:
+            return 0
+        return (1 - self._tokens) / self.rate
+
+    def consume(self):
+        """Take one token if available.
+
+        :return: True if a token was taken.
+        """
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+
+class ShadowState(object):
+    """The last known state of each light as set by this client.
+
+    Fields are remembered when a command is sent and forgotten if the
+    bridge answers with an error. A remembered field expires after `ttl`
+    seconds, because other apps, switches or a power cycle can change the
+    light in the meantime.
+
+    :param float ttl: Forget the state of a light n seconds after the last
+      command. `0` disables the delta suppression.
+
+    :param clock: A function returning monotonic seconds.
+    """
+
+    def __init__(self, ttl=30, clock=time.monotonic):
+        self.ttl = ttl
+        """Forget the state of a light after n seconds."""
+
+        self._clock = clock
+        self._store = LightStateStore(SHADOW_FIELDS, clock=clock)
+        """The field values and the time they were set."""
+
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.ttl)
+
+    def _has(self, light_id, field, value):
+        return self._store.get(light_id, field, _UNKNOWN, self.ttl) == value
+
+    def delta(self, light_ids, data):
+        """Leave out the fields all lights already have.
+
+        :param list light_ids: The IDs of the lights, None if unknown.
+        :param dict data: A light state or group action.
+
+        :return: The changed fields. `transitiontime` is only kept if
+          another field changed. An empty dictionary means there is nothing
+          to send.
+        """
+        if not self.enabled or light_ids is None:
+            return dict(data)
+        delta = {}
+        with self._lock:
+            for field, value in data.items():
+                if field == 'transitiontime':
+                    continue
+                if field in SHADOW_FIELDS and all(
+                   self._has(light_id, field, value)
+                   for light_id in light_ids):
+                    continue
+                delta[field] = value
+        if delta and 'transitiontime' in data:
+            delta['transitiontime'] = data['transitiontime']
+        return delta
+
+    def remember(self, light_ids, data):
+        """Store the fields of a command that is about to be sent."""
+        if not self.enabled or light_ids is None:
+            return
+        now = self._clock()
+        with self._lock:
+            for light_id in light_ids:
+                for field, value in data.items():
+                    if field in SHADOW_FIELDS:
+                        self._store.set(light_id, field, value, now)
+                    elif field.endswith('_inc'):
+                        # A relative change: the new value is unknown.
+                        self._store.discard([light_id], [field[:-4]])
+
+    def forget(self, light_ids=None, fields=None):
+        """Forget the state of some lights or of all lights.
+
+        :param list light_ids: The IDs of the lights, None for all lights.
+        :param list fields: Forget only these fields.
+        """
+        with self._lock:
+            self._store.discard(light_ids, fields)
+
+    def push(self, changes):
+        """Forget the fields other apps or switches have changed. Changes
+        caused by this client (the pushed value is the remembered one) keep
+        the field.
+
+        :param list changes: `(keys, value)` tuples pushed by the bridge,
+          see :meth:`lively_lights.cache.StateCache.push`.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            for keys, value in changes:
+                if len(keys) != 4 or keys[0] != 'lights' or \
+                   keys[3] not in SHADOW_FIELDS:
+                    continue
+                light_id = int(keys[1])
+                if not self._has(light_id, keys[3], value):
+                    self._store.discard([light_id], [keys[3]])
+
+    def update(self, response, members):
+        """Apply the response of a `PUT` request: remember successfully set
+        fields and forget the fields the bridge rejected.
+
+        :param response: The decoded response of the bridge.
+
+        :param members: A function returning the light IDs of a group ID or
+          None if the members are unknown.
+        """
+        if not self.enabled or not isinstance(response, list):
+            return
+        for item in response:
+            if not isinstance(item, dict):
+                continue
+            if 'success' in item:
+                paths = item['success'].items()
+            elif 'error' in item:
+                paths = [(item['error'].get('address', ''), None)]
+            else:
+                continue
+            for path, value in paths:
+                keys = path.strip('/').split('/')
+                if len(keys) != 4 or keys[2] not in ('state', 'action'):
+                    continue
+                if keys[0] == 'lights':
+                    light_ids = [int(keys[1])]
+                elif keys[0] == 'groups':
+                    light_ids = members(int(keys[1]))
+                else:
+                    # Sensors have a state too, but no lights.
+                    continue
+                if light_ids is None:
+                    self.forget()
+                elif 'error' in item:
+                    self.forget(light_ids, [keys[3]])
+                else:
+                    self.remember(light_ids, {keys[3]: value})
+
+
+class GroupCache(object):
+    """Map sets of lights to groups on the bridge, so that one group action
+    can replace one command per light.
+
+    A group on the bridge containing exactly the requested lights is reused.
+    Otherwise a group named `lively-lights <n>` is created. If there are
+    already `max_groups` of these groups, the least recently used one that
+    is not busy gets the new lights.
+
+    Note that this changes the configuration of the bridge: the created
+    groups show up in the Hue app until
+    :meth:`lively_lights.dispatcher.GroupCache.remove` deletes them. Groups
+    left over by a previous run (e. g. after a crash) are reused.
+
+    :param bridge: The bridge object.
+    :type bridge: lively_lights.phue.Bridge
+
+    :param int max_groups: The maximum number of groups to create on the
+      bridge.
+
+    :param float retry_interval: Seconds to wait before trying again to
+      set up a group after an error.
+
+    :param throttle: A function `throttle(wait)` returning True if a write
+      to the groups of the bridge may be sent now. With `wait=True` it
+      blocks until then. None sends the writes without limit.
+    """
+
+    name_prefix = 'lively-lights'
+    """The name prefix of the groups created on the bridge."""
+
+    def __init__(self, bridge, max_groups=4, retry_interval=60,
+                 throttle=None):
+        self.bridge = bridge
+        """The bridge object: :class:`lively_lights.phue.Bridge`"""
+
+        self.max_groups = max_groups
+        """The maximum number of groups to create on the bridge."""
+
+        self.retry_interval = retry_interval
+        """Seconds to wait before trying again after an error."""
+
+        self.throttle = throttle
+        """Limits the writes to the groups of the bridge."""
+
+        self._groups = collections.OrderedDict()
+        """Group IDs by the frozen set of their light IDs, least recently
+        used first.
+
+        .. code-block:: python
+
+            self._groups = {
+                frozenset({1, 2, 3}): 0,
+                frozenset({1, 2}): 5,
+            }
+
+        """
+
+        self._owned = {}
+        """The names of the groups named with :attr:`name_prefix` by group
+        ID."""
+
+        self._loaded = False
+        self._failed_at = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        all_lights = frozenset(self.bridge.get_light_objects('id'))
+        if all_lights:
+            # Group 0 is a special group containing all lights.
+            self._groups[all_lights] = 0
+        for group_id, info in self.bridge.get_group().items():
+            group_id = int(group_id)
+            name = info.get('name', '')
+            if name.startswith(self.name_prefix):
+                self._owned[group_id] = name
+            lights = frozenset(int(light) for light in info.get('lights', ()))
+            if lights and lights not in self._groups:
+                self._groups[lights] = group_id
+        self._loaded = True
+
+    def _may_write(self, wait=False):
+        return self.throttle is None or self.throttle(wait)
+
+    def _create(self, light_ids):
+        names = set(self._owned.values())
+        number = 1
+        while '{} {}'.format(self.name_prefix, number) in names:
+            number += 1
+        name = '{} {}'.format(self.name_prefix, number)
+        result = self.bridge.create_group(name, sorted(light_ids))
+        group_id = int(result[0]['success']['id'])
+        self._owned[group_id] = name
+        return group_id
+
+    def _reassign(self, light_ids, busy):
+        for lights, group_id in self._groups.items():
+            if group_id in self._owned and group_id not in busy:
+                result = self.bridge.set_group(group_id, 'lights',
+                                               sorted(light_ids))
+                if 'success' not in result[0][0]:
+                    raise ValueError(result)
+                del self._groups[lights]
+                return group_id
+        return None
+
+    def get_group_id(self, light_ids, busy=()):
+        """Look up, create or reassign a group containing exactly the given
+        lights.
+
+        :param list light_ids: The IDs of the lights.
+
+        :param busy: IDs of groups with pending commands. Their lights must
+          not be changed.
+
+        :return: The ID of the group or None if no group is available.
+        """
+        key = frozenset(light_ids)
+        with self._lock:
+            if self._failed_at is not None and \
+               time.monotonic() - self._failed_at < self.retry_interval:
+                return None
+            try:
+                if not self._loaded:
+                    self._load()
+                if key in self._groups:
+                    self._groups.move_to_end(key)
+                    return self._groups[key]
+                if not self._may_write():
+                    # No budget left, the lights are set one by one.
+                    return None
+                if len(self._owned) < self.max_groups:
+                    group_id = self._create(key)
+                else:
+                    group_id = self._reassign(key, busy)
+                    if group_id is None:
+                        return None
+                self._groups[key] = group_id
+                return group_id
+            except Exception:
+                self._failed_at = time.monotonic()
+                logger.exception('Setting up a group for the lights {} '
+                                 'failed.'.format(sorted(key)))
+                return None
+
+    def get_light_ids(self, group_id):
+        """The IDs of the lights of a known group.
+
+        :return: A frozen set or None if the group is unknown.
+        """
+        with self._lock:
+            for lights, known_group_id in self._groups.items():
+                if known_group_id == group_id:
+                    return lights
+        return None
+
+    def remove(self):
+        """Delete the groups created on the bridge. Errors are logged."""
+        with self._lock:
+            for group_id in sorted(self._owned):
+                self._may_write(wait=True)
+                try:
+                    self.bridge.delete_group(group_id)
+                except Exception:
+                    logger.exception('Deleting the group {} failed.'.format(
+                        group_id))
+            self._groups.clear()
+            self._owned.clear()
+            self._loaded = False
+
+    def invalidate(self):
+        """Forget all groups. They are read again from the bridge on the
+        next lookup."""
+        with self._lock:
+            self._groups.clear()
+            self._owned.clear()
+            self._loaded = False
+            self._failed_at = None
+
+
+class Flow(object):
+    """The commands of one client (e. g. a room) sharing a dispatcher with
+    other clients. The dispatcher sends the commands of its flows by
+    weighted fair queuing: while several flows have queued commands, each
+    flow gets a share of the command budget proportional to its weight, no
+    matter how many commands it queues.
+
+    A flow has the interface of :class:`lively_lights.dispatcher.Dispatcher`
+    the scenes use. Get one with
+    :meth:`lively_lights.dispatcher.Dispatcher.flow`.
+
+    :param dispatcher: :class:`lively_lights.dispatcher.Dispatcher`
+    :param str name: The name of the flow, e. g. the name of the room.
+    :param float weight: The share of the command budget.
+    """
+
+    def __init__(self, dispatcher, name, weight=1):
+        self.dispatcher = dispatcher
+        self.name = name
+        self.weight = weight
+
+        self.finish = 0
+        """The virtual finish time of the last queued command."""
+
+        self.counters = {
+            'queued': 0,
+            'sent': 0,
+            'coalesced': 0,
+            'suppressed': 0,
+        }
+
+    @property
+    def shadow(self):
+        return self.dispatcher.shadow
+
+    def set_light(self, light_id, data):
+        self.dispatcher.set_light(light_id, data, flow=self.name)
+
+    def set_group(self, group_id, data):
+        self.dispatcher.set_group(group_id, data, flow=self.name)
+
+    def set_lights(self, light_ids, data):
+        self.dispatcher.set_lights(light_ids, data, flow=self.name)
+
+    def flush(self, timeout=None):
+        return self.dispatcher.flush(timeout)
+
+    def stats(self):
+        """The counters of the flow, see
+        :meth:`lively_lights.dispatcher.Dispatcher.flow_stats`."""
+        return self.dispatcher.flow_stats()[self.name]
+
+
+class Dispatcher(object):
+    """Queue light and group commands and send them to the bridge in a
+    background thread. Light and group commands have separate budgets, the
+    Hue bridge handles about 10 light commands and 1 group command per
+    second.
+
+    There is at most one pending command per light (or group). A new command
+    for a light with an unsent command is merged field by field into the
+    pending one (last write wins) and keeps its place in the queue. The
+    queue can therefore never grow larger than the number of lights.
+
+    The same state for several lights is sent as one group action (see
+    :class:`lively_lights.dispatcher.GroupCache`). Setting up these groups
+    on the bridge counts against the group budget.
+    :meth:`lively_lights.dispatcher.Dispatcher.close` deletes them again.
+
+    Several clients share the budget fairly through flows (see
+    :class:`lively_lights.dispatcher.Flow`).
+
+    Fields the lights already have are left out of a command, a command
+    without changed fields is not sent at all (see
+    :class:`lively_lights.dispatcher.ShadowState`).
+
+    :param bridge: The bridge object.
+    :type bridge: lively_lights.phue.Bridge
+
+    :param float light_rate: Light commands per second.
+
+    :param float group_rate: Group commands per second.
+
+    :param float shadow_ttl: Seconds to remember the state sent to a light.
+      `0` disables the delta suppression.
+    """
+
+    def __init__(self, bridge, light_rate=10, group_rate=1, shadow_ttl=30):
+        self.bridge = bridge
+        """The bridge object: :class:`lively_lights.phue.Bridge`"""
+
+        self._buckets = {
+            'lights': TokenBucket(light_rate),
+            'groups': TokenBucket(group_rate),
+        }
+        self._queues = {
+            'lights': collections.OrderedDict(),
+            'groups': collections.OrderedDict(),
+        }
+        self.groups = GroupCache(bridge, throttle=self._group_token)
+        """:class:`lively_lights.dispatcher.GroupCache`"""
+
+        self.shadow = ShadowState(ttl=shadow_ttl)
+        """:class:`lively_lights.dispatcher.ShadowState`"""
+
+        self._group_members = {}
+        """The light IDs of groups with pending or in-flight commands by
+        group ID. Commands for these lights wait until the group command is
+        sent."""
+
+        self._flows = {}
+        """:class:`lively_lights.dispatcher.Flow` objects by name."""
+
+        self._tags = {'lights': {}, 'groups': {}}
+        """`(virtual finish time, flow name)` of the queued commands by
+        resource ID."""
+
+        self._virtual_time = 0
+        """The virtual finish time of the last sent command."""
+
+        self._condition = threading.Condition()
+        self._thread = None
+        self._closed = False
+        """True after :meth:`lively_lights.dispatcher.Dispatcher.close`.
+        Commands are still sent, but the thread ends as soon as the queue
+        is empty."""
+
+        self._sending = 0
+        self._counters = {
+            'lights_sent': 0,
+            'groups_sent': 0,
+            'coalesced': 0,
+            'suppressed': 0,
+            'errors': 0,
+            'max_queue_depth': 0,
+        }
+
+    def _group_token(self, wait=False):
+        """Take a token of the group budget for a write of the group
+        cache.
+
+        :param bool wait: Block until a token is available.
+
+        :return: True if a token was taken.
+        """
+        bucket = self._buckets['groups']
+        with self._condition:
+            while not bucket.consume():
+                if not wait:
+                    return False
+                self._condition.wait(bucket.delay())
+            return True
+
+    def _address(self, kind, resource_id):
+        if kind == 'lights':
+            address = '/api/{}/lights/{}/state'
+        else:
+            address = '/api/{}/groups/{}/action'
+        return address.format(self.bridge.username, resource_id)
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run,
+                                            name='lively-lights-dispatcher')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def flow(self, name, weight=1):
+        """Get the flow of a client, e. g. a room. The weight of an existing
+        flow is updated.
+
+        :param str name: The name of the flow.
+        :param float weight: The share of the command budget.
+
+        :return: :class:`lively_lights.dispatcher.Flow`
+        """
+        if weight <= 0:
+            raise ValueError('The weight of a flow has to be greater than 0.')
+        with self._condition:
+            if name not in self._flows:
+                self._flows[name] = Flow(self, name, weight)
+            flow = self._flows[name]
+            flow.weight = weight
+            return flow
+
+    def _tag(self, kind, resource_id, name):
+        """Assign the virtual finish time to a new command of a flow. Must
+        be called with the condition held."""
+        if name not in self._flows:
+            self._flows[name] = Flow(self, name)
+        flow = self._flows[name]
+        flow.finish = max(self._virtual_time, flow.finish) + 1 / flow.weight
+        self._tags[kind][resource_id] = (flow.finish, name)
+        flow.counters['queued'] += 1
+
+    def _dequeue(self, kind, resource_id, counter=None):
+        """Remove a command from the queue. Must be called with the
+        condition held."""
+        del self._queues[kind][resource_id]
+        finish, name = self._tags[kind].pop(resource_id)
+        if counter is not None:
+            self._flows[name].counters[counter] += 1
+        if counter == 'sent':
+            self._virtual_time = max(self._virtual_time, finish)
+
+    def _enqueue(self, kind, resource_id, data, flow=None):
+        with self._condition:
+            queue = self._queues[kind]
+            if resource_id in queue:
+                queue[resource_id].update(data)
+                self._counters['coalesced'] += 1
+                name = self._tags[kind][resource_id][1]
+                self._flows[name].counters['coalesced'] += 1
+            else:
+                queue[resource_id] = dict(data)
+                self._tag(kind, resource_id, flow)
+            depth = self._queue_depth()
+            if depth > self._counters['max_queue_depth']:
+                self._counters['max_queue_depth'] = depth
+            self._start()
+            self._condition.notify_all()
+
+    def set_light(self, light_id, data, flow=None):
+        """Queue a state change of one light.
+
+        :param int light_id: The ID of the light.
+        :param dict data: The new state, e. g. `{'bri': 254, 'on': True}`.
+        :param str flow: The name of the flow the command belongs to.
+        """
+        self._enqueue('lights', light_id, data, flow)
+
+    def set_group(self, group_id, data, flow=None):
+        """Queue an action for a group of lights.
+
+        :param int group_id: The ID of the group.
+        :param dict data: The action, e. g. `{'bri': 254, 'on': True}`.
+        :param str flow: The name of the flow the command belongs to.
+        """
+        self._enqueue('groups', group_id, data, flow)
+
+    def set_lights(self, light_ids, data, flow=None):
+        """Queue the same state change for several lights. The state is
+        broadcast as one group action if possible.
+
+        :param list light_ids: The IDs of the lights.
+        :param dict data: The new state, e. g. `{'bri': 254, 'on': True}`.
+        :param str flow: The name of the flow the command belongs to.
+        """
+        light_ids = list(light_ids)
+        if not light_ids:
+            return
+        group_id = None
+        if len(light_ids) > 1:
+            with self._condition:
+                busy = set(self._group_members)
+            group_id = self.groups.get_group_id(light_ids, busy)
+        if group_id is None:
+            for light_id in light_ids:
+                self.set_light(light_id, data, flow)
+            return
+
+        fields = set(data)
+        fields.discard('transitiontime')
+        with self._condition:
+            lights = self._queues['lights']
+            for light_id in light_ids:
+                if light_id not in lights:
+                    continue
+                # The group action overwrites these fields anyway.
+                for field in fields:
+                    lights[light_id].pop(field, None)
+                if not set(lights[light_id]) - {'transitiontime'}:
+                    self._dequeue('lights', light_id, 'coalesced')
+                    self._counters['coalesced'] += 1
+            self._group_members[group_id] = frozenset(light_ids)
+            self._enqueue('groups', group_id, data, flow)
+
+    def _queue_depth(self):
+        return len(self._queues['lights']) + len(self._queues['groups'])
+
+    @property
+    def queue_depth(self):
+        """The number of queued, not yet sent commands."""
+        with self._condition:
+            return self._queue_depth()
+
+    def _next_resource_id(self, kind):
+        """The queued resource that can be sent now: the first one or, if
+        there are several flows, the one with the smallest virtual finish
+        time. Lights that are members of a pending group have to wait for
+        the group command."""
+        queue = self._queues[kind]
+        candidates = iter(queue)
+        if kind == 'lights' and self._group_members:
+            blocked = frozenset().union(*self._group_members.values())
+            candidates = (light_id for light_id in queue
+                          if light_id not in blocked)
+        if len(self._flows) > 1:
+            tags = self._tags[kind]
+            return min(candidates,
+                       key=lambda resource_id: tags[resource_id][0],
+                       default=None)
+        return next(candidates, None)
+
+    def _light_ids(self, kind, resource_id):
+        """The IDs of the lights a command changes, None if unknown."""
+        if kind == 'lights':
+            return [resource_id]
+        return self._group_members.get(resource_id)
+
+    def _next_command(self):
+        """Return `(kind, resource_id, data)` or the number of seconds to
+        wait for a token. Must be called with the condition held."""
+        delays = []
+        # Group commands first: they are rare and replace many light
+        # commands.
+        for kind in ('groups', 'lights'):
+            while True:
+                resource_id = self._next_resource_id(kind)
+                if resource_id is None:
+                    break
+                light_ids = self._light_ids(kind, resource_id)
+                data = self.shadow.delta(light_ids,
+                                         self._queues[kind][resource_id])
+                if not data:
+                    # The lights already have this state.
+                    self._dequeue(kind, resource_id, 'suppressed')
+                    self._finish(kind, resource_id)
+                    self._counters['suppressed'] += 1
+                    continue
+                if self._buckets[kind].consume():
+                    self._dequeue(kind, resource_id, 'sent')
+                    self.shadow.remember(light_ids, data)
+                    return kind, resource_id, data
+                delays.append(self._buckets[kind].delay())
+                break
+        if delays:
+            return min(delays)
+        return None
+
+    def _finish(self, kind, resource_id):
+        """Release the lights of a sent or dropped group command. Must be
+        called with the condition held."""
+        if kind == 'groups' and resource_id not in self._queues['groups']:
+            self._group_members.pop(resource_id, None)
+        self._condition.notify_all()
+
+    def _send(self, kind, resource_id, data):
+        try:
+            self.bridge.request('PUT', self._address(kind, resource_id), data)
+        except Exception:
+            with self._condition:
+                self._counters['errors'] += 1
+                light_ids = self._light_ids(kind, resource_id)
+            self.shadow.forget(light_ids)
+            logger.exception('Sending {} to {} {} failed.'.format(
+                data, kind, resource_id))
+        else:
+            with self._condition:
+                self._counters[kind + '_sent'] += 1
+
+    def update(self, mode, response):
+        """Apply the response of a request to the bridge to the shadow
+        state. The bridge calls this method for every request, so state
+        changes made without the dispatcher are noticed too.
+
+        :param str mode: The HTTP method.
+        :param response: The decoded response of the bridge.
+        """
+        if mode == 'PUT':
+            self.shadow.update(response, self.groups.get_light_ids)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                command = self._next_command()
+                while not isinstance(command, tuple):
+                    if command is None and self._closed:
+                        # Started again by the next queued command.
+                        self._thread = None
+                        return
+                    self._condition.wait(command)
+                    command = self._next_command()
+                self._sending += 1
+            try:
+                self._send(*command)
+            finally:
+                with self._condition:
+                    kind, resource_id, _ = command
+                    self._sending -= 1
+                    self._finish(kind, resource_id)
+
+    def flush(self, timeout=None):
+        """Block until all queued commands are sent.
+
+        :param float timeout: Give up after n seconds.
+
+        :return: True if the queue is empty.
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self._queue_depth() and not self._sending,
+                timeout)
+
+    def close(self, timeout=5):
+        """Send the queued commands and delete the groups created on the
+        bridge.
+
+        :param float timeout: Give up sending after n seconds.
+        """
+        self.flush(timeout)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self.groups.remove()
+
+    def stats(self):
+        """Return dispatcher statistics.
+
+        .. code-block:: python
+
+            {
+                'queue_depth': 3,
+                'lights_queued': 3,
+                'groups_queued': 0,
+                'lights_sent': 1234,
+                'groups_sent': 12,
+                'coalesced': 321,
+                'suppressed': 42,
+                'errors': 0,
+                'max_queue_depth': 20,
+            }
+        """
+        with self._condition:
+            stats = {
+                'queue_depth': self._queue_depth(),
+                'lights_queued': len(self._queues['lights']),
+                'groups_queued': len(self._queues['groups']),
+            }
+            stats.update(self._counters)
+            return stats
+
+    def flow_stats(self):
+        """Return the statistics of each flow by name. Commands queued
+        without a flow belong to the flow `None`.
+
+        .. code-block:: python
+
+            {
+                'living': {
+                    'weight': 2,
+                    'queue_depth': 1,
+                    'queued': 240,
+                    'sent': 180,
+                    'coalesced': 55,
+                    'suppressed': 4,
+                },
+            }
+        """
+        with self._condition:
+            stats = {}
+            for name, flow in self._flows.items():
+                stats[name] = dict(flow.counters, weight=flow.weight,
+                                   queue_depth=0)
+            for tags in self._tags.values():
+                for _, name in tags.values():
+                    stats[name]['queue_depth'] += 1
+            return stats
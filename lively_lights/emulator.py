@@ -0,0 +1,641 @@
+"""A local emulator of the Hue bridge REST API for tests and benchmarks.
+
+.. code-block:: python
+
+    from lively_lights.emulator import EmulatedBridge
+    from lively_lights.phue import Bridge
+
+    with EmulatedBridge(light_count=30, latency=0.05) as emulator:
+        bridge = Bridge(emulator.address, emulator.username)
+        bridge[1].on = True
+        bridge.close()
+
+It can also be started on the command line:
+
+.. code-block:: shell
+
+    python -m lively_lights.emulator --lights 30 --port 8000 --latency 0.05
+
+Like newer bridges it pushes the state changes of the lights as
+server-sent events to `GET /eventstream/clip/v2`, see
+:class:`lively_lights.events.EventStream`.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from lively_lights.dispatcher import TokenBucket
+import argparse
+import collections
+import copy
+import json
+import queue
+import random
+import threading
+import time
+import uuid
+
+
+LIGHT_STATE_RANGES = {
+    'bri': (1, 254),
+    'hue': (0, 65535),
+    'sat': (0, 254),
+    'ct': (153, 500),
+    'transitiontime': (0, 65535),
+}
+"""Valid ranges of numeric light state values."""
+
+KEEPALIVE_INTERVAL = 10
+"""Seconds between the keep alive comments of the event stream."""
+
+
+def _light(light_id):
+    return {
+        'state': {
+            'on': False,
+            'bri': 254,
+            'hue': 8418,
+            'sat': 140,
+            'effect': 'none',
+            'xy': [0.4573, 0.41],
+            'ct': 366,
+            'alert': 'none',
+            'colormode': 'ct',
+            'mode': 'homeautomation',
+            'reachable': True,
+        },
+        'type': 'Extended color light',
+        'name': 'Hue color lamp {}'.format(light_id),
+        'modelid': 'LCT015',
+        'manufacturername': 'Signify Netherlands B.V.',
+        'uniqueid': '00:17:88:01:00:00:{:02x}:{:02x}-0b'.format(
+            light_id // 256, light_id % 256),
+        'swversion': '1.50.2_r30933',
+    }
+
+
+def _v2_id(kind, resource_id):
+    """A stable resource ID of the API version 2."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, '{}/{}'.format(kind,
+                                                             resource_id)))
+
+
+def _v2_light(light_id, state):
+    """An event resource (API version 2) with the fields of a light state.
+
+    :return: None if none of the fields is part of the API version 2.
+    """
+    resource = {}
+    if 'on' in state:
+        resource['on'] = {'on': state['on']}
+    if 'bri' in state:
+        resource['dimming'] = {'brightness': round(state['bri'] / 2.54, 2)}
+    if 'xy' in state:
+        resource['color'] = {'xy': {'x': state['xy'][0],
+                                    'y': state['xy'][1]}}
+    if 'ct' in state:
+        resource['color_temperature'] = {'mirek': state['ct'],
+                                         'mirek_valid': True}
+    if not resource:
+        return None
+    resource.update({
+        'id': _v2_id('light', light_id),
+        'id_v1': '/lights/{}'.format(light_id),
+        'type': 'light',
+    })
+    return resource
+
+
+def _error(error_type, address, description):
+    return {
+        'error': {
+            'type': error_type,
+            'address': address,
+            'description': description,
+        }
+    }
+
+
+class EmulatedBridge(object):
+    """A fake Hue bridge serving the REST API used by
+    :class:`lively_lights.phue.Bridge` (lights, groups, sensors, scenes,
+    schedules and config) from memory.
+
+    :param int light_count: The number of emulated lights.
+
+    :param str username: The only username accepted by the emulator.
+
+    :param float latency: Seconds to wait before answering a request.
+
+    :param float jitter: The latency varies randomly by up to n seconds.
+
+    :param float light_rate: Light commands per second handled before the
+      rate limit takes effect. None disables the rate limit.
+
+    :param float group_rate: Group commands per second handled before the
+      rate limit takes effect. None disables the rate limit.
+
+    :param str rate_limit_mode: `delay` to answer rate limited commands
+      later (the bridge queues them), `error` to answer them with an error.
+
+    :param float failure_rate: The probability (0 - 1) that a request fails.
+
+    :param str failure_mode: `drop` closes the connection without an answer,
+      `error` answers with an HTTP 500 status.
+
+    :param int seed: Seed of the random generator for jitter and failures.
+
+    :param bool event_stream: Serve the event stream. Without it the
+      emulator answers like an older bridge.
+
+    :param str host: The address to listen on.
+
+    :param int port: The port to listen on, 0 picks a free port.
+    """
+
+    def __init__(self, light_count=10, username='lively-lights', latency=0,
+                 jitter=0, light_rate=None, group_rate=None,
+                 rate_limit_mode='delay', failure_rate=0, failure_mode='drop',
+                 seed=None, event_stream=True, host='127.0.0.1', port=0):
+        if rate_limit_mode not in ('delay', 'error'):
+            raise ValueError('rate_limit_mode must be “delay” or “error”.')
+        if failure_mode not in ('drop', 'error'):
+            raise ValueError('failure_mode must be “drop” or “error”.')
+
+        self.username = username
+        """The only username accepted by the emulator."""
+
+        self.latency = latency
+        """Seconds to wait before answering a request."""
+
+        self.jitter = jitter
+        """The latency varies randomly by up to n seconds."""
+
+        self.rate_limit_mode = rate_limit_mode
+        """`delay` or `error`."""
+
+        self.failure_rate = failure_rate
+        """The probability (0 - 1) that a request fails."""
+
+        self.failure_mode = failure_mode
+        """`drop` or `error`."""
+
+        self.event_stream = event_stream
+        """Serve the event stream."""
+
+        self.host = host
+        self.port = port
+
+        self._buckets = {}
+        if light_rate:
+            self._buckets['lights'] = TokenBucket(light_rate)
+        if group_rate:
+            self._buckets['groups'] = TokenBucket(group_rate)
+        self._bucket_lock = threading.Lock()
+
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._counters = collections.Counter()
+        self._server = None
+        self._thread = None
+        self._streams = []
+        """A message queue for each client of the event stream."""
+        self._event_count = 0
+
+        self.state = {
+            'lights': {},
+            'groups': {},
+            'sensors': {},
+            'scenes': {},
+            'schedules': {},
+            'rules': {},
+            'resourcelinks': {},
+            'config': {
+                'name': 'Philips hue',
+                'apiversion': '1.50.0',
+                'swversion': '1950207110',
+                'bridgeid': '001788FFFE000000',
+                'modelid': 'BSB002',
+                'mac': '00:17:88:00:00:00',
+                'ipaddress': host,
+                'linkbutton': False,
+            },
+        }
+        """The full state of the emulated bridge as returned by
+        `GET /api/<username>`."""
+
+        for light_id in range(1, light_count + 1):
+            self.state['lights'][str(light_id)] = _light(light_id)
+
+    ##
+    # Server
+    ##
+
+    @property
+    def address(self):
+        """The address of the running emulator, e. g. `127.0.0.1:34567`.
+        Use it as the `ip` of :class:`lively_lights.phue.Bridge`."""
+        return '{}:{}'.format(self.host, self.port)
+
+    def start(self):
+        """Start serving in a background thread."""
+        self._server = ThreadingHTTPServer((self.host, self.port),
+                                           self._handler_class())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        args=(0.05,))
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving."""
+        with self._lock:
+            for messages in self._streams:
+                messages.put(None)
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def stats(self):
+        """Return request counters, e. g.
+        `{'GET': 3, 'PUT lights': 100, 'rate_limited': 2, 'failures': 1}`.
+        """
+        with self._lock:
+            return dict(self._counters)
+
+    def set_reachable(self, light_id, reachable=True):
+        """Make a light reachable or unreachable."""
+        with self._lock:
+            self.state['lights'][str(light_id)]['state']['reachable'] = \
+                reachable
+            self._publish('update', [{
+                'id': _v2_id('zigbee_connectivity', light_id),
+                'id_v1': '/lights/{}'.format(light_id),
+                'type': 'zigbee_connectivity',
+                'status': 'connected' if reachable else 'connectivity_issue',
+            }])
+
+    def _handler_class(self):
+        emulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _stream(self):
+                key = self.headers.get('hue-application-key')
+                if key != emulator.username:
+                    self.send_error(403)
+                    return
+                messages = emulator._open_stream()
+                try:
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/event-stream')
+                    self.send_header('Cache-Control', 'no-cache')
+                    self.send_header('Connection', 'close')
+                    self.end_headers()
+                    self.close_connection = True
+                    message = b': hi\n\n'
+                    while message is not None:
+                        self.wfile.write(message)
+                        self.wfile.flush()
+                        try:
+                            message = messages.get(
+                                timeout=KEEPALIVE_INTERVAL)
+                        except queue.Empty:
+                            message = b': hi\n\n'
+                except OSError:
+                    # The client has gone.
+                    pass
+                finally:
+                    emulator._close_stream(messages)
+
+            def _handle(self):
+                if emulator.event_stream and self.command == 'GET' and \
+                   self.path == '/eventstream/clip/v2':
+                    self._stream()
+                    return
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length) if length else b''
+                status, response = emulator.handle(self.command, self.path,
+                                                   body)
+                if status is None:
+                    self.close_connection = True
+                    return
+                data = json.dumps(response).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_PUT = do_POST = do_DELETE = _handle
+
+        return Handler
+
+    ##
+    # Event stream
+    ##
+
+    def _open_stream(self):
+        messages = queue.Queue()
+        with self._lock:
+            self._streams.append(messages)
+            self._counters['streams'] += 1
+        return messages
+
+    def _close_stream(self, messages):
+        with self._lock:
+            self._streams.remove(messages)
+
+    def _publish(self, event_type, resources):
+        """Send an event to all clients of the event stream. Called with the
+        lock held."""
+        if not self._streams or not resources:
+            return
+        self._event_count += 1
+        event_id = '{}:{}'.format(int(time.time()), self._event_count)
+        data = json.dumps([{
+            'creationtime': time.strftime('%Y-%m-%dT%H:%M:%SZ',
+                                          time.gmtime()),
+            'data': resources,
+            'id': str(uuid.uuid4()),
+            'type': event_type,
+        }])
+        message = 'id: {}\ndata: {}\n\n'.format(event_id, data)
+        for messages in self._streams:
+            messages.put(message.encode('utf-8'))
+        self._counters['events'] += 1
+
+    ##
+    # Request handling
+    ##
+
+    def _wait(self):
+        delay = self.latency
+        if self.jitter:
+            with self._lock:
+                delay += self._random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _rate_limited(self, kind):
+        """Return True if the command has to be rejected."""
+        if kind not in self._buckets:
+            return False
+        bucket = self._buckets[kind]
+        while True:
+            with self._bucket_lock:
+                if bucket.consume():
+                    return False
+                delay = bucket.delay()
+            with self._lock:
+                self._counters['rate_limited'] += 1
+            if self.rate_limit_mode == 'error':
+                return True
+            time.sleep(delay)
+
+    def handle(self, method, path, body=b''):
+        """Answer one request.
+
+        :return: A tuple `(status, response)`. The status is None if the
+          connection should be dropped.
+        """
+        keys = [key for key in path.split('/') if key]
+        with self._lock:
+            self._counters[method] += 1
+            fail = self.failure_rate and \
+                self._random.random() < self.failure_rate
+            if fail:
+                self._counters['failures'] += 1
+
+        self._wait()
+        if fail:
+            if self.failure_mode == 'drop':
+                return None, None
+            return 500, [_error(901, path, 'Internal error, 500')]
+
+        try:
+            data = json.loads(body.decode('utf-8')) if body else None
+        except ValueError:
+            return 200, [_error(2, path, 'body contains invalid json')]
+
+        if not keys or keys[0] != 'api':
+            return 404, [_error(4, path, 'method not available')]
+
+        if len(keys) == 1:
+            if method == 'POST':
+                return 200, [{'success': {'username': self.username}}]
+            return 200, [_error(4, path, 'method not available')]
+
+        if keys[1] != self.username:
+            return 200, [_error(1, '/' + '/'.join(keys[2:]),
+                                'unauthorized user')]
+
+        resource = keys[2:]
+        if resource and method == 'PUT' and \
+           resource[0] in ('lights', 'groups') and \
+           resource[-1] in ('state', 'action') and \
+           self._rate_limited(resource[0]):
+            return 200, [_error(901, path, 'Internal error, 503')]
+
+        with self._lock:
+            if resource:
+                self._counters['{} {}'.format(method, resource[0])] += 1
+            return 200, self._route(method, resource, data)
+
+    def _route(self, method, resource, data):
+        address = '/' + '/'.join(resource)
+        if not resource:
+            if method == 'GET':
+                return copy.deepcopy(self.state)
+            return [_error(4, address, 'method not available')]
+
+        kind = resource[0]
+        if kind not in self.state:
+            return [_error(4, address, 'method not available')]
+
+        if kind == 'config':
+            if method == 'GET':
+                return copy.deepcopy(self.state['config'])
+            if method == 'PUT':
+                return self._update(self.state['config'], address, data)
+            return [_error(4, address, 'method not available')]
+
+        collection = self.state[kind]
+
+        if len(resource) == 1:
+            if method == 'GET':
+                return copy.deepcopy(collection)
+            if method == 'POST':
+                return self._create(kind, data)
+            return [_error(4, address, 'method not available')]
+
+        resource_id = resource[1]
+        if kind == 'groups' and resource_id == '0':
+            item = {
+                'name': 'Group 0',
+                'lights': sorted(self.state['lights'], key=int),
+                'type': 'LightGroup',
+                'action': {},
+            }
+        elif resource_id in collection:
+            item = collection[resource_id]
+        else:
+            return [_error(3, address,
+                           'resource, {}, not available'.format(address))]
+
+        if len(resource) == 2:
+            if method == 'GET':
+                return copy.deepcopy(item)
+            if method == 'PUT':
+                return self._update(item, address, data)
+            if method == 'DELETE' and resource_id in collection:
+                del collection[resource_id]
+                self._publish('delete', [{
+                    'id': _v2_id(kind, resource_id),
+                    'id_v1': address,
+                }])
+                return [{'success': '{} deleted.'.format(address)}]
+            return [_error(4, address, 'method not available')]
+
+        sub = resource[2]
+        if method != 'PUT' or len(resource) != 3:
+            return [_error(4, address, 'method not available')]
+        if kind == 'lights' and sub == 'state':
+            return self._set_state([resource_id], address, data)
+        if kind == 'groups' and sub == 'action':
+            light_ids = [light_id for light_id in item['lights']
+                         if light_id in self.state['lights']]
+            result = self._set_state(light_ids, address, data)
+            item['action'].update({
+                key: value for key, value in data.items()
+                if key != 'transitiontime'
+            })
+            return result
+        if kind == 'sensors' and sub in ('state', 'config'):
+            return self._update(item.setdefault(sub, {}), address, data)
+        return [_error(4, address, 'method not available')]
+
+    @staticmethod
+    def _update(item, address, data):
+        result = []
+        for key, value in data.items():
+            item[key] = value
+            result.append({'success': {'{}/{}'.format(address, key): value}})
+        return result
+
+    def _set_state(self, light_ids, address, data):
+        lights = [self.state['lights'][light_id] for light_id in light_ids]
+        changed = {}
+        result = []
+        for key, value in data.items():
+            path = '{}/{}'.format(address, key)
+            if key in LIGHT_STATE_RANGES:
+                minimum, maximum = LIGHT_STATE_RANGES[key]
+                if not isinstance(value, int) or \
+                   not minimum <= value <= maximum:
+                    result.append(_error(
+                        7, path, 'invalid value, {}, for parameter, {}'
+                        .format(value, key)))
+                    continue
+            if key != 'transitiontime':
+                for light in lights:
+                    light['state'][key] = value
+                    if key in ('hue', 'sat'):
+                        light['state']['colormode'] = 'hs'
+                changed[key] = value
+            result.append({'success': {path: value}})
+        if 'hue' in changed or 'sat' in changed:
+            # Like the bridges: a color change is pushed as xy.
+            changed.setdefault('xy', lights[0]['state']['xy'])
+        self._publish('update', [
+            resource for resource in (_v2_light(light_id, changed)
+                                      for light_id in light_ids)
+            if resource])
+        return result
+
+    def _create(self, kind, data):
+        collection = self.state[kind]
+        ids = [int(key) for key in collection if key.isdigit()]
+        new_id = str(max(ids + [0]) + 1)
+        item = copy.deepcopy(data)
+        if kind == 'groups':
+            item.setdefault('type', 'LightGroup')
+            item.setdefault('action', {})
+        collection[new_id] = item
+        self._publish('add', [{
+            'id': _v2_id(kind, new_id),
+            'id_v1': '/{}/{}'.format(kind, new_id),
+        }])
+        return [{'success': {'id': new_id}}]
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description='Emulate a Hue bridge for tests and benchmarks.',
+    )
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--username', default='lively-lights')
+    parser.add_argument('--lights', type=int, default=10,
+                        help='The number of emulated lights.')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='Seconds to wait before answering a request.')
+    parser.add_argument('--jitter', type=float, default=0,
+                        help='Random variation of the latency in seconds.')
+    parser.add_argument('--light-rate', type=float,
+                        help='Light commands per second before the rate '
+                        'limit takes effect.')
+    parser.add_argument('--group-rate', type=float,
+                        help='Group commands per second before the rate '
+                        'limit takes effect.')
+    parser.add_argument('--rate-limit-mode', choices=('delay', 'error'),
+                        default='delay')
+    parser.add_argument('--failure-rate', type=float, default=0,
+                        help='The probability (0 - 1) that a request fails.')
+    parser.add_argument('--failure-mode', choices=('drop', 'error'),
+                        default='drop')
+    parser.add_argument('--no-event-stream', action='store_true',
+                        help='Answer like an older bridge without an event '
+                        'stream.')
+    return parser
+
+
+def main():
+    args = get_parser().parse_args()
+    emulator = EmulatedBridge(
+        light_count=args.lights,
+        username=args.username,
+        latency=args.latency,
+        jitter=args.jitter,
+        light_rate=args.light_rate,
+        group_rate=args.group_rate,
+        rate_limit_mode=args.rate_limit_mode,
+        failure_rate=args.failure_rate,
+        failure_mode=args.failure_mode,
+        event_stream=not args.no_event_stream,
+        host=args.host,
+        port=args.port,
+    )
+    emulator.start()
+    print('Emulating a Hue bridge with {} lights on {} (username: {})'.format(
+        args.lights, emulator.address, emulator.username))
+    try:
+        emulator._thread.join()
+    except KeyboardInterrupt:
+        emulator.stop()
+
+
+if __name__ == '__main__':
+    main()
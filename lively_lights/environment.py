@@ -1,14 +1,20 @@
 """Gather informations about the environment `lively_lights` is running in."""
 
-import ping3
-import astral
+import array
+import bisect
 import datetime
-import pyowm
+import logging
 import socket
 import time
+import threading
 import platform
 import subprocess
 
+from .conditions import ConditionEngine, Daytime, HostUp as HostUpCondition, \
+                        Night
+
+logger = logging.getLogger(__name__)
+
 
 class HostUp(object):
 
@@ -17,6 +23,7 @@ class HostUp(object):
         """How long to wait for an answer (in seconds)."""
 
     def _ping_python(self, host):
+        import ping3
         if ping3.ping(host, timeout=self.timeout):
             return True
         else:
@@ -41,12 +48,12 @@ class HostUp(object):
         :param in timeout: Timeout in seconds
         """
         try:
-            socket.setdefaulttimeout(self.timeout)
-            socket.socket(socket.AF_INET,
-                          socket.SOCK_STREAM).connect((host, int(port)))
-            return True
+            connection = socket.create_connection((host, int(port)),
+                                                  timeout=self.timeout)
         except Exception:
             return False
+        connection.close()
+        return True
 
     def is_up(self, address):
         """
@@ -71,9 +78,174 @@ class HostUp(object):
 host_up = HostUp()
 
 
+class HostProber(object):
+    """Probe hosts in a background thread and cache the result, so that
+    nobody has to wait for the network to learn if the hosts are up.
+
+    :param addresses: A list or a comma separated string of addresses,
+      e. g. `192.168.3.11:22,192.168.3.12`.
+
+    :param str mode: `any`: up if one of the hosts is up, `all`: up if all
+      hosts are up.
+
+    :param float interval: Probe the hosts every n seconds.
+
+    :param int rise: A host counts as up after n successful probes in a
+      row.
+
+    :param int fall: A host counts as down after n failed probes in a row,
+      so that a single lost packet does not flip the state.
+
+    :param host_up: :class:`lively_lights.environment.HostUp` probing one
+      host.
+    """
+
+    def __init__(self, addresses, mode='any', interval=30, rise=1, fall=2,
+                 host_up=host_up):
+        if isinstance(addresses, str):
+            addresses = addresses.split(',')
+        self.addresses = tuple(address.strip() for address in addresses
+                               if address.strip())
+        if not self.addresses:
+            raise ValueError('No host to probe.')
+        if mode not in ('any', 'all'):
+            raise ValueError('mode has to be “any” or “all”.')
+        if rise < 1 or fall < 1:
+            raise ValueError('rise and fall have to be at least 1.')
+        self.mode = mode
+        self.interval = interval
+        self.rise = rise
+        self.fall = fall
+        self.host_up = host_up
+
+        self._hosts = {address: [None, 0] for address in self.addresses}
+        """The state of each host (up or None if unknown) and the count of
+        successive probes contradicting it."""
+
+        self._up = None
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._executor = None
+
+    def is_up(self):
+        """The cached result of the last probes. False before the prober
+        has been started."""
+        return bool(self._up)
+
+    def hosts(self):
+        """The state of each host: True, False or None if unknown."""
+        with self._lock:
+            return {address: state[0]
+                    for address, state in self._hosts.items()}
+
+    def subscribe(self, callback):
+        """Call `callback(up)` in the prober thread when the result
+        changes."""
+        self._listeners.append(callback)
+
+    def _probe_host(self, address):
+        try:
+            return bool(self.host_up.is_up(address))
+        except Exception:
+            logger.exception('Probing {} failed.'.format(address))
+            return False
+
+    def _update_host(self, address, up):
+        state = self._hosts[address]
+        if state[0] is None or state[0] == up:
+            state[0] = up
+            state[1] = 0
+            return
+        state[1] += 1
+        if state[1] >= (self.rise if up else self.fall):
+            state[0] = up
+            state[1] = 0
+
+    def probe(self):
+        """Probe all hosts concurrently and update the cached result.
+
+        :return: True if the hosts are up.
+        """
+        if len(self.addresses) == 1:
+            results = [self._probe_host(self.addresses[0])]
+        else:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(len(self.addresses))
+            results = list(self._executor.map(self._probe_host,
+                                              self.addresses))
+        with self._lock:
+            for address, up in zip(self.addresses, results):
+                self._update_host(address, up)
+            states = [state[0] for state in self._hosts.values()]
+            up = any(states) if self.mode == 'any' else all(states)
+            changed = up != self._up
+            self._up = up
+        if changed:
+            for callback in list(self._listeners):
+                try:
+                    callback(up)
+                except Exception:
+                    logger.exception('The host listener {} failed.'.format(
+                        callback))
+        return up
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.probe()
+
+    def start(self):
+        """Probe the hosts once and go on probing in a background
+        thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self.probe()
+        with self._lock:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop,
+                                            name='lively-lights-prober')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+SUN_EVENTS = ('dawn', 'sunrise', 'solar_noon', 'sunset', 'dusk',
+              'polar_day', 'polar_night')
+"""The kinds of the entries of the sun table. On a day without sunrise and
+sunset a `polar_day` or `polar_night` entry is stored at midnight."""
+
+_SUNRISE = SUN_EVENTS.index('sunrise')
+_SUNSET = SUN_EVENTS.index('sunset')
+_POLAR_DAY = SUN_EVENTS.index('polar_day')
+_POLAR_NIGHT = SUN_EVENTS.index('polar_night')
+
+
 class DayNight(object):
+    """Find out if it is day or night at a location.
+
+    The sun events of `days` days are computed once and stored in a sorted
+    table of timestamps, so a check is a binary search. The table is
+    rebuilt if the current date leaves it.
+
+    :param float latitude: e. g. 49.455556
+    :param float longitude: e. g. 11.078611
+    :param str timezone: e. g. `Europe/Berlin`
+    :param float elevation: e. g. 309
+    :param int days: Precompute the sun events of n days.
+    """
 
-    def __init__(self, latitude, longitude, timezone, elevation):
+    def __init__(self, latitude, longitude, timezone, elevation, days=366):
+        import astral
         self._location = astral.Location((
             'name',
             'region',
@@ -83,19 +255,103 @@ class DayNight(object):
             elevation,
         ))
 
-    def _sunrise(self):
-        return self._location.sunrise()
+        self.days = max(int(days), 3)
+        """The number of days in the sun table."""
+
+        self._table = None
+        """`(valid_from, valid_until, timestamps, kinds)`: the sun events
+        from the day before the table was built on. `kinds` are indexes of
+        :data:`SUN_EVENTS`. The table is valid between the two timestamps,
+        one day of margin on both sides covers the events around midnight.
+        The tuple is replaced as a whole."""
+
+        self._table_lock = threading.Lock()
 
-    def _sunset(self):
-        return self._location.sunset()
+    def _sun_events(self, day):
+        """The `(timestamp, kind)` tuples of one day."""
+        import astral
+        events = []
+        for kind, name in enumerate(SUN_EVENTS[:_POLAR_DAY]):
+            try:
+                moment = getattr(self._location, name)(date=day, local=True)
+            except astral.AstralError:
+                continue
+            events.append((moment.timestamp(), kind))
+        kinds = [kind for _, kind in events]
+        if _SUNRISE not in kinds and _SUNSET not in kinds:
+            noon = self._location.solar_noon(date=day, local=True)
+            kind = _POLAR_DAY if self._location.solar_elevation(noon) > 0 \
+                else _POLAR_NIGHT
+            events.append((self._midnight(day), kind))
+        return events
+
+    def _midnight(self, day):
+        return self._location.tz.localize(
+            datetime.datetime.combine(day, datetime.time())).timestamp()
+
+    def _build_table(self, first_day):
+        events = []
+        for offset in range(self.days):
+            events.extend(self._sun_events(
+                first_day + datetime.timedelta(days=offset)))
+        events.sort()
+        return (
+            self._midnight(first_day + datetime.timedelta(days=1)),
+            self._midnight(first_day + datetime.timedelta(days=self.days - 1)),
+            array.array('d', (timestamp for timestamp, _ in events)),
+            array.array('b', (kind for _, kind in events)),
+        )
+
+    def _lookup(self):
+        """The sun table covering now and the current timestamp."""
+        now = time.time()
+        table = self._table
+        if table is None or not table[0] <= now < table[1]:
+            with self._table_lock:
+                table = self._table
+                if table is None or not table[0] <= now < table[1]:
+                    today = datetime.datetime.now(self._location.tz).date()
+                    table = self._build_table(
+                        today - datetime.timedelta(days=1))
+                    self._table = table
+        return table, now
 
     def is_day(self):
-        sunrise = self._sunrise()
-        return sunrise < datetime.datetime.now(sunrise.tzinfo) < self._sunset()
+        """True between sunrise and sunset (both excluded)."""
+        (_, _, timestamps, kinds), now = self._lookup()
+        index = bisect.bisect_left(timestamps, now)
+        # The last sunrise or sunset strictly before now.
+        previous = index - 1
+        while previous >= 0 and kinds[previous] not in \
+                (_SUNRISE, _SUNSET, _POLAR_DAY, _POLAR_NIGHT):
+            previous -= 1
+        if previous < 0 or kinds[previous] in (_SUNSET, _POLAR_NIGHT):
+            return False
+        # Exactly at sunset it is night.
+        return not (index < len(timestamps) and timestamps[index] == now and
+                    kinds[index] == _SUNSET)
 
     def is_night(self):
         return not self.is_day()
 
+    def next_transition(self):
+        """The next sunrise or sunset.
+
+        :return: A tuple `(datetime, 'sunrise' or 'sunset')` in the time zone
+          of the location or None if there is no sunrise or sunset within
+          the sun table.
+        """
+        (_, _, timestamps, kinds), now = self._lookup()
+        for index in range(bisect.bisect_right(timestamps, now),
+                           len(timestamps)):
+            if kinds[index] in (_SUNRISE, _SUNSET):
+                return (
+                    datetime.datetime.fromtimestamp(timestamps[index],
+                                                    self._location.tz),
+                    SUN_EVENTS[kinds[index]],
+                )
+        return None
+
     def overview(self):
         sun = self._location.sun()
         out = 'Dawn:    {}\n' + \
@@ -109,31 +365,38 @@ class DayNight(object):
 
 
 class Weather(object):
-    """Gather weather informations about a given coordinate.
+    """Gather weather informations about a given coordinate. The weather is
+    fetched on first use and cached, see
+    :class:`lively_lights.weather.WeatherProvider`.
 
     :param string openweathermap_api_key:
       https://home.openweathermap.org/api_keys
     :param float latitude: e. g. 49.455556
     :param float longitude: e. g. 11.078611
+    :param float ttl: Fetch the weather again after n seconds.
+    :param str cache_file: Persist the weather to this JSON file.
+    :param backend: A :class:`lively_lights.weather.WeatherBackend` to use
+      instead of OpenWeatherMap, e. g.
+      :class:`lively_lights.weather.JsonFileBackend`.
     """
 
-    def __init__(self, openweathermap_api_key, latitude, longitude):
-        owm = pyowm.OWM(openweathermap_api_key)
-        weather_manager = owm.weather_manager()
-        self._weather = weather_manager.weather_at_coords(
-            latitude,
-            longitude,
-        ).weather
+    def __init__(self, openweathermap_api_key=None, latitude=None,
+                 longitude=None, ttl=600, cache_file=None, backend=None):
+        from lively_lights import weather
+        if backend is None:
+            backend = weather.OpenWeatherMapBackend(openweathermap_api_key,
+                                                    latitude, longitude)
+        self.provider = weather.WeatherProvider(backend, ttl=ttl,
+                                                cache_file=cache_file)
+        """:class:`lively_lights.weather.WeatherProvider`"""
 
     def get_wind(self):
-        """{'speed': 4.6, 'deg': 330}"""
-        wind = self._weather.wind()
-        return wind['speed']
+        """The wind speed in m/s, e. g. `4.6`."""
+        return self.provider.get_wind()
 
     def get_temperature(self):
-        """{'temp_max': 10.5, 'temp': 9.7, 'temp_min': 9.0}"""
-        temperature = self._weather.temperature('celsius')
-        return temperature['temp']
+        """The temperature in degree Celsius, e. g. `9.7`."""
+        return self.provider.get_temperature()
 
 
 class ReachableLights(object):
@@ -148,7 +411,8 @@ class ReachableLights(object):
       :class:`lively_lights.ReachableLights.get_light_objects` and
       :class:`lively_lights.ReachableLights.get_light_ids`.
 
-    :param int refresh_interval: Search every n seconds for new lights.
+    :param int refresh_interval: Refresh the reachable states of all lights
+      every n seconds.
 
     :param bool not_at_night: Return light IDs not at night.
 
@@ -156,22 +420,33 @@ class ReachableLights(object):
 
     :param string not_host_up: Do nothing if an external host is up.
       Check if a host has an open TCP port:
-      e. g. `192.168.3.11:22` or is pingable e. g. `192.168.3.11`.
+      e. g. `192.168.3.11:22` or is pingable e. g. `192.168.3.11`. Several
+      hosts are separated by commas. The hosts are probed every
+      `refresh_interval` seconds in a background thread.
+
+    :param str host_mode: `any`: Do nothing if one of the hosts is up,
+      `all`: only if all hosts are up.
 
     :param bool turn_off: Turn the lights off if one of the three arguments
       (`not_during_daytime`, `not_at_night`, `not_host_up`) is present and
       takes effect.
 
+    :param conditions: A condition engine to use instead of the one built
+      from `not_at_night`, `not_during_daytime` and `not_host_up`, e. g. to
+      share it between rooms.
+    :type conditions: lively_lights.conditions.ConditionEngine
+
     """
     def __init__(self, bridge, day_night, light_ids=None, refresh_interval=60,
                  not_at_night=False, not_during_daytime=False,
-                 not_host_up=None, turn_off=False):
+                 not_host_up=None, turn_off=False, conditions=None,
+                 host_mode='any'):
 
         self.light_ids = light_ids
         """A list of light IDS. """
 
         self.refresh_interval = refresh_interval
-        """Search every n seconds for new lights."""
+        """Refresh the reachable states of all lights every n seconds."""
 
         self.not_at_night = not_at_night
         """Return light IDs only at night."""
@@ -182,6 +457,9 @@ class ReachableLights(object):
         self.not_host_up = not_host_up
         """Check if a host has an open TCP port: e. g. 192.168.3.11:22"""
 
+        self.host_mode = host_mode
+        """`any` or `all` of the hosts of `not_host_up`."""
+
         self.turn_off = turn_off
         """Turn off lights on certain conditions."""
 
@@ -194,19 +472,27 @@ class ReachableLights(object):
         self._bridge = bridge
         """The bridge object :class:`lively_lights.phue.Bridge`"""
 
-        self._lights_refresh_state = {}
-        """Cache for light reachable states. To avoid querying for reachable
-        lights every time.
+        self._reachable_state = {}
+        """Cache for the reachable states of all lights of the bridge. It is
+        refreshed with one request every `refresh_interval` seconds.
 
         .. code-block:: python
 
-            self._lights_refresh_state = {
-                1: (1530997150.9431288, True),
-                2: (1530997179.6412678, False),
+            self._reachable_state = {
+                1: True,
+                2: False,
             }
 
         """
 
+        self._reachable_refreshed_at = None
+        """Monotonic time of the last refresh of the reachable states."""
+
+        self._refresh_thread = None
+        """Thread refreshing the reachable states in the background."""
+
+        self._stop_refresh = threading.Event()
+
         self._lights_turn_off_state = {}
         """Cache for light turn off states. To avoid turning off the lights
         every time.
@@ -226,6 +512,37 @@ class ReachableLights(object):
         self._lights_count = 0
         """Count of reachable lights."""
 
+        self._conditions = conditions
+        """Built on first use by
+        :attr:`lively_lights.ReachableLights.conditions`."""
+
+    @property
+    def conditions(self):
+        """The :class:`lively_lights.conditions.ConditionEngine` pausing the
+        scenes. Built on first use from `not_at_night`,
+        `not_during_daytime` and `not_host_up`: the conditions are only
+        evaluated again at the next sunrise, sunset or host check."""
+        if self._conditions is None:
+            conditions = []
+            if self.not_at_night:
+                conditions.append(Night(self._day_night))
+            if self.not_during_daytime:
+                conditions.append(Daytime(self._day_night))
+            if self.not_host_up:
+                prober = HostProber(self.not_host_up, mode=self.host_mode,
+                                    interval=self.refresh_interval)
+                conditions.append(HostUpCondition(prober))
+            engine = ConditionEngine(conditions)
+            if self.turn_off and conditions:
+                engine.subscribe(self._on_pause)
+            self._conditions = engine
+        return self._conditions
+
+    def _on_pause(self, paused):
+        """Turn the lights off right at the transition."""
+        if paused:
+            self._turn_off_lights()
+
     def __iter__(self):
         self._lights = self.get_light_objects()
         self._lights_count = len(self._lights)
@@ -264,9 +581,7 @@ class ReachableLights(object):
     def _get_reachable(self):
         lights = []
 
-        if (self.not_at_night and self._day_night.is_night()) or \
-           (self.not_during_daytime and self._day_night.is_day()) or \
-           (self.not_host_up and host_up.is_up(self.not_host_up)):
+        if self.conditions.paused:
             if self.turn_off:
                 self._turn_off_lights()
             return lights
@@ -277,15 +592,66 @@ class ReachableLights(object):
 
         return lights
 
+    def refresh_reachable(self):
+        """Fetch the reachable states of all lights with one request."""
+        refreshed_at = time.monotonic()
+        state = {}
+        for light_id, light in self._bridge.get_light().items():
+            if not isinstance(light_id, tuple):
+                # `(bridge name, light ID)` of a multi bridge.
+                light_id = int(light_id)
+            state[light_id] = light['state']['reachable']
+        # A light coming back may have been power cycled and lost the state
+        # the dispatcher remembers.
+        returned = [light_id for light_id, reachable in state.items()
+                    if reachable and
+                    self._reachable_state.get(light_id) is False]
+        if returned:
+            self._bridge.dispatcher.shadow.forget(returned)
+        self._reachable_state = state
+        self._reachable_refreshed_at = refreshed_at
+
+    def _refresh_loop(self):
+        while not self._stop_refresh.wait(self.refresh_interval):
+            try:
+                self.refresh_reachable()
+            except Exception:
+                logger.exception('Refreshing the reachable states failed.')
+
+    def start_refresh_thread(self):
+        """Refresh the reachable states every `refresh_interval` seconds in
+        a background thread instead of on demand."""
+        if self._refresh_thread and self._refresh_thread.is_alive():
+            return
+        self.refresh_reachable()
+        self._stop_refresh.clear()
+        self._refresh_thread = threading.Thread(target=self._refresh_loop)
+        self._refresh_thread.daemon = True
+        self._refresh_thread.start()
+
+    def stop_refresh_thread(self):
+        """Stop the background refresh of the reachable states."""
+        self._stop_refresh.set()
+        if self._refresh_thread:
+            self._refresh_thread.join()
+            self._refresh_thread = None
+
+    def _pushed_at(self):
+        """Monotonic time of the last change an event stream pushed into the
+        state cache of the bridge, None without an event stream."""
+        cache = getattr(self._bridge, 'state_cache', None)
+        pushed_at = getattr(cache, 'pushed_at', None)
+        return pushed_at if isinstance(pushed_at, float) else None
+
     def is_reachable(self, light_id):
-        state = self._lights_refresh_state
-        if light_id in state and \
-           time.time() - state[light_id][0] < self.refresh_interval:
-            return state[light_id][1]
-        else:
-            reachable = self._bridge[light_id].reachable
-            state[light_id] = (time.time(), reachable)
-            return reachable
+        refreshed_at = self._reachable_refreshed_at
+        pushed_at = self._pushed_at()
+        if refreshed_at is None or (
+           pushed_at is not None and pushed_at > refreshed_at) or (
+           self._refresh_thread is None and
+           time.monotonic() - refreshed_at >= self.refresh_interval):
+            self.refresh_reachable()
+        return self._reachable_state.get(light_id, False)
 
     def get_light_objects(self):
         return self._get_reachable()
@@ -310,12 +676,17 @@ class ReachableLightsFactory(object):
 
     :param int refresh_interval: Search every n seconds for new lights.
 
+    :param conditions: A condition engine shared by all rooms.
+    :type conditions: lively_lights.conditions.ConditionEngine
+
     """
 
-    def __init__(self, bridge, day_night, refresh_interval=60):
+    def __init__(self, bridge, day_night, refresh_interval=60,
+                 conditions=None):
         self._bridge = bridge
         self._day_night = day_night
         self._refresh_interval = refresh_interval
+        self._conditions = conditions
 
     def get_lights(self, *light_ids):
         """
@@ -324,4 +695,5 @@ class ReachableLightsFactory(object):
           :class:`lively_lights.ReachableLights.get_light_ids`.
         """
         return ReachableLights(self._bridge, self._day_night, light_ids,
-                               self._refresh_interval)
+                               self._refresh_interval,
+                               conditions=self._conditions)
@@ -0,0 +1,368 @@
+"""Keep the state cache up to date with the event stream of the bridge.
+
+Without it, changes made by other apps, wall switches or lights losing
+power show up only after the state cache expired or the next refresh of
+the reachable states. Newer bridges (API version 1.48 and later) push
+every change as a server-sent event to `GET /eventstream/clip/v2`. An
+:class:`lively_lights.events.EventStream` listens to it in a background
+thread and applies the changes to the snapshot of the
+:class:`lively_lights.cache.StateCache`, which then no longer expires.
+If the bridge has no event stream or the connection is lost, the cache
+falls back to polling.
+
+.. code-block:: python
+
+    bridge = Bridge('192.168.3.60', 'username')
+    stream = EventStream(bridge).start()
+"""
+
+from lively_lights.cache import UNKNOWN
+import http.client
+import json
+import logging
+import os
+import socket
+import ssl
+import threading
+import weakref
+
+logger = logging.getLogger(__name__)
+
+
+PATH = '/eventstream/clip/v2'
+"""The address of the event stream."""
+
+RETRY_INTERVAL = 10
+"""Seconds to wait before connecting again after the stream broke off."""
+
+_streams = weakref.WeakSet()
+"""All :class:`lively_lights.events.EventStream` objects."""
+
+
+def _after_fork():
+    """The stream threads do not survive a fork (e. g. daemonizing), the
+    forked process has to poll until its streams are started again."""
+    for stream in list(_streams):
+        stream._reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def parse_events(lines):
+    """Parse a server-sent event stream.
+
+    :param lines: An iterable of byte strings, e. g. a
+      :class:`http.client.HTTPResponse`.
+
+    :return: A generator of `(event ID, data)` tuples.
+    """
+    event_id = None
+    data = []
+    for line in lines:
+        line = line.decode('utf-8').rstrip('\r\n')
+        if not line:
+            if data:
+                yield event_id, '\n'.join(data)
+            data = []
+            continue
+        if line.startswith(':'):
+            # A comment, the bridge sends “: hi” to keep the stream alive.
+            continue
+        field, _, value = line.partition(':')
+        if value.startswith(' '):
+            value = value[1:]
+        if field == 'data':
+            data.append(value)
+        elif field == 'id':
+            event_id = value
+
+
+def translate(resource):
+    """Translate a resource of an event (API version 2) into changes of the
+    snapshot (API version 1).
+
+    The API version 2 has no hue and saturation. A color change makes them
+    and the color mode :data:`lively_lights.cache.UNKNOWN`.
+
+    .. code-block:: python
+
+        >>> translate({'id_v1': '/lights/1', 'type': 'light',
+        ...            'dimming': {'brightness': 50.0}})
+        [(['lights', '1', 'state', 'bri'], 127)]
+
+    :param dict resource: An item of the `data` list of an event.
+
+    :return: A list of `(keys, value)` tuples.
+    """
+    keys = resource.get('id_v1', '').strip('/').split('/')
+    if len(keys) != 2 or keys[0] not in ('lights', 'groups'):
+        return []
+    kind, resource_id = keys
+    state = 'state' if kind == 'lights' else 'action'
+
+    values = {}
+    if 'on' in resource:
+        values['on'] = resource['on']['on']
+    if 'dimming' in resource:
+        brightness = resource['dimming']['brightness']
+        values['bri'] = min(max(int(round(brightness * 2.54)), 1), 254)
+    if 'color' in resource and 'xy' in resource['color']:
+        xy = resource['color']['xy']
+        values['xy'] = [xy['x'], xy['y']]
+    if 'color_temperature' in resource and \
+       resource['color_temperature'].get('mirek') is not None:
+        values['ct'] = resource['color_temperature']['mirek']
+    if 'xy' in values or 'ct' in values:
+        for field in ('hue', 'sat', 'colormode'):
+            values[field] = UNKNOWN
+    if resource.get('type') == 'zigbee_connectivity' and kind == 'lights':
+        values['reachable'] = resource.get('status') == 'connected'
+
+    return [([kind, resource_id, state, field], value)
+            for field, value in values.items()]
+
+
+class EventStream(object):
+    """Listen to the event stream of the bridge in a background thread and
+    push the changes into its state cache.
+
+    :param bridge: The bridge object.
+    :type bridge: lively_lights.phue.Bridge
+
+    :param bool secure: Connect with HTTPS. The bridges only serve the
+      event stream over HTTPS, the emulator only over HTTP.
+
+    :param float timeout: Reconnect if the bridge sends nothing for n
+      seconds.
+
+    :param float retry_interval: Seconds to wait before connecting again.
+    """
+
+    def __init__(self, bridge, secure=True, timeout=120,
+                 retry_interval=RETRY_INTERVAL):
+        self.bridge = bridge
+        """The bridge object: :class:`lively_lights.phue.Bridge`"""
+
+        self.secure = secure
+        """Connect with HTTPS."""
+
+        self.timeout = timeout
+        """Reconnect if the bridge sends nothing for n seconds."""
+
+        self.retry_interval = retry_interval
+        """Seconds to wait before connecting again."""
+
+        self.supported = None
+        """False if the bridge has no event stream, None if unknown."""
+
+        self._connected = threading.Event()
+        self._socket = None
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._counters = {
+            'connects': 0,
+            'errors': 0,
+            'messages': 0,
+            'changes': 0,
+        }
+        _streams.add(self)
+
+    @property
+    def connected(self):
+        return self._connected.is_set()
+
+    def _count(self, key, value=1):
+        with self._lock:
+            self._counters[key] += value
+
+    def subscribe(self, callback):
+        """Call `callback(changes)` in the stream thread for every message
+        changing the state. `changes` is a list of `(keys, value)` tuples,
+        see :func:`lively_lights.events.translate`."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def _new_connection(self):
+        if not self.secure:
+            return http.client.HTTPConnection(self.bridge.ip,
+                                              timeout=self.timeout)
+        # The certificate of the bridge is issued for its bridge ID, not for
+        # its IP address.
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        return http.client.HTTPSConnection(self.bridge.ip,
+                                           timeout=self.timeout,
+                                           context=context)
+
+    def _set_connected(self, connected):
+        cache = self.bridge.state_cache
+        if connected:
+            # Changes made while the stream was down are lost.
+            cache.invalidate()
+        cache.live = connected
+        if connected:
+            self._count('connects')
+            self._connected.set()
+        else:
+            self._connected.clear()
+
+    def _handle(self, data):
+        try:
+            events = json.loads(data)
+        except ValueError:
+            self._count('errors')
+            logger.warning('Invalid event: {}'.format(data))
+            return
+        self._count('messages')
+        changes = []
+        for event in events:
+            if event.get('type') in ('add', 'delete'):
+                # A light or group was added or removed.
+                self.bridge.state_cache.invalidate()
+                continue
+            for resource in event.get('data', []):
+                changes.extend(translate(resource))
+        if not changes:
+            return
+        self._count('changes', len(changes))
+        self.bridge.state_cache.push(changes)
+        self.bridge.dispatcher.shadow.push(changes)
+        with self._lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback(changes)
+            except Exception:
+                logger.exception('The event listener {} failed.'.format(
+                    callback))
+
+    def _listen(self):
+        connection = self._new_connection()
+        response = None
+        try:
+            connection.request('GET', PATH, headers={
+                'hue-application-key': self.bridge.username,
+                'Accept': 'text/event-stream',
+            })
+            with self._lock:
+                # The connection hands its socket over to the response.
+                self._socket = connection.sock
+            response = connection.getresponse()
+            if self._stop.is_set():
+                return
+            if response.status == 404:
+                self.supported = False
+                return
+            if response.status != 200:
+                raise http.client.HTTPException(
+                    'The event stream answered with the status {}.'.format(
+                        response.status))
+            self.supported = True
+            self._set_connected(True)
+            for _, data in parse_events(response):
+                self._handle(data)
+        finally:
+            with self._lock:
+                self._socket = None
+            if response is not None:
+                response.close()
+            connection.close()
+
+    def _run(self):
+        try:
+            self._loop()
+        finally:
+            # Whatever ends the thread, the snapshot must expire again.
+            self._set_connected(False)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self._listen()
+            except Exception:
+                if self._stop.is_set():
+                    break
+                self._count('errors')
+                logger.warning('The event stream of the bridge {} broke '
+                               'off.'.format(self.bridge.ip), exc_info=True)
+            finally:
+                if self.connected:
+                    self._set_connected(False)
+            if self.supported is False:
+                logger.info('The bridge {} has no event stream, its state '
+                            'is polled.'.format(self.bridge.ip))
+                return
+            if self._stop.wait(self.retry_interval):
+                return
+
+    def _reset(self):
+        """Forget the thread after a fork. The locks may have been held by
+        threads that no longer exist."""
+        self._lock = threading.Lock()
+        self._socket = None
+        self._thread = None
+        self._set_connected(False)
+
+    def start(self):
+        """Listen in a background thread.
+
+        :return: The event stream itself.
+        """
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='lively-lights-events')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Close the stream. The state cache falls back to polling."""
+        self._stop.set()
+        with self._lock:
+            sock = self._socket
+        if sock is not None:
+            try:
+                # Wakes up the stream thread blocked in reading.
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def wait_connected(self, timeout=None):
+        """Block until the stream is connected.
+
+        :return: True if connected.
+        """
+        return self._connected.wait(timeout)
+
+    def stats(self):
+        """Return stream statistics.
+
+        .. code-block:: python
+
+            {
+                'connected': True,
+                'connects': 1,
+                'errors': 0,
+                'messages': 120,
+                'changes': 300,
+            }
+        """
+        with self._lock:
+            stats = {'connected': self.connected}
+            stats.update(self._counters)
+            return stats
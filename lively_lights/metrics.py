@@ -0,0 +1,288 @@
+"""Instrument the requests to the bridge.
+
+Hooks registered with :meth:`lively_lights.phue.Bridge.add_hook` are called
+before and after each request with a
+:class:`lively_lights.metrics.RequestEvent`. Without hooks the bridge skips
+the instrumentation completely.
+
+:class:`lively_lights.metrics.RequestMetrics` collects latency histograms
+and request counters and exports them in the Prometheus text format.
+
+.. code-block:: python
+
+    metrics = RequestMetrics()
+    bridge.add_hook(metrics)
+    bridge[1].on = True
+    print(metrics.prometheus())
+"""
+
+import bisect
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+"""The upper bounds of the latency histogram buckets in seconds."""
+
+
+class RequestEvent(object):
+    """One request to the bridge, handed to the hooks.
+
+    :param str method: The HTTP method, e. g. `PUT`.
+    :param str path: The request path, e. g. `/api/<username>/lights/1/state`.
+    :param data: The request data before JSON encoding.
+    :param str body: The JSON encoded request body.
+    """
+
+    __slots__ = ('method', 'path', 'data', 'request_bytes', 'status',
+                 'response_bytes', 'latency', 'error', 'result')
+
+    def __init__(self, method, path, data=None, body=None):
+        self.method = method
+        self.path = path
+        self.data = data
+
+        self.request_bytes = len(body) if body else 0
+        """The size of the request body."""
+
+        self.status = None
+        """The HTTP status code, None if the request failed."""
+
+        self.response_bytes = 0
+        """The size of the response body."""
+
+        self.latency = None
+        """The seconds the request took."""
+
+        self.error = None
+        """The exception raised by the request."""
+
+        self.result = None
+        """The decoded JSON response."""
+
+
+class RequestHook(object):
+    """The base class of the request hooks. Hooks run in the thread sending
+    the request, so they should be quick and thread safe. Exceptions of
+    hooks are logged and do not affect the request."""
+
+    def before(self, event):
+        """Called before the request is sent (only `method`, `path`,
+        `data` and `request_bytes` are set)."""
+        pass
+
+    def after(self, event):
+        """Called after the request, also if it failed."""
+        pass
+
+
+def _split_path(path):
+    keys = path.strip('/').split('/')
+    if keys[:1] == ['api']:
+        # /api/<username>/...
+        keys = keys[2:]
+    return keys
+
+
+def endpoint(path):
+    """Replace the username and the IDs of a request path, e. g.
+    `/api/<username>/lights/3/state` becomes `/lights/{id}/state`."""
+    return '/' + '/'.join('{id}' if key.isdigit() else key
+                          for key in _split_path(path))
+
+
+def light_id(path):
+    """The light ID of a request path or None."""
+    keys = _split_path(path)
+    if len(keys) >= 2 and keys[0] == 'lights' and keys[1].isdigit():
+        return int(keys[1])
+    return None
+
+
+class Histogram(object):
+    """Count observations in buckets.
+
+    :param tuple buckets: The upper bounds of the buckets.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        """The count of each bucket, the last one is the `+Inf` bucket."""
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """A list of `(upper bound, count)` tuples as in Prometheus: each
+        count includes the smaller buckets."""
+        out = []
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf', ), self.counts):
+            total += count
+            out.append((bound, total))
+        return out
+
+
+def _labels(**labels):
+    pairs = []
+    for name, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"') \
+            .replace('\n', '\\n')
+        pairs.append('{}="{}"'.format(name, value))
+    return '{' + ','.join(pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def format_stats(name, stats, prefix='lively_lights'):
+    """Format a statistics dictionary (e. g.
+    :meth:`lively_lights.dispatcher.Dispatcher.stats`) as Prometheus
+    gauges named `<prefix>_<name>_<key>`."""
+    out = []
+    for key, value in sorted(stats.items()):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        metric = '{}_{}_{}'.format(prefix, name, key)
+        out.append('# TYPE {} gauge'.format(metric))
+        out.append('{} {}'.format(metric, _number(value)))
+    return '\n'.join(out) + '\n' if out else ''
+
+
+class RequestMetrics(RequestHook):
+    """Collect latency histograms per endpoint and request, error, byte and
+    light counters.
+
+    :param tuple buckets: The upper bounds of the latency buckets in
+      seconds.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._latency = {}
+            """Histograms by `(method, endpoint)`."""
+            self._requests = {}
+            """Counts by `(method, endpoint, status)`."""
+            self._errors = {}
+            """Counts by `(method, endpoint, error type)`. Errors reported
+            by the bridge in the response body have the type `bridge`."""
+            self._lights = {}
+            """Request counts by light ID."""
+            self._bytes = {'sent': 0, 'received': 0}
+
+    @staticmethod
+    def _increment(counter, key, value=1):
+        counter[key] = counter.get(key, 0) + value
+
+    def after(self, event):
+        key = (event.method, endpoint(event.path))
+        status = event.status if event.status is not None else 'error'
+        errors = []
+        if event.error is not None:
+            errors.append(type(event.error).__name__)
+        if isinstance(event.result, list):
+            errors.extend('bridge' for item in event.result
+                          if isinstance(item, dict) and 'error' in item)
+        light = light_id(event.path)
+        with self._lock:
+            if key not in self._latency:
+                self._latency[key] = Histogram(self.buckets)
+            if event.latency is not None:
+                self._latency[key].observe(event.latency)
+            self._increment(self._requests, key + (status, ))
+            for error in errors:
+                self._increment(self._errors, key + (error, ))
+            if light is not None:
+                self._increment(self._lights, light)
+            self._bytes['sent'] += event.request_bytes
+            self._bytes['received'] += event.response_bytes
+
+    def snapshot(self):
+        """The counters as a dictionary.
+
+        .. code-block:: python
+
+            {
+                'requests': {('PUT', '/lights/{id}/state', 200): 12},
+                'errors': {('PUT', '/lights/{id}/state', 'bridge'): 1},
+                'lights': {1: 6, 2: 6},
+                'bytes': {'sent': 840, 'received': 1320},
+                'latency': {('PUT', '/lights/{id}/state'): {
+                    'count': 12, 'sum': 0.3}},
+            }
+        """
+        with self._lock:
+            return {
+                'requests': dict(self._requests),
+                'errors': dict(self._errors),
+                'lights': dict(self._lights),
+                'bytes': dict(self._bytes),
+                'latency': {key: {'count': histogram.count,
+                                  'sum': histogram.sum}
+                            for key, histogram in self._latency.items()},
+            }
+
+    def prometheus(self, prefix='lively_lights'):
+        """Export the metrics in the Prometheus text format."""
+        out = []
+        with self._lock:
+            name = prefix + '_request_duration_seconds'
+            out.append('# HELP {} Latency of the requests to the bridge.'
+                       .format(name))
+            out.append('# TYPE {} histogram'.format(name))
+            for (method, path), histogram in sorted(self._latency.items()):
+                for bound, count in histogram.cumulative():
+                    out.append('{}_bucket{} {}'.format(
+                        name,
+                        _labels(endpoint=path, method=method, le=bound),
+                        count))
+                labels = _labels(endpoint=path, method=method)
+                out.append('{}_sum{} {}'.format(name, labels,
+                                                _number(histogram.sum)))
+                out.append('{}_count{} {}'.format(name, labels,
+                                                  histogram.count))
+
+            name = prefix + '_requests_total'
+            out.append('# HELP {} Requests to the bridge.'.format(name))
+            out.append('# TYPE {} counter'.format(name))
+            for (method, path, status), count in \
+                    sorted(self._requests.items(), key=str):
+                out.append('{}{} {}'.format(name, _labels(
+                    endpoint=path, method=method, status=status), count))
+
+            name = prefix + '_request_errors_total'
+            out.append('# HELP {} Failed requests and errors reported by '
+                       'the bridge.'.format(name))
+            out.append('# TYPE {} counter'.format(name))
+            for (method, path, error), count in sorted(self._errors.items()):
+                out.append('{}{} {}'.format(name, _labels(
+                    endpoint=path, method=method, type=error), count))
+
+            name = prefix + '_light_requests_total'
+            out.append('# HELP {} Requests to the bridge by light.'
+                       .format(name))
+            out.append('# TYPE {} counter'.format(name))
+            for light, count in sorted(self._lights.items()):
+                out.append('{}{} {}'.format(name, _labels(light=light),
+                                            count))
+
+            name = prefix + '_bytes_total'
+            out.append('# HELP {} Bytes of the request and response bodies.'
+                       .format(name))
+            out.append('# TYPE {} counter'.format(name))
+            for direction, count in sorted(self._bytes.items()):
+                out.append('{}{} {}'.format(name,
+                                            _labels(direction=direction),
+                                            count))
+        return '\n'.join(out) + '\n'
@@ -0,0 +1,288 @@
+"""Control the lights of several Hue bridges as one bridge.
+
+One bridge handles about 50 lights and 10 light commands per second. A
+:class:`lively_lights.multibridge.MultiBridge` addresses the lights as
+`(bridge name, light ID)` tuples and routes each command to the
+dispatcher of the owning bridge. Every bridge sends in its own thread with
+its own connection pool and rate limits, so the throughput grows with the
+number of bridges. Scenes, launcher playlists and
+:class:`lively_lights.ReachableLights` accept a multi bridge instead of a
+bridge.
+
+.. code-block:: python
+
+    bridge = MultiBridge({
+        'living': Bridge('192.168.3.60', 'username1'),
+        'bedroom': Bridge('192.168.3.61', 'username2'),
+    })
+    reachable_lights = ReachableLights(bridge, day_night,
+                                       light_ids=[('living', 1),
+                                                  ('bedroom', 3)])
+"""
+
+from lively_lights.dispatcher import Flow
+import collections
+import time
+
+
+def split_light_ids(light_ids):
+    """Group `(bridge name, light ID)` tuples by bridge.
+
+    :return: An ordered dictionary: bridge name → list of light IDs.
+    """
+    out = collections.OrderedDict()
+    for name, light_id in light_ids:
+        out.setdefault(name, []).append(light_id)
+    return out
+
+
+def sum_stats(stats):
+    """Sum a list of statistics dictionaries. Keys starting with `max_` get
+    the maximum."""
+    out = {}
+    for item in stats:
+        for key, value in item.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            if key.startswith('max_'):
+                out[key] = max(out.get(key, value), value)
+            else:
+                out[key] = out.get(key, 0) + value
+    return out
+
+
+class ShardLight(object):
+    """A light of one of the bridges. The `light_id` is the tuple
+    `(bridge name, light ID)`, all other attributes are those of
+    :class:`lively_lights.phue.Light`.
+
+    :param str bridge_name: The name of the bridge.
+    :param light: :class:`lively_lights.phue.Light`
+    """
+
+    def __init__(self, bridge_name, light):
+        self.__dict__['light_id'] = (bridge_name, light.light_id)
+        self.__dict__['light'] = light
+
+    def __getattr__(self, name):
+        return getattr(self.light, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.light, name, value)
+
+    def __repr__(self):
+        return '<ShardLight {}:{}>'.format(*self.light_id)
+
+
+class MultiShadowState(object):
+    """Route :meth:`lively_lights.dispatcher.ShadowState.forget` to the
+    bridges."""
+
+    def __init__(self, multi_bridge):
+        self.multi_bridge = multi_bridge
+
+    def forget(self, light_ids=None, fields=None):
+        if light_ids is None:
+            for bridge in self.multi_bridge.bridges.values():
+                bridge.dispatcher.shadow.forget(None, fields)
+            return
+        for name, ids in split_light_ids(light_ids).items():
+            shadow = self.multi_bridge.bridges[name].dispatcher.shadow
+            shadow.forget(ids, fields)
+
+
+class MultiDispatcher(object):
+    """Route the commands to the dispatchers of the bridges (same interface
+    as :class:`lively_lights.dispatcher.Dispatcher`).
+
+    :param multi_bridge: :class:`lively_lights.multibridge.MultiBridge`
+    """
+
+    def __init__(self, multi_bridge):
+        self.multi_bridge = multi_bridge
+
+        self.shadow = MultiShadowState(multi_bridge)
+        """:class:`lively_lights.multibridge.MultiShadowState`"""
+
+    def _dispatcher(self, name):
+        return self.multi_bridge.bridges[name].dispatcher
+
+    def set_light(self, light_id, data, flow=None):
+        """:param tuple light_id: `(bridge name, light ID)`"""
+        name, light_id = light_id
+        self._dispatcher(name).set_light(light_id, data, flow)
+
+    def set_group(self, group_id, data, flow=None):
+        """:param tuple group_id: `(bridge name, group ID)`"""
+        name, group_id = group_id
+        self._dispatcher(name).set_group(group_id, data, flow)
+
+    def set_lights(self, light_ids, data, flow=None):
+        """Queue the same state change for lights of several bridges. Each
+        bridge broadcasts it to its lights as one group action if
+        possible."""
+        for name, ids in split_light_ids(light_ids).items():
+            self._dispatcher(name).set_lights(ids, data, flow)
+
+    def flow(self, name, weight=1):
+        """A flow with the same weight on every bridge, see
+        :meth:`lively_lights.dispatcher.Dispatcher.flow`."""
+        for bridge in self.multi_bridge.bridges.values():
+            bridge.dispatcher.flow(name, weight)
+        return Flow(self, name, weight)
+
+    def flow_stats(self):
+        """The statistics of each flow summed up over the bridges."""
+        flows = collections.defaultdict(list)
+        for bridge in self.multi_bridge.bridges.values():
+            for name, stats in bridge.dispatcher.flow_stats().items():
+                flows[name].append(stats)
+        out = {}
+        for name, stats in flows.items():
+            out[name] = sum_stats(stats)
+            out[name]['weight'] = stats[0]['weight']
+        return out
+
+    @property
+    def queue_depth(self):
+        return sum(bridge.dispatcher.queue_depth
+                   for bridge in self.multi_bridge.bridges.values())
+
+    def flush(self, timeout=None):
+        """Block until the queues of all bridges are empty."""
+        end = None if timeout is None else time.monotonic() + timeout
+        flushed = True
+        for bridge in self.multi_bridge.bridges.values():
+            remaining = None if end is None else \
+                max(end - time.monotonic(), 0)
+            flushed = bridge.dispatcher.flush(remaining) and flushed
+        return flushed
+
+    def stats(self):
+        """The statistics of all dispatchers summed up."""
+        return sum_stats(bridge.dispatcher.stats()
+                         for bridge in self.multi_bridge.bridges.values())
+
+
+class MultiStateCache(object):
+
+    def __init__(self, multi_bridge):
+        self.multi_bridge = multi_bridge
+
+    def invalidate(self):
+        for bridge in self.multi_bridge.bridges.values():
+            bridge.state_cache.invalidate()
+
+    @property
+    def pushed_at(self):
+        """The time of the last change pushed into one of the caches."""
+        times = [bridge.state_cache.pushed_at
+                 for bridge in self.multi_bridge.bridges.values()
+                 if bridge.state_cache.pushed_at is not None]
+        return max(times) if times else None
+
+    def stats(self):
+        """The statistics of all state caches summed up."""
+        return sum_stats(bridge.state_cache.stats()
+                         for bridge in self.multi_bridge.bridges.values())
+
+
+class MultiBridge(object):
+    """Several bridges addressed as one.
+
+    :param dict bridges: :class:`lively_lights.phue.Bridge` objects by
+      name. The names must not contain colons.
+    """
+
+    def __init__(self, bridges):
+        self.bridges = collections.OrderedDict(bridges)
+        """:class:`lively_lights.phue.Bridge` objects by name."""
+        if not self.bridges:
+            raise ValueError('A multi bridge needs at least one bridge.')
+        for name in self.bridges:
+            if ':' in name:
+                raise ValueError('Bridge names must not contain colons: '
+                                 '“{}”.'.format(name))
+
+        self.dispatcher = MultiDispatcher(self)
+        """:class:`lively_lights.multibridge.MultiDispatcher`"""
+
+        self.state_cache = MultiStateCache(self)
+        """:class:`lively_lights.multibridge.MultiStateCache`"""
+
+        self._executor = None
+
+    def _map(self, function):
+        """Call `function(bridge)` for all bridges in parallel.
+
+        :return: A list of `(name, result)` tuples.
+        """
+        if len(self.bridges) == 1:
+            results = [function(bridge) for bridge in self.bridges.values()]
+        else:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(len(self.bridges))
+            results = list(self._executor.map(function,
+                                              self.bridges.values()))
+        return list(zip(self.bridges, results))
+
+    @property
+    def lights(self):
+        """The lights of all bridges as
+        :class:`lively_lights.multibridge.ShardLight` objects."""
+        out = []
+        for name, lights in self._map(lambda bridge: bridge.lights):
+            out.extend(ShardLight(name, light) for light in lights)
+        return out
+
+    def __getitem__(self, light_id):
+        """:param tuple light_id: `(bridge name, light ID)`"""
+        name, light_id = light_id
+        return ShardLight(name, self.bridges[name][light_id])
+
+    def get_light(self, light_id=None, parameter=None):
+        """Like :meth:`lively_lights.phue.Bridge.get_light`. Without a
+        light ID the lights of all bridges are fetched in parallel and
+        returned by `(bridge name, light ID)`."""
+        if light_id is not None:
+            name, light_id = light_id
+            return self.bridges[name].get_light(light_id, parameter)
+        out = {}
+        for name, lights in self._map(lambda bridge: bridge.get_light()):
+            for light_id, light in lights.items():
+                out[(name, int(light_id))] = light
+        return out
+
+    def set_light(self, light_id, parameter, value=None, transitiontime=None):
+        """Like :meth:`lively_lights.phue.Bridge.set_light` for one light
+        `(bridge name, light ID)`."""
+        name, light_id = light_id
+        return self.bridges[name].set_light(light_id, parameter, value,
+                                            transitiontime)
+
+    def add_hook(self, hook):
+        for bridge in self.bridges.values():
+            bridge.add_hook(hook)
+
+    def remove_hook(self, hook):
+        for bridge in self.bridges.values():
+            bridge.remove_hook(hook)
+
+    def close(self):
+        """Close the connections to all bridges."""
+        for bridge in self.bridges.values():
+            bridge.close()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def pool_stats(self):
+        """The statistics of all connection pools summed up."""
+        return sum_stats(bridge.pool_stats()
+                         for bridge in self.bridges.values())
+
+    def stats(self):
+        """The dispatcher statistics of each bridge by name."""
+        return {name: bridge.dispatcher.stats()
+                for name, bridge in self.bridges.items()}
@@ -0,0 +1,242 @@
+"""Run the playlists of several rooms on one bridge.
+
+Launchers started in separate threads each think they own the bridge. The
+rooms of a :class:`lively_lights.orchestrator.Orchestrator` share one
+bridge (one connection pool, one state cache and one dispatcher) and one
+scheduler. The command budget of the bridge is divided between the rooms
+by weighted fair queuing (see :class:`lively_lights.dispatcher.Flow`), so
+a room with many lights or fast scenes cannot starve the others.
+
+.. code-block:: python
+
+    orchestrator = Orchestrator(hue.bridge, day_night, refresh_interval=30)
+    orchestrator.add_room('bedroom', [4, 5, 6],
+                          scene_configs_file='bedroom.yml')
+    orchestrator.add_room('livingroom', [1, 2, 3, 7, 8, 9], weight=2,
+                          scene_configs_file='livingroom.yml',
+                          not_during_daytime=True)
+    orchestrator.run()
+"""
+
+from lively_lights.environment import ReachableLights
+from lively_lights.scenes import Launcher
+from lively_lights.scheduler import Scheduler
+import collections
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class RoomBridge(object):
+    """The bridge as seen by the scenes of one room: the commands are queued
+    in the flow of the room, everything else is the shared bridge.
+
+    :param bridge: :class:`lively_lights.phue.Bridge`
+    :param flow: :class:`lively_lights.dispatcher.Flow`
+    """
+
+    def __init__(self, bridge, flow):
+        self.__dict__['bridge'] = bridge
+        self.__dict__['dispatcher'] = flow
+
+    def __getattr__(self, name):
+        return getattr(self.bridge, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.bridge, name, value)
+
+    def __getitem__(self, key):
+        return self.bridge[key]
+
+
+class Room(object):
+    """One room of the orchestrator.
+
+    :param str name: The name of the room.
+    :param launcher: :class:`lively_lights.scenes.Launcher`
+    :param float weight: The share of the command budget.
+    :param bool randomized: Play the scenes in random order.
+    """
+
+    def __init__(self, name, launcher, weight=1, randomized=False):
+        self.name = name
+        self.launcher = launcher
+        self.weight = weight
+        self.randomized = randomized
+        self.thread = None
+
+    @property
+    def reachable_lights(self):
+        return self.launcher.reachable_lights
+
+    @property
+    def flow(self):
+        """:class:`lively_lights.dispatcher.Flow`"""
+        return self.launcher.bridge.dispatcher
+
+    def _run(self, endless, duration):
+        try:
+            self.launcher.launch(randomized=self.randomized, endless=endless,
+                                 duration=duration)
+        except Exception:
+            logger.exception('The room “{}” failed.'.format(self.name))
+
+
+class Orchestrator(object):
+    """Run the playlists of several rooms in one process.
+
+    :param bridge: The bridge object shared by all rooms.
+    :type bridge: lively_lights.phue.Bridge
+
+    :param day_night: :class:`lively_lights.DayNight`, needed for the
+      arguments `not_at_night` and `not_during_daytime` of the rooms.
+
+    :param int refresh_interval: Refresh the reachable states of the lights
+      every n seconds.
+
+    :param scheduler: The event loop shared by the scenes of all rooms.
+    :type scheduler: lively_lights.scheduler.Scheduler
+    """
+
+    def __init__(self, bridge, day_night=None, refresh_interval=60,
+                 verbosity_level=0, scheduler=None):
+        self.bridge = bridge
+        self.day_night = day_night
+        self.refresh_interval = refresh_interval
+        self.verbosity_level = verbosity_level
+
+        self.scheduler = scheduler or Scheduler()
+        """:class:`lively_lights.scheduler.Scheduler`"""
+
+        self.rooms = collections.OrderedDict()
+        """:class:`lively_lights.orchestrator.Room` objects by name."""
+
+        self._started_at = None
+
+    def add_room(self, name, lights, scene_configs=None,
+                 scene_configs_file=None, weight=1, randomized=False,
+                 **kwargs):
+        """Add a room playing a playlist.
+
+        :param str name: The name of the room.
+
+        :param lights: A list of light IDs or a
+          :class:`lively_lights.ReachableLights` object.
+
+        :param list scene_configs: The playlist, see
+          :class:`lively_lights.scenes.Launcher`.
+
+        :param str scene_configs_file: The playlist as a YAML file.
+
+        :param float weight: The share of the command budget. A room with
+          the weight 2 may send twice as many commands as a room with the
+          weight 1 while both are busy.
+
+        :param bool randomized: Play the scenes in random order.
+
+        :param kwargs: More arguments of
+          :class:`lively_lights.ReachableLights`, e. g. `not_at_night`.
+
+        :return: :class:`lively_lights.orchestrator.Room`
+        """
+        if name in self.rooms:
+            raise ValueError('The room “{}” already exists.'.format(name))
+        if isinstance(lights, ReachableLights):
+            reachable_lights = lights
+        else:
+            reachable_lights = ReachableLights(
+                self.bridge, self.day_night, light_ids=list(lights),
+                refresh_interval=self.refresh_interval, **kwargs)
+        flow = self.bridge.dispatcher.flow(name, weight)
+        launcher = Launcher(RoomBridge(self.bridge, flow), reachable_lights,
+                            scene_configs=scene_configs,
+                            scene_configs_file=scene_configs_file,
+                            verbosity_level=self.verbosity_level,
+                            scheduler=self.scheduler)
+        room = Room(name, launcher, weight, randomized)
+        self.rooms[name] = room
+        return room
+
+    def start(self, endless=True, duration=None):
+        """Start the playlists of all rooms in background threads.
+
+        :param bool endless: Play the playlists again and again.
+        :param float duration: The duration of each scene in seconds.
+        """
+        if not self.scheduler.running:
+            self.scheduler.start()
+        self._started_at = time.monotonic()
+        for room in self.rooms.values():
+            room.thread = threading.Thread(
+                target=room._run, args=(endless, duration),
+                name='lively-lights-room-{}'.format(room.name))
+            room.thread.daemon = True
+            room.thread.start()
+
+    def join(self, timeout=None):
+        """Wait until the playlists of all rooms have finished.
+
+        :return: True if all rooms have finished.
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        for room in self.rooms.values():
+            if room.thread is None:
+                continue
+            room.thread.join(None if end is None
+                             else max(end - time.monotonic(), 0))
+            if room.thread.is_alive():
+                return False
+        return True
+
+    def stop(self):
+        """Stop the scenes of all rooms and the scheduler."""
+        for room in self.rooms.values():
+            room.launcher.stop()
+        self.join()
+        self.scheduler.stop()
+
+    def run(self, endless=True, duration=None):
+        """Play the playlists of all rooms until they are finished or
+        interrupted (e. g. by `Ctrl-C`)."""
+        self.start(endless, duration)
+        try:
+            while not self.join(1):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stats(self):
+        """The throughput of each room by name.
+
+        .. code-block:: python
+
+            {
+                'bedroom': {
+                    'scene': 'breath',
+                    'weight': 1,
+                    'queue_depth': 0,
+                    'queued': 240,
+                    'sent': 180,
+                    'coalesced': 55,
+                    'suppressed': 4,
+                    'sent_per_second': 2.9,
+                },
+            }
+        """
+        flows = self.bridge.dispatcher.flow_stats()
+        elapsed = None
+        if self._started_at is not None:
+            elapsed = time.monotonic() - self._started_at
+        out = {}
+        for name, room in self.rooms.items():
+            stats = dict(flows.get(name, {}))
+            scene = room.launcher.scene
+            stats['scene'] = scene.name if scene else None
+            if elapsed:
+                stats['sent_per_second'] = stats.get('sent', 0) / elapsed
+            out[name] = stats
+        return out
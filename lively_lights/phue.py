@@ -20,7 +20,13 @@ import os
 import platform
 import sys
 import socket
+import threading
+import time
 from lively_lights._utils import RestDebug
+from lively_lights.cache import StateCache
+from lively_lights.connection import ConnectionPool
+from lively_lights.dispatcher import Dispatcher
+from lively_lights.metrics import RequestEvent
 if sys.version_info[0] > 2:
     PY3K = True
 else:
@@ -72,6 +78,12 @@ class Light(object):
     Light settings can be accessed or set via the properties of this object.
 
     """
+    # No __dict__: a bridge keeps one object per light for its lifetime.
+    __slots__ = ('bridge', 'light_id', '_name', '_on', '_brightness',
+                 '_colormode', '_hue', '_saturation', '_xy', '_colortemp',
+                 '_effect', '_alert', 'transitiontime',
+                 '_reset_bri_after_on', '_reachable', '_type')
+
     def __init__(self, bridge, light_id):
         self.bridge = bridge
         self.light_id = light_id
@@ -329,6 +341,10 @@ class Sensor(object):
     Sensor config and state can be read and updated via the properties of this object
 
     """
+    __slots__ = ('bridge', 'sensor_id', '_name', '_model', '_modelid',
+                 '_swversion', '_type', '_uniqueid', '_manufacturername',
+                 '_state', '_config', '_recycle')
+
     def __init__(self, bridge, sensor_id):
         self.bridge = bridge
         self.sensor_id = sensor_id
@@ -457,6 +473,7 @@ class Group(Light):
         >>> # will raise a LookupError if the name doesn't match
 
     """
+    __slots__ = ('group_id', )
 
     def __init__(self, bridge, group_id):
         Light.__init__(self, bridge, None)
@@ -519,7 +536,11 @@ class Group(Light):
         """ Return a list of all lights in this group"""
         # response = self.bridge.request('GET', '/api/{0}/groups/{1}'.format(self.bridge.username, self.group_id))
         # return [Light(self.bridge, int(l)) for l in response['lights']]
-        return [Light(self.bridge, int(l)) for l in self._get('lights')]
+        # Reuse the light objects of the bridge instead of creating new ones
+        # on every access.
+        lights = self.bridge.get_light_objects('id')
+        return [lights[int(l)] if int(l) in lights
+                else Light(self.bridge, int(l)) for l in self._get('lights')]
 
     @lights.setter
     def lights(self, value):
@@ -539,6 +560,8 @@ class AllLights(Group):
     listing the groups, but is accessible if you explicitly
     ask for group 0.
     """
+    __slots__ = ()
+
     def __init__(self, bridge=None):
         if bridge is None:
             bridge = Bridge()
@@ -597,7 +620,9 @@ class Bridge(object):
 
     """
     def __init__(self, ip=None, username=None, config_file_path=None,
-                 verbosity_level=0, colorize_output=False):
+                 verbosity_level=0, colorize_output=False, pool_size=4,
+                 timeout=10, light_rate=10, group_rate=1, cache_ttl=1,
+                 shadow_ttl=30):
         """ Initialization function.
 
         Parameters:
@@ -605,6 +630,21 @@ class Bridge(object):
         ip : string
             IP address as dotted quad
         username : string, optional
+        pool_size : int, optional
+            Maximum number of persistent HTTP connections to the bridge
+        timeout : float, optional
+            Socket timeout in seconds
+        light_rate : float, optional
+            Light commands per second sent by the dispatcher
+        group_rate : float, optional
+            Group commands per second sent by the dispatcher
+        cache_ttl : float, optional
+            Seconds to read the state of lights, groups and sensors from
+            one cached snapshot of the full bridge state, 0 disables the
+            cache
+        shadow_ttl : float, optional
+            Seconds to remember the state sent to a light in order to leave
+            unchanged fields out of the next command, 0 disables it
 
         """
 
@@ -625,7 +665,19 @@ class Bridge(object):
         self.sensors_by_name = {}
         self.verbosity_level = verbosity_level
         self.colorize_output = colorize_output
+        self.pool_size = pool_size
+        self.timeout = timeout
         self._name = None
+        self.hooks = ()
+        self._hooks_lock = threading.Lock()
+        if verbosity_level >= 2:
+            self.add_hook(RestDebug(verbosity_level, colorize_output))
+        self._connection_pool = None
+        self._connection_pool_lock = threading.Lock()
+        self.dispatcher = Dispatcher(self, light_rate=light_rate,
+                                     group_rate=group_rate,
+                                     shadow_ttl=shadow_ttl)
+        self.state_cache = StateCache(self, ttl=cache_ttl)
 
         # self.minutes = 600 # these do not seem to be used anywhere?
         # self.seconds = 10
@@ -646,19 +698,81 @@ class Bridge(object):
         self.request(
             'PUT', '/api/' + self.username + '/config', data)
 
+    @property
+    def connection_pool(self):
+        """ The pool of persistent connections to the bridge. A new pool is
+        set up if the ip address of the bridge has changed. """
+        with self._connection_pool_lock:
+            if self._connection_pool is None or \
+                    self._connection_pool.host != self.ip:
+                if self._connection_pool is not None:
+                    self._connection_pool.close()
+                self._connection_pool = ConnectionPool(
+                    self.ip, size=self.pool_size, timeout=self.timeout)
+            return self._connection_pool
+
+    def pool_stats(self):
+        """ Statistics of the connection pool, see
+        :meth:`lively_lights.connection.ConnectionPool.stats` """
+        return self.connection_pool.stats()
+
+    def close(self):
+        """ Send the queued commands, delete the groups the dispatcher
+        created and close the persistent connections to the bridge. Call it
+        when the bridge is no longer used. """
+        self.dispatcher.close()
+        with self._connection_pool_lock:
+            if self._connection_pool is not None:
+                self._connection_pool.close()
+
+    def add_hook(self, hook):
+        """ Call the hook before and after each request, see
+        :class:`lively_lights.metrics.RequestHook` """
+        with self._hooks_lock:
+            # Replaced, not changed in place: requests running in other
+            # threads keep iterating over the old tuple.
+            self.hooks = self.hooks + (hook, )
+
+    def remove_hook(self, hook):
+        with self._hooks_lock:
+            self.hooks = tuple(h for h in self.hooks if h is not hook)
+
+    @staticmethod
+    def _call_hooks(hooks, name, event):
+        for hook in hooks:
+            try:
+                getattr(hook, name)(event)
+            except Exception:
+                logger.exception('The request hook {} failed.'.format(hook))
+
     def request(self, mode='GET', address=None, data=None):
         """ Utility function for HTTP GET/PUT requests for the API"""
 
-        rest_debug = RestDebug(self.verbosity_level, self.colorize_output)
-        rest_debug.print_request(mode, address, data)
-        connection = httplib.HTTPConnection(self.ip, timeout=10)
+        body = None
+        if mode == 'PUT' or mode == 'POST':
+            body = json.dumps(data)
 
-        try:
-            if mode == 'GET' or mode == 'DELETE':
-                connection.request(mode, address)
-            if mode == 'PUT' or mode == 'POST':
-                connection.request(mode, address, json.dumps(data))
+        hooks = self.hooks
+        if not hooks:
+            return self._request(mode, address, data, body)
 
+        event = RequestEvent(mode, address, data, body)
+        self._call_hooks(hooks, 'before', event)
+        begin = time.perf_counter()
+        try:
+            event.result = self._request(mode, address, data, body, event)
+        except Exception as error:
+            event.error = error
+            raise
+        finally:
+            event.latency = time.perf_counter() - begin
+            self._call_hooks(hooks, 'after', event)
+        return event.result
+
+    def _request(self, mode, address, data, body, event=None):
+        try:
+            status, response = self.connection_pool.request(mode, address,
+                                                            body)
             logger.debug("{0} {1} {2}".format(mode, address, str(data)))
 
         except socket.timeout:
@@ -667,16 +781,17 @@ class Bridge(object):
             logger.exception(error)
             raise PhueRequestTimeout(None, error)
 
-        result = connection.getresponse()
-        response = result.read()
-        if response:
-            rest_debug.print_json(json.loads(response.decode('utf-8')))
-        connection.close()
+        if event is not None:
+            event.status = status
+            event.response_bytes = len(response)
         if PY3K:
-            return json.loads(response.decode('utf-8'))
+            result = json.loads(response.decode('utf-8'))
         else:
             logger.debug(response)
-            return json.loads(response)
+            result = json.loads(response)
+        self.state_cache.update(mode, result)
+        self.dispatcher.update(mode, result)
+        return result
 
     def get_ip_address(self, set_result=False):
 
@@ -777,7 +892,7 @@ class Bridge(object):
         The returned collection can be either a list (default), or a dict.
         Set mode='id' for a dict by light ID, or mode='name' for a dict by light name.   """
         if self.lights_by_id == {}:
-            lights = self.request('GET', '/api/' + self.username + '/lights/')
+            lights = self.get_light()
             for light in lights:
                 self.lights_by_id[int(light)] = Light(self, int(light))
                 self.lights_by_name[lights[light][
@@ -807,7 +922,7 @@ class Bridge(object):
         The returned collection can be either a list (default), or a dict.
         Set mode='id' for a dict by sensor ID, or mode='name' for a dict by sensor name.   """
         if self.sensors_by_id == {}:
-            sensors = self.request('GET', '/api/' + self.username + '/sensors/')
+            sensors = self.get_sensor()
             for sensor in sensors:
                 self.sensors_by_id[int(sensor)] = Sensor(self, int(sensor))
                 self.sensors_by_name[sensors[sensor][
@@ -852,9 +967,14 @@ class Bridge(object):
         if is_string(light_id):
             light_id = self.get_light_id_by_name(light_id)
         if light_id is None:
+            lights = self.state_cache.get('lights')
+            if lights is not None:
+                return lights
             return self.request('GET', '/api/' + self.username + '/lights/')
-        state = self.request(
-            'GET', '/api/' + self.username + '/lights/' + str(light_id))
+        state = self.state_cache.get('lights', light_id)
+        if state is None:
+            state = self.request(
+                'GET', '/api/' + self.username + '/lights/' + str(light_id))
         if parameter is None:
             return state
         if parameter in ['name', 'type', 'uniqueid', 'swversion']:
@@ -955,9 +1075,14 @@ class Bridge(object):
         if is_string(sensor_id):
             sensor_id = self.get_sensor_id_by_name(sensor_id)
         if sensor_id is None:
+            sensors = self.state_cache.get('sensors')
+            if sensors is not None:
+                return sensors
             return self.request('GET', '/api/' + self.username + '/sensors/')
-        data = self.request(
-            'GET', '/api/' + self.username + '/sensors/' + str(sensor_id))
+        data = self.state_cache.get('sensors', sensor_id)
+        if data is None:
+            data = self.request(
+                'GET', '/api/' + self.username + '/sensors/' + str(sensor_id))
 
         if isinstance(data, list):
             logger.debug("Unable to read sensor with ID {0}: {1}".format(sensor_id, repr(data)))
@@ -1075,13 +1200,19 @@ class Bridge(object):
             logger.error('Group name does not exit')
             return
         if group_id is None:
+            groups = self.state_cache.get('groups')
+            if groups is not None:
+                return groups
             return self.request('GET', '/api/' + self.username + '/groups/')
+        group = self.state_cache.get('groups', group_id)
+        if group is None:
+            group = self.request('GET', '/api/' + self.username + '/groups/' + str(group_id))
         if parameter is None:
-            return self.request('GET', '/api/' + self.username + '/groups/' + str(group_id))
+            return group
         elif parameter == 'name' or parameter == 'lights':
-            return self.request('GET', '/api/' + self.username + '/groups/' + str(group_id))[parameter]
+            return group[parameter]
         else:
-            return self.request('GET', '/api/' + self.username + '/groups/' + str(group_id))['action'][parameter]
+            return group['action'][parameter]
 
     def set_group(self, group_id, parameter, value=None, transitiontime=None):
         """ Change light settings for a group
@@ -1,13 +1,15 @@
 """A collection of scenes."""
 
 from lively_lights import _random as random
-from lively_lights._utils import set_light_multiple
+from lively_lights._utils import set_light_multiple, set_lights_multiple
 from lively_lights import types
-from random import randint, shuffle
-import threading
-import time
+from lively_lights.conditions import ConditionEngine
+from lively_lights.scheduler import Scheduler, default_clock
+from lively_lights.timeline import Timeline, TimelinePlayer
+from random import shuffle
+import heapq
 import sys
-import yaml
+import threading
 
 
 class Launcher(object):
@@ -56,6 +58,14 @@ class Launcher(object):
     :param string scene_configs_file: The file path of a yaml file containing
       the scene configurations.
 
+    :param clock: The clock of the scenes, by default the shared
+      :data:`lively_lights.scheduler.default_clock`.
+    :type clock: lively_lights.scheduler.Clock
+
+    :param scheduler: The event loop of the scenes, by default each scene
+      gets its own scheduler.
+    :type scheduler: lively_lights.scheduler.Scheduler
+
     .. code-block:: yaml
 
         - title: Rainbow
@@ -83,13 +93,22 @@ class Launcher(object):
     """
 
     def __init__(self, bridge, reachable_lights, scene_configs=None,
-                 scene_configs_file=None, verbosity_level=0):
+                 scene_configs_file=None, verbosity_level=0, clock=None,
+                 scheduler=None):
         self.bridge = bridge
         """The bridge object: :class:`lively_lights.phue.Bridge`"""
         self.reachable_lights = reachable_lights
         """A reachable lights object :class:`lively_lights.ReachableLights`:"""
         self.verbosity_level = verbosity_level
         """The verbosity level."""
+        self.clock = clock
+        """The clock of the scenes :class:`lively_lights.scheduler.Clock`"""
+        self.scheduler = scheduler
+        """The event loop of the scenes
+        :class:`lively_lights.scheduler.Scheduler`"""
+        self.scene = None
+        """The scene playing right now :class:`lively_lights.scenes.Scene`"""
+        self._stop_event = threading.Event()
         self.scenes = []
         """A list of scenes :class:`lively_lights.scenes.Scene`"""
         if scene_configs:
@@ -102,6 +121,7 @@ class Launcher(object):
 
     @staticmethod
     def _read_yaml(yaml_file):
+        import yaml
         with open(yaml_file, 'r') as stream:
             return yaml.load(stream, Loader=yaml.FullLoader)
 
@@ -112,7 +132,9 @@ class Launcher(object):
 
     def _init_scene(self, scene_config):
         Scene = self._get_scene_class(scene_config['scene_name'])
-        scene = Scene(self.bridge, self.reachable_lights)
+        scene = Scene(self.bridge, self.reachable_lights,
+                      scheduler=self.scheduler, clock=self.clock,
+                      seed=scene_config.get('seed'))
         if 'title' in scene_config:
             scene.title = scene_config['title']
         if 'description' in scene_config:
@@ -152,8 +174,14 @@ class Launcher(object):
         scene.start(scene_config['duration'])
 
     def _start_scene(self, scene, duration=None):
+        if self._stop_event.is_set():
+            return
+        self.scene = scene
         scene.scene_reporter(self.verbosity_level)
-        scene.start(duration)
+        try:
+            scene.start(duration)
+        finally:
+            self.scene = None
 
     def _launch_randomized(self, duration=None):
         scenes_indexes = list(range(len(self.scenes)))
@@ -172,11 +200,21 @@ class Launcher(object):
             self._launch_sorted(duration)
 
     def launch(self, randomized=False, endless=False, duration=None):
-        if endless:
-            while True:
+        try:
+            if endless:
+                while not self._stop_event.is_set():
+                    self._launch(randomized, duration)
+            else:
                 self._launch(randomized, duration)
-        else:
-            self._launch(randomized, duration)
+        finally:
+            self._stop_event.clear()
+
+    def stop(self):
+        """Stop the playlist launched in another thread."""
+        self._stop_event.set()
+        scene = self.scene
+        if scene is not None:
+            scene.stop()
 
 
 class Scene(object):
@@ -185,6 +223,20 @@ class Scene(object):
     :param reachable_lights: An object containing the specified and
       reachable lights.
     :type reachable_lights: lively_lights.ReachableLights
+
+    :param scheduler: Run the timed callbacks of the scene in this event
+      loop. If the scheduler is not running in a background thread, the
+      scene runs it in the calling thread. By default each scene gets its
+      own scheduler.
+    :type scheduler: lively_lights.scheduler.Scheduler
+
+    :param clock: The monotonic clock to schedule the steps of the scene
+      with, by default the shared
+      :data:`lively_lights.scheduler.default_clock`.
+    :type clock: lively_lights.scheduler.Clock
+
+    :param int seed: Seed of the random generator of the scene. Scenes with
+      the same seed and properties play the same random values.
     """
 
     name = None
@@ -223,9 +275,28 @@ class Scene(object):
     """The method :class:`lively_lights.scenes.Scene.start` measures the
     actual time taken and stores the result in this attribute."""
 
-    def __init__(self, bridge, reachable_lights, **kwargs):
+    drift = None
+    """How many seconds the last step of the scene was late."""
+
+    max_drift = None
+    """The largest drift of all steps of the scene in seconds."""
+
+    def __init__(self, bridge, reachable_lights, scheduler=None, clock=None,
+                 seed=None, **kwargs):
         self.bridge = bridge
         self.reachable_lights = reachable_lights
+        if clock is None:
+            clock = default_clock
+        self.clock = clock
+        if scheduler is None:
+            scheduler = Scheduler(clock=clock)
+        self.scheduler = scheduler
+        self._stop_event = threading.Event()
+        """Set by :meth:`lively_lights.scenes.Scene.stop`."""
+
+        self.random = random.Generator(seed)
+        """The random generator of the scene:
+        :class:`lively_lights._random.Generator`"""
 
         for key, value in kwargs.items():
             if key in self.properties:
@@ -253,6 +324,19 @@ class Scene(object):
         self._set_defaults()
         self._validate()
 
+    def set_properties(self, dictionary):
+        """Change properties of a running scene. The values are validated
+        first, the new values take effect with the next step of the
+        scene."""
+        values = {}
+        for key, value in dictionary.items():
+            if key not in self.properties:
+                raise ValueError('Property “{}” is not allowed.'.format(key))
+            values[key] = self.properties[key]['type'](value)
+        self._check(dict(self._property_values(), **values))
+        for key, value in values.items():
+            setattr(self, key, value)
+
     def has_property(self, property):
         if not hasattr(self, property) or not getattr(self, property):
             return False
@@ -263,14 +347,166 @@ class Scene(object):
         """Should be overwritten."""
         pass
 
+    def _property_values(self):
+        return {property: getattr(self, property)
+                for property in self.properties}
+
+    def _check(self, values):
+        """Raise a ValueError if the property values do not fit together.
+        Should be overwritten.
+
+        :param dict values: The values of all properties by name.
+        """
+        pass
+
     def _validate(self):
         for property, config in self.properties.items():
             setattr(self, property, config['type'](getattr(self, property)))
+        self._check(self._property_values())
 
     def _run(self, duration=None):
         """Should be overwritten."""
         pass
 
+    def _prepare(self, duration=None):
+        """Adjust the properties to the duration. Should be overwritten."""
+        pass
+
+    def _events(self, light_ids):
+        """Should be overwritten: an endless generator of
+        `(t, end, light_ids, state)` tuples sorted by `t`. `t` is the time
+        in seconds since the start of the scene, the event only fits into
+        the duration of the scene if `end` is not later than the
+        duration. Without events the timelines are empty."""
+        return iter(())
+
+    def timelines(self, light_ids=None, chunk_duration=60, duration=None):
+        """Compile the scene into consecutive timelines.
+
+        :param list light_ids: The IDs of the lights, by default the
+          reachable lights.
+        :param float chunk_duration: The length of each timeline in seconds.
+        :param float duration: Stop after n seconds. Without a duration the
+          generator is endless.
+
+        :return: A generator of :class:`lively_lights.timeline.Timeline`
+          objects.
+        """
+        if light_ids is None:
+            light_ids = self.reachable_lights.get_light_ids()
+        self._prepare(duration)
+        events = self._events(list(light_ids))
+        event = next(events, None)
+        begin = 0
+        while duration is None or begin < duration:
+            end = begin + chunk_duration
+            if duration is not None:
+                end = min(end, duration)
+            timeline = Timeline(begin, end)
+            while event is not None and event[0] < end:
+                t, event_end, event_light_ids, state = event
+                if duration is None or event_end <= duration:
+                    timeline.append(t, event_light_ids, state)
+                event = next(events, None)
+            yield timeline
+            begin = end
+
+    def compile(self, light_ids=None, duration=60):
+        """Compile the scene into one timeline.
+
+        :param list light_ids: The IDs of the lights, by default the
+          reachable lights.
+        :param float duration: The duration of the scene in seconds.
+
+        :return: :class:`lively_lights.timeline.Timeline`
+        """
+        return next(self.timelines(light_ids, chunk_duration=duration,
+                                   duration=duration))
+
+    def play(self, duration=None, chunk_duration=60):
+        """Like :meth:`lively_lights.scenes.Scene.start`, but compile the
+        scene ahead in chunks of `chunk_duration` seconds and play the
+        timelines.
+        """
+        if not duration:
+            duration = self.duration or None
+        player = TimelinePlayer(self.bridge, self.reachable_lights,
+                                self.clock)
+        begin = self.clock.now()
+        try:
+            player.play(self.timelines(chunk_duration=chunk_duration,
+                                       duration=duration), begin,
+                        self._stop_event)
+        finally:
+            self._stop_event.clear()
+        self.drift = player.drift
+        self.max_drift = player.max_drift
+        self.actual_duration = self.clock.now() - begin
+
+    def _run_scheduler(self, end=None):
+        """Run the scheduled callbacks until the clock time `end`. If the
+        scheduler runs in a background thread (shared by several scenes)
+        only wait."""
+        if self.scheduler.running:
+            if end is None:
+                # Endless: the callbacks run as long as the scheduler.
+                while self.scheduler.running and \
+                        not self.clock.wait_event(self._stop_event, 1):
+                    pass
+            else:
+                self.clock.sleep_until(end, self._stop_event)
+        else:
+            self.scheduler.run(until=end, stop=self._stop_event)
+
+    def _wait_until(self, deadline):
+        """Wait for the absolute deadline of the next step and record the
+        drift.
+
+        :return: False if the scene has been stopped.
+        """
+        drift = self.clock.sleep_until(deadline, self._stop_event)
+        if self._stop_event.is_set():
+            return False
+        self.drift = drift
+        self.max_drift = max(self.max_drift or 0, drift)
+        return True
+
+    def _conditions(self):
+        """The condition engine of the reachable lights or None if there
+        are no conditions."""
+        conditions = getattr(self.reachable_lights, 'conditions', None)
+        if isinstance(conditions, ConditionEngine) and conditions.conditions:
+            return conditions
+        return None
+
+    def _paused(self):
+        conditions = self._conditions()
+        return conditions is not None and conditions.paused
+
+    def _pause(self, end=None):
+        """Sleep while a condition (e. g. the night) pauses the scene, but
+        not beyond the clock time `end`. No requests are sent meanwhile and
+        the scene resumes right at the transition.
+
+        :return: The seconds paused.
+        """
+        conditions = self._conditions()
+        if conditions is None or not conditions.paused:
+            return 0
+        begin = self.clock.now()
+        timeout = None if end is None else max(end - begin, 0)
+        conditions.wait_resumed(timeout, self._stop_event)
+        return self.clock.now() - begin
+
+    def stop(self):
+        """Stop the scene running in another thread. The scene returns from
+        :meth:`lively_lights.scenes.Scene.start` after the current step."""
+        self._stop_event.set()
+        self.scheduler.wakeup()
+        conditions = self._conditions()
+        if conditions is not None:
+            conditions.wakeup()
+
     def start(self, duration=None):
         if duration:
             _duration = duration
@@ -278,9 +514,14 @@ class Scene(object):
             _duration = self.duration
         else:
             _duration = None
-        begin = time.time()
-        self._run(duration=_duration)
-        end = time.time()
+        self.drift = None
+        self.max_drift = None
+        begin = self.clock.now()
+        try:
+            self._run(duration=_duration)
+        finally:
+            self._stop_event.clear()
+        end = self.clock.now()
         self.actual_duration = end - begin
 
     def scene_reporter(self, verbosity_level):
@@ -309,75 +550,135 @@ class SceneBreath(Scene):
         },
     }
 
+    batch_size = 64
+    """Breaths drawn per call of the random generator."""
+
     def _set_defaults(self):
-        self._threads = {}
+        self._timers = {}
         self._time_to_end = None
+        self._batch = []
+        self._batch_ranges = None
 
         if not self.has_property('brightness_range'):
             self.brightness_range = (
-                random.brightness(max=99),
-                random.brightness(min=100),
+                self.random.brightness(max=99),
+                self.random.brightness(min=100),
             )
 
         if not self.has_property('hue_range'):
-            self.hue_range = (random.hue(max=32766), random.hue(min=32767))
+            self.hue_range = (self.random.hue(max=32766),
+                              self.random.hue(min=32767))
 
         if not self.has_property('time_range'):
             self.time_range = (
-                random.time(min=1, max=4, decimal_places=1),
-                random.time(min=4, max=8, decimal_places=1),
+                self.random.time(min=1, max=4, decimal_places=1),
+                self.random.time(min=4, max=8, decimal_places=1),
             )
 
     def _set_light(self, light_id):
+        """Send the next breath to one light and schedule the following
+        one."""
+        del self._timers[light_id]
+        if self._paused() or \
+           not self.reachable_lights.is_reachable(light_id):
+            return
+        time_span, hue, bri = self._next_breath()
+        now = self.scheduler.clock()
+        if self._time_to_end and now + time_span > self._time_to_end:
+            return
+        data = {
+            'hue': hue,
+            'transitiontime': types.transition_time(time_span - 0.2),
+            'bri': bri,
+            'sat': 254,
+            'on': True,
+        }
+        set_light_multiple(self.bridge, light_id, data)
+        self._timers[light_id] = self.scheduler.call_at(
+            now + time_span, self._set_light, light_id)
+
+    def _refresh(self):
+        """Schedule lights that are not breathing (again) and repeat every
+        `refresh_interval` seconds."""
+        now = self.scheduler.clock()
+        if self._time_to_end and self._time_to_end <= now:
+            return
+        for light in self.reachable_lights.get_light_objects():
+            if light.light_id not in self._timers:
+                self._timers[light.light_id] = self.scheduler.call_at(
+                    now, self._set_light, light.light_id)
+        self._timers['refresh'] = self.scheduler.call_at(
+            now + self.reachable_lights.refresh_interval, self._refresh)
+
+    def _restart(self):
+        """Breathe again right after a pause."""
+        del self._timers['resume']
+        timer = self._timers.pop('refresh', None)
+        if timer is not None:
+            timer.cancel()
+        self._refresh()
+
+    def _on_pause(self, paused):
+        """Called by the condition engine in its own thread."""
+        if not paused and 'resume' not in self._timers:
+            self._timers['resume'] = self.scheduler.call_at(
+                self.scheduler.clock(), self._restart)
+
+    def _draw(self, count):
+        """Draw `count` breaths: a list of `(time span, hue, brightness)`
+        tuples."""
+        return list(zip(
+            self.random.times(self.time_range[0], self.time_range[1], count,
+                              decimal_places=1),
+            self.random.integers(self.hue_range[0], self.hue_range[1],
+                                 count),
+            self.random.integers(self.brightness_range[0],
+                                 self.brightness_range[1], count),
+        ))
+
+    def _next_breath(self):
+        """The next breath of the lights, taken from a batch. The batch is
+        drawn again if the properties have changed."""
+        ranges = (self.time_range, self.hue_range, self.brightness_range)
+        if not self._batch or ranges != self._batch_ranges:
+            self._batch = self._draw(self.batch_size)
+            self._batch_ranges = ranges
+        return self._batch.pop()
+
+    def _breaths(self, light_id):
+        """The endless breaths of one light, drawn in batches."""
+        t = 0
         while True:
-            if self.reachable_lights.is_reachable(light_id):
-                time_span = random.time(
-                    self.time_range[0],
-                    self.time_range[1],
-                    decimal_places=1
-                )
-
-                if self._time_to_end and \
-                   time.time() + time_span > self._time_to_end:
-                    break
-                data = {
-                    'hue': randint(*self.hue_range),
+            for time_span, hue, bri in self._draw(self.batch_size):
+                yield t, t + time_span, (light_id, ), {
+                    'hue': hue,
                     'transitiontime': types.transition_time(time_span - 0.2),
-                    'bri': randint(*self.brightness_range),
+                    'bri': bri,
                     'sat': 254,
                     'on': True,
                 }
-                set_light_multiple(self.bridge, light_id, data)
-                time.sleep(time_span)
-            else:
-                break
+                t += time_span
 
-    def _run(self, duration=None):
-        refresh_interval = self.reachable_lights.refresh_interval
-        if duration:
-            self._time_to_end = time.time() + duration
-        while True:
-            if self._time_to_end and self._time_to_end <= time.time():
-                break
+    def _events(self, light_ids):
+        return heapq.merge(*[self._breaths(light_id)
+                             for light_id in light_ids],
+                           key=lambda event: event[0])
 
-            for light in self.reachable_lights.get_light_objects():
-                if light.light_id not in self._threads or \
-                   not self._threads[light.light_id].is_alive():
-                    t = threading.Thread(
-                        target=self._set_light,
-                        args=(
-                            light.light_id,
-                        ),
-                    )
-                    t.start()
-                    self._threads[light.light_id] = t
-
-            if self._time_to_end and \
-               time.time() + refresh_interval > self._time_to_end:
-                sleep_time = self._time_to_end - time.time()
-            else:
-                sleep_time = self.reachable_lights.refresh_interval
-            time.sleep(sleep_time)
+    def _run(self, duration=None):
+        begin = self.scheduler.clock()
+        self._time_to_end = begin + duration if duration else None
+        self._timers['refresh'] = self.scheduler.call_at(begin, self._refresh)
+        conditions = self._conditions()
+        if conditions is not None:
+            conditions.subscribe(self._on_pause)
+        try:
+            self._run_scheduler(self._time_to_end)
+        finally:
+            if conditions is not None:
+                conditions.unsubscribe(self._on_pause)
+            for timer in list(self._timers.values()):
+                timer.cancel()
+            self._timers.clear()
 
 
 class ScenePendulum(Scene):
@@ -407,67 +708,103 @@ class ScenePendulum(Scene):
 
     def _set_defaults(self):
         if not self.has_property('color1'):
-            self.color1 = random.hue()
+            self.color1 = self.random.hue()
 
         if not self.has_property('color2'):
-            self.color2 = random.hue()
+            self.color2 = self.random.hue()
 
         if not self.has_property('lights1') or \
            not self.has_property('lights2'):
             self.lights1, self.lights2 = self._distribute_lights()
 
         if not self.has_property('sleep_time'):
-            self.sleep_time = random.time(4, 8)
+            self.sleep_time = self.random.time(4, 8)
 
         if not self.has_property('transition_time'):
-            self.transition_time = random.time(1, 3, decimal_places=1)
+            self.transition_time = self.random.time(1, 3, decimal_places=1)
 
-        if self.transition_time > self.sleep_time:
+    def _check(self, values):
+        if values['transition_time'] > values['sleep_time']:
             raise ValueError('transition_time should be less than sleep_time')
 
     def _distribute_lights(self):
         light_ids = self.reachable_lights.get_light_ids()
-        random.shuffle(light_ids)
+        self.random.shuffle(light_ids)
         count = len(light_ids)
         half = int(count / 2)
         return (light_ids[0:half], light_ids[half:])
 
     def _set_light_group(self, light_ids, hue):
-        for light_id in light_ids:
-            data = {
+        data = {
+            'hue': hue,
+            'bri': 254,
+            'transitiontime': types.transition_time(self.transition_time),
+            'sat': 254,
+            'on': True,
+        }
+        set_lights_multiple(self.bridge, light_ids, data)
+
+    def _prepare(self, duration=None):
+        if duration and duration <= self.sleep_time:
+            self.sleep_time = duration / 2
+            self.transition_time = self.sleep_time * 0.2
+
+    def _events(self, light_ids):
+        lights1 = tuple(light_id for light_id in self.lights1
+                        if light_id in light_ids)
+        lights2 = tuple(light_id for light_id in self.lights2
+                        if light_id in light_ids)
+        if not lights1 and not lights2:
+            return
+        states = []
+        for hue in (self.color1, self.color2):
+            states.append({
                 'hue': hue,
                 'bri': 254,
                 'transitiontime': types.transition_time(self.transition_time),
                 'sat': 254,
                 'on': True,
-            }
-            set_light_multiple(self.bridge, light_id, data)
+            })
+        step = 0
+        while True:
+            t = step * self.sleep_time
+            state1, state2 = states if step % 2 == 0 else states[::-1]
+            if lights1:
+                yield t, t, lights1, state1
+            if lights2:
+                yield t, t, lights2, state2
+            step += 1
 
     def _run(self, duration=None):
-        begin = time.time()
-
-        if duration and duration <= self.sleep_time:
-            self.sleep_time = duration / 2
-            self.transition_time = self.sleep_time * 0.2
-
+        begin = self.clock.now()
+        end = begin + duration if duration else None
+        self._prepare(duration)
+
+        # The steps are timed from the anchor, which moves on by the paused
+        # time, the end of the scene does not.
+        anchor = begin
+        step = 0
         while True:
-            self._set_light_group(self.lights1, self.color1)
-            self._set_light_group(self.lights2, self.color2)
-            if duration and \
-               time.time() - begin + self.sleep_time >= duration:
+            anchor += self._pause(end)
+            if self._stop_event.is_set():
+                return
+            if end is not None and self.clock.now() >= end:
                 break
-            time.sleep(self.sleep_time)
-            self._set_light_group(self.lights1, self.color2)
-            self._set_light_group(self.lights2, self.color1)
-            if duration and \
-               time.time() - begin + self.sleep_time >= duration:
+            if step % 2 == 0:
+                self._set_light_group(self.lights1, self.color1)
+                self._set_light_group(self.lights2, self.color2)
+            else:
+                self._set_light_group(self.lights1, self.color2)
+                self._set_light_group(self.lights2, self.color1)
+            step += 1
+            deadline = anchor + step * self.sleep_time
+            if duration and deadline - begin >= duration:
                 break
-            time.sleep(self.sleep_time)
+            if not self._wait_until(deadline):
+                return
 
         if duration:
-            time_left = duration - (time.time() - begin)
-            if time_left > 0:
-                time.sleep(time_left)
+            self._wait_until(end)
 
 
 class SceneSequence(Scene):
@@ -491,54 +828,81 @@ class SceneSequence(Scene):
 
     def _set_defaults(self):
         if not self.has_property('brightness'):
-            self.brightness = random.brightness(min=100)
+            self.brightness = self.random.brightness(min=100)
 
         if not self.has_property('hue_sequence'):
             self.hue_sequence = (
-                random.hue(),
-                random.hue(),
-                random.hue(),
-                random.hue(),
+                self.random.hue(),
+                self.random.hue(),
+                self.random.hue(),
+                self.random.hue(),
             )
 
         if not self.has_property('sleep_time'):
-            self.sleep_time = random.time(4, 8)
+            self.sleep_time = self.random.time(4, 8)
 
         if not self.has_property('transition_time'):
-            self.transition_time = random.time(1, 3, decimal_places=1)
+            self.transition_time = self.random.time(1, 3, decimal_places=1)
 
-        if self.transition_time > self.sleep_time:
+    def _check(self, values):
+        if values['transition_time'] > values['sleep_time']:
             raise ValueError('transition_time should be less than sleep_time')
 
-    def _run(self, duration=None):
-        begin = time.time()
-
+    def _prepare(self, duration=None):
         if duration and duration <= self.sleep_time:
             self.sleep_time = duration / 2
             self.transition_time = self.sleep_time * 0.2
-        try:
-            while True:
-                for hue in self.hue_sequence:
-                    for light in self.reachable_lights.get_light_objects():
-                        data = {
-                            'hue': hue,
-                            'bri': self.brightness,
-                            'transitiontime': types.transition_time(
-                                self.transition_time
-                            ),
-                            'sat': 255,
-                            'on': True,
-                        }
-                        set_light_multiple(self.bridge, light.light_id, data)
-
-                        if duration and \
-                           time.time() - begin + self.sleep_time >= duration:
-                            raise StopIteration
-
-                    time.sleep(self.sleep_time)
-
-        except StopIteration:
-            if duration:
-                time_left = duration - (time.time() - begin)
-                if time_left > 0:
-                    time.sleep(time_left)
+
+    def _events(self, light_ids):
+        light_ids = tuple(light_ids)
+        if not light_ids:
+            return
+        states = [{
+            'hue': hue,
+            'bri': self.brightness,
+            'transitiontime': types.transition_time(self.transition_time),
+            'sat': 255,
+            'on': True,
+        } for hue in self.hue_sequence]
+        step = 0
+        while True:
+            t = step * self.sleep_time
+            yield t, t, light_ids, states[step % len(states)]
+            step += 1
+
+    def _run(self, duration=None):
+        begin = self.clock.now()
+        end = begin + duration if duration else None
+        self._prepare(duration)
+
+        anchor = begin
+        step = 0
+        while True:
+            anchor += self._pause(end)
+            if self._stop_event.is_set():
+                return
+            if end is not None and self.clock.now() >= end:
+                break
+            data = {
+                'hue': self.hue_sequence[step % len(self.hue_sequence)],
+                'bri': self.brightness,
+                'transitiontime': types.transition_time(
+                    self.transition_time
+                ),
+                'sat': 255,
+                'on': True,
+            }
+            set_lights_multiple(
+                self.bridge,
+                self.reachable_lights.get_light_ids(),
+                data,
+            )
+            step += 1
+            deadline = anchor + step * self.sleep_time
+            if duration and deadline - begin >= duration:
+                break
+            if not self._wait_until(deadline):
+                return
+
+        if duration:
+            self._wait_until(end)
@@ -0,0 +1,240 @@
+"""Run the timed callbacks of the scenes in one thread.
+
+A scene does not sleep in a thread per light. It schedules a callback for
+the next deadline of each light instead. All deadlines are kept in a heap,
+so the number of threads does not depend on the number of lights.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Clock(object):
+    """A monotonic clock for the scenes. It does not jump like
+    :func:`time.time` if the system time is adjusted (NTP).
+
+    Scenes wait for absolute deadlines (`begin + n * sleep_time`) instead
+    of sleeping a fixed time after each step, so the time it takes to send
+    the commands does not add up.
+
+    :param time_function: A function returning monotonic seconds.
+    :param sleep_function: A function sleeping n seconds.
+    """
+
+    def __init__(self, time_function=time.monotonic,
+                 sleep_function=time.sleep):
+        self._time = time_function
+        self._sleep = sleep_function
+
+    def now(self):
+        """The current clock time in seconds."""
+        return self._time()
+
+    def __call__(self):
+        return self._time()
+
+    def sleep(self, seconds):
+        """Sleep n seconds."""
+        if seconds > 0:
+            self._sleep(seconds)
+
+    def wait(self, condition, timeout=None):
+        """Wait for a notification of a condition variable, but not longer
+        than `timeout` seconds. The condition must be held."""
+        condition.wait(timeout)
+
+    def wait_event(self, event, timeout):
+        """Wait until the :class:`threading.Event` is set, but not longer
+        than `timeout` seconds. A clock with its own sleep function sleeps
+        and checks the event afterwards.
+
+        :return: True if the event is set.
+        """
+        if event.is_set():
+            return True
+        if self._sleep is time.sleep:
+            return event.wait(timeout)
+        self.sleep(timeout)
+        return event.is_set()
+
+    def sleep_until(self, deadline, stop=None):
+        """Sleep until the clock time `deadline`.
+
+        :param stop: Return early if this :class:`threading.Event` is set.
+
+        :return: The drift: how many seconds the deadline was missed.
+        """
+        while True:
+            remaining = deadline - self._time()
+            if remaining <= 0:
+                return -remaining
+            if stop is None:
+                self._sleep(remaining)
+            elif self.wait_event(stop, remaining):
+                return 0
+
+
+default_clock = Clock()
+"""The clock shared by all scenes."""
+
+
+class Timer(object):
+    """A scheduled callback returned by
+    :meth:`lively_lights.scheduler.Scheduler.call_at`.
+
+    :param float deadline: The clock time to run the callback at.
+    """
+
+    def __init__(self, deadline, callback, args):
+        self.deadline = deadline
+        """The clock time to run the callback at."""
+
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+        """True if the callback should not be run anymore."""
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Scheduler(object):
+    """An event loop running callbacks at their deadlines, earliest first.
+
+    The loop runs either in the calling thread
+    (:meth:`lively_lights.scheduler.Scheduler.run`) or in one background
+    thread (:meth:`lively_lights.scheduler.Scheduler.start`) shared by
+    several scenes. Callbacks run one after another, so they must not block
+    for long.
+
+    :param clock: The clock, by default the shared
+      :data:`lively_lights.scheduler.default_clock`.
+    :type clock: lively_lights.scheduler.Clock
+    """
+
+    def __init__(self, clock=None):
+        if clock is None:
+            clock = default_clock
+        self.clock = clock
+        """:class:`lively_lights.scheduler.Clock`"""
+
+        self._heap = []
+        """`(deadline, sequence number, timer)` tuples. The sequence number
+        keeps the order of timers with the same deadline."""
+
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def __len__(self):
+        with self._condition:
+            return sum(1 for _, _, timer in self._heap
+                       if not timer.cancelled)
+
+    @property
+    def running(self):
+        """True if the loop runs in a background thread."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def call_at(self, deadline, callback, *args):
+        """Run `callback(*args)` at the clock time `deadline`.
+
+        :return: A :class:`lively_lights.scheduler.Timer`.
+        """
+        timer = Timer(deadline, callback, args)
+        with self._condition:
+            heapq.heappush(self._heap, (deadline, next(self._counter), timer))
+            self._condition.notify_all()
+        return timer
+
+    def call_later(self, delay, callback, *args):
+        """Run `callback(*args)` in `delay` seconds.
+
+        :return: A :class:`lively_lights.scheduler.Timer`.
+        """
+        return self.call_at(self.clock() + delay, callback, *args)
+
+    def _next_timer(self, until, stop=None):
+        """Wait for the next due timer. Must be called with the condition
+        held.
+
+        :return: The timer or None if the loop has to end.
+        """
+        while not self._stopped:
+            if stop is not None and stop.is_set():
+                return None
+            while self._heap and self._heap[0][2].cancelled:
+                heapq.heappop(self._heap)
+            now = self.clock()
+            if until is not None and now >= until:
+                return None
+            if self._heap and self._heap[0][0] <= now:
+                return heapq.heappop(self._heap)[2]
+            if not self._heap and until is None and not self.running:
+                return None
+            timeout = None
+            if self._heap:
+                timeout = self._heap[0][0] - now
+            if until is not None:
+                timeout = until - now if timeout is None \
+                    else min(timeout, until - now)
+            self.clock.wait(self._condition, timeout)
+        return None
+
+    def run(self, until=None, stop=None):
+        """Run the due callbacks in the calling thread.
+
+        :param float until: Return at this clock time. Without a time the
+          loop returns if no timers are left.
+
+        :param stop: Return as soon as this :class:`threading.Event` is set
+          (see :meth:`lively_lights.scheduler.Scheduler.wakeup`).
+        """
+        while True:
+            with self._condition:
+                timer = self._next_timer(until, stop)
+            if timer is None:
+                return
+            try:
+                timer.callback(*timer.args)
+            except Exception:
+                logger.exception('The scheduled callback {} failed.'.format(
+                    timer.callback))
+
+    def _run_forever(self):
+        self.run()
+        with self._condition:
+            self._stopped = False
+
+    def start(self):
+        """Run the loop in a background thread until
+        :meth:`lively_lights.scheduler.Scheduler.stop` is called."""
+        with self._condition:
+            if self.running:
+                return
+            self._thread = threading.Thread(target=self._run_forever,
+                                            name='lively-lights-scheduler')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def wakeup(self):
+        """Wake up the waiting loop, e. g. to let it check its stop
+        event."""
+        with self._condition:
+            self._condition.notify_all()
+
+    def stop(self):
+        """End the background thread."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if self._thread is not None and \
+           self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
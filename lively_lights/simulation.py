@@ -0,0 +1,265 @@
+"""Dry run scenes and launcher playlists on a virtual clock.
+
+Nothing is sent to a bridge: the commands of the scenes are recorded in a
+command log. Sleeping on the virtual clock takes no time, so hours of
+scenes are simulated in seconds.
+
+.. code-block:: shell
+
+    lively-lights.py --dry-run 43200 launch --endless playlist.yml
+"""
+
+from lively_lights import scenes
+from lively_lights.environment import ReachableLights
+from lively_lights.scheduler import Clock
+import collections
+import json
+
+Command = collections.namedtuple('Command', 'time kind light_ids data')
+"""A recorded command. `kind` is `lights` for a light command and `groups`
+for a group action (the same state for several lights)."""
+
+
+class SimulationEnd(Exception):
+    """Raised by :class:`lively_lights.simulation.VirtualClock` if the
+    simulation reaches its limit."""
+
+
+class VirtualClock(Clock):
+    """A clock that jumps forward instead of sleeping.
+
+    :param float start: The start time in seconds.
+
+    :param float limit: Raise
+      :class:`lively_lights.simulation.SimulationEnd` if the time reaches
+      the limit.
+    """
+
+    def __init__(self, start=0, limit=None):
+        Clock.__init__(self, self._time, self._advance)
+        self.time = start
+        """The current virtual time in seconds."""
+
+        self.limit = limit
+        """The end of the simulation in seconds."""
+
+    def _time(self):
+        return self.time
+
+    def _advance(self, seconds):
+        self.time += seconds
+        if self.limit is not None and self.time >= self.limit:
+            self.time = self.limit
+            raise SimulationEnd()
+
+    def wait(self, condition, timeout=None):
+        if timeout is None:
+            # Nobody else can notify the condition in a simulation.
+            raise SimulationEnd()
+        self._advance(timeout)
+
+
+class SimulatedLight(object):
+
+    def __init__(self, light_id):
+        self.light_id = light_id
+        self.name = 'Light {}'.format(light_id)
+
+
+class RecordingDispatcher(object):
+    """Record the commands instead of sending them (same interface as
+    :class:`lively_lights.dispatcher.Dispatcher`).
+
+    :param clock: The clock to time stamp the commands with.
+    :type clock: lively_lights.scheduler.Clock
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.commands = []
+        """A list of :data:`lively_lights.simulation.Command` tuples."""
+
+    def _record(self, kind, light_ids, data):
+        self.commands.append(Command(self.clock.now(), kind,
+                                     tuple(light_ids), dict(data)))
+
+    def set_light(self, light_id, data):
+        self._record('lights', (light_id, ), data)
+
+    def set_group(self, group_id, data):
+        self._record('groups', (), data)
+
+    def set_lights(self, light_ids, data):
+        light_ids = list(light_ids)
+        if len(light_ids) == 1:
+            self._record('lights', light_ids, data)
+        elif light_ids:
+            self._record('groups', light_ids, data)
+
+    def flush(self, timeout=None):
+        return True
+
+
+class RecordingBridge(object):
+    """A stand-in for :class:`lively_lights.phue.Bridge` with always
+    reachable lights. The commands are recorded by its dispatcher.
+
+    :param clock: The virtual clock.
+    :type clock: lively_lights.simulation.VirtualClock
+
+    :param list light_ids: The IDs of the simulated lights.
+    """
+
+    def __init__(self, clock, light_ids=range(1, 11)):
+        self.lights = [SimulatedLight(light_id) for light_id in light_ids]
+        self._lights = {light.light_id: light for light in self.lights}
+        self.dispatcher = RecordingDispatcher(clock)
+        """:class:`lively_lights.simulation.RecordingDispatcher`"""
+
+    def __getitem__(self, light_id):
+        return self._lights[light_id]
+
+    def get_light(self, light_id=None, parameter=None):
+        return {str(light_id): {'state': {'reachable': True}}
+                for light_id in self._lights}
+
+    @property
+    def commands(self):
+        """The recorded commands."""
+        return self.dispatcher.commands
+
+
+def simulate(run, light_ids=range(1, 11), limit=None):
+    """Run scenes on a virtual clock.
+
+    .. code-block:: python
+
+        def run(bridge, reachable_lights, clock):
+            scene = SceneBreath(bridge, reachable_lights, clock=clock)
+            scene.start(3600)
+
+        commands = simulate(run)
+
+    :param run: A function accepting the arguments `bridge`,
+      `reachable_lights` and `clock`.
+
+    :param list light_ids: The IDs of the simulated lights.
+
+    :param float limit: Stop the simulation after n virtual seconds.
+
+    :return: A list of :data:`lively_lights.simulation.Command` tuples.
+    """
+    clock = VirtualClock(limit=limit)
+    bridge = RecordingBridge(clock, light_ids)
+    reachable_lights = ReachableLights(bridge, None)
+    try:
+        run(bridge, reachable_lights, clock)
+    except SimulationEnd:
+        pass
+    return bridge.commands
+
+
+def rates(commands):
+    """Count the commands per second.
+
+    :return: A list of `(second, light_commands, group_commands)` tuples,
+      one for every second from the first to the last command.
+    """
+    if not commands:
+        return []
+    counters = collections.defaultdict(lambda: [0, 0])
+    for command in commands:
+        index = 0 if command.kind == 'lights' else 1
+        counters[int(command.time)][index] += 1
+    last = int(commands[-1].time)
+    return [(second, counters[second][0], counters[second][1])
+            for second in range(last + 1)]
+
+
+def report(commands, light_rate=10, group_rate=1):
+    """Summarize a command log.
+
+    :param float light_rate: The light commands per second the bridge can
+      handle.
+    :param float group_rate: The group commands per second the bridge can
+      handle.
+
+    :return: A dictionary.
+    """
+    per_second = rates(commands)
+    seconds = len(per_second) or 1
+    light_counts = sorted(lights for _, lights, _ in per_second) or [0]
+    group_counts = sorted(groups for _, _, groups in per_second) or [0]
+    return {
+        'commands': len(commands),
+        'light_commands': sum(light_counts),
+        'group_commands': sum(group_counts),
+        'seconds': len(per_second),
+        'light_commands_per_second': sum(light_counts) / seconds,
+        'group_commands_per_second': sum(group_counts) / seconds,
+        'max_light_commands_per_second': light_counts[-1],
+        'max_group_commands_per_second': group_counts[-1],
+        'seconds_over_budget': sum(
+            1 for _, lights, groups in per_second
+            if lights > light_rate or groups > group_rate),
+    }
+
+
+def format_report(summary):
+    out = []
+    for key, value in summary.items():
+        if isinstance(value, float):
+            value = '{:.2f}'.format(value)
+        out.append('{}: {}'.format(key, value))
+    return '\n'.join(out)
+
+
+def write_log(commands, path):
+    """Write one tab separated line per command: time, kind, light IDs and
+    the JSON encoded state."""
+    with open(path, 'w') as log:
+        for command in commands:
+            log.write('{:.3f}\t{}\t{}\t{}\n'.format(
+                command.time,
+                command.kind,
+                ','.join(str(light_id) for light_id in command.light_ids),
+                json.dumps(command.data, sort_keys=True),
+            ))
+
+
+def main(args):
+    """Dry run the `scene` or `launch` subcommand from the command line
+    interface.
+
+    :param args: The parsed arguments.
+    """
+    if args.subcommand not in ('scene', 'launch'):
+        raise ValueError('Only the subcommands “scene” and “launch” can be '
+                         'dry run.')
+
+    def run(bridge, reachable_lights, clock):
+        if args.subcommand == 'scene':
+            Scene = scenes.Launcher._get_scene_class(args.scene)
+            scene = Scene(bridge, reachable_lights, clock=clock)
+            scene.get_properties_from_args(args)
+            scene.scene_reporter(args.verbosity_level)
+            scene.start(duration=args.duration)
+        else:
+            launcher = scenes.Launcher(
+                bridge,
+                reachable_lights,
+                scene_configs_file=args.yamlfile,
+                verbosity_level=args.verbosity_level,
+                clock=clock,
+            )
+            launcher.launch(
+                randomized=args.randomized,
+                endless=args.endless,
+                duration=args.duration,
+            )
+
+    light_ids = args.lights or range(1, 11)
+    commands = simulate(run, light_ids, limit=args.dry_run)
+    print(format_report(report(commands)))
+    if args.dry_run_log:
+        write_log(commands, args.dry_run_log)
@@ -0,0 +1,300 @@
+"""Store the states of many lights compactly.
+
+A light state kept as a dictionary costs a hash table per light and a
+boxed object per value. A :class:`lively_lights.store.LightStateStore`
+keeps one typed array per field instead (struct of arrays): every light
+gets a slot, the value of a field is the item of the slot in the array of
+the field. A second array per field stores the time the value was set, so
+values can expire. :class:`lively_lights.store.LightState` objects are
+lightweight views of one slot.
+
+So far only the shadow state of the dispatcher
+(:class:`lively_lights.dispatcher.ShadowState`) is kept in a store. The
+snapshot of the :class:`lively_lights.cache.StateCache`, which the getters
+of :class:`lively_lights.phue.Light` read, is still a dictionary per
+light as returned by the bridge.
+
+.. code-block:: python
+
+    store = LightStateStore()
+    store.update(1, {'on': True, 'bri': 254, 'xy': [0.4573, 0.41]})
+    store.get(1, 'bri')  # 254
+    store.view(1).xy  # [0.4573, 0.41]
+"""
+
+from array import array
+import math
+import time
+
+
+FIELDS = ('on', 'bri', 'hue', 'sat', 'xy', 'ct', 'effect', 'alert',
+          'colormode', 'reachable')
+"""The light state fields a store can hold."""
+
+KINDS = {
+    'on': 'bool',
+    'reachable': 'bool',
+    'bri': 'h',
+    'sat': 'h',
+    'ct': 'h',
+    'hue': 'l',
+    'xy': 'xy',
+    'effect': 'symbol',
+    'alert': 'symbol',
+    'colormode': 'symbol',
+}
+"""How the values of a field are stored: `bool`, `symbol` (a string from
+a small set), `xy` (a pair of floats) or the type code of an integer
+array."""
+
+TYPECODES = {'bool': 'b', 'symbol': 'B', 'xy': 'd'}
+
+MAX_SYMBOLS = 256
+"""The number of different strings a symbol field can hold in its array."""
+
+
+class LightStateStore(object):
+    """The states of many lights as struct of arrays.
+
+    Values that do not fit the array of their field (e. g. a float
+    brightness or a fourth color mode) are kept in a dictionary aside, so
+    every value reads back exactly as it was set.
+
+    The store is not thread-safe, the caller has to hold a lock.
+
+    :param tuple fields: The fields to store, a subset of
+      :data:`lively_lights.store.FIELDS`.
+
+    :param clock: A function returning monotonic seconds, used to time
+      stamp the values.
+    """
+
+    def __init__(self, fields=FIELDS, clock=time.monotonic):
+        unknown = set(fields) - set(FIELDS)
+        if unknown:
+            raise ValueError('Unknown light state fields: {}.'.format(
+                ', '.join(sorted(unknown))))
+
+        self.fields = tuple(fields)
+        """The stored fields."""
+
+        self._clock = clock
+        self._slots = {}
+        """The slot of each light ID."""
+        self._light_ids = []
+        self._values = {field: array(TYPECODES.get(KINDS[field],
+                                                   KINDS[field]))
+                        for field in self.fields}
+        self._stamps = {field: array('d') for field in self.fields}
+        """The time each value was set, NaN if the value is unknown."""
+        self._symbols = {field: [] for field in self.fields
+                         if KINDS[field] == 'symbol'}
+        self._codes = {field: {} for field in self._symbols}
+        self._overflow = {}
+        """Values that do not fit their array by `(field, slot)`."""
+
+    def __len__(self):
+        return len(self._light_ids)
+
+    def __contains__(self, light_id):
+        return light_id in self._slots
+
+    def light_ids(self):
+        """The IDs of the lights in the order of their slots."""
+        return list(self._light_ids)
+
+    def slot(self, light_id):
+        """The slot of a light. A new light gets the next free slot."""
+        slot = self._slots.get(light_id)
+        if slot is not None:
+            return slot
+        slot = len(self._light_ids)
+        self._slots[light_id] = slot
+        self._light_ids.append(light_id)
+        for field in self.fields:
+            self._values[field].extend((0, 0) if KINDS[field] == 'xy'
+                                       else (0, ))
+            self._stamps[field].append(math.nan)
+        return slot
+
+    def _encode(self, field, slot, value):
+        """Write a value into the array of its field.
+
+        :return: False if the value does not fit the array.
+        """
+        kind = KINDS[field]
+        column = self._values[field]
+        if kind == 'bool':
+            if type(value) is not bool:
+                return False
+            column[slot] = value
+        elif kind == 'symbol':
+            if type(value) is not str:
+                return False
+            codes = self._codes[field]
+            if value not in codes:
+                if len(codes) >= MAX_SYMBOLS:
+                    return False
+                codes[value] = len(self._symbols[field])
+                self._symbols[field].append(value)
+            column[slot] = codes[value]
+        elif kind == 'xy':
+            if type(value) is not list or len(value) != 2 or \
+               not all(type(item) in (int, float) for item in value):
+                return False
+            column[2 * slot] = value[0]
+            column[2 * slot + 1] = value[1]
+        else:
+            if type(value) is not int:
+                return False
+            try:
+                column[slot] = value
+            except OverflowError:
+                return False
+        return True
+
+    def _decode(self, field, slot):
+        if self._overflow and (field, slot) in self._overflow:
+            return self._overflow[(field, slot)]
+        kind = KINDS[field]
+        column = self._values[field]
+        if kind == 'bool':
+            return bool(column[slot])
+        if kind == 'symbol':
+            return self._symbols[field][column[slot]]
+        if kind == 'xy':
+            return [column[2 * slot], column[2 * slot + 1]]
+        return column[slot]
+
+    def set(self, light_id, field, value, stamp=None):
+        """Set the value of a field.
+
+        :param stamp: The time the value was set, by default now.
+        """
+        slot = self.slot(light_id)
+        if self._encode(field, slot, value):
+            self._overflow.pop((field, slot), None)
+        else:
+            self._overflow[(field, slot)] = value
+        self._stamps[field][slot] = self._clock() if stamp is None \
+            else stamp
+
+    def update(self, light_id, state, stamp=None):
+        """Set the stored fields of a light state dictionary, e. g. the
+        `state` of a light returned by the bridge. Other fields are
+        ignored."""
+        if stamp is None:
+            stamp = self._clock()
+        for field, value in state.items():
+            if field in self._values:
+                self.set(light_id, field, value, stamp)
+
+    def _get(self, slot, field, default=None, max_age=None):
+        stamp = self._stamps[field][slot]
+        if math.isnan(stamp) or (max_age is not None and
+                                 self._clock() - stamp >= max_age):
+            return default
+        return self._decode(field, slot)
+
+    def get(self, light_id, field, default=None, max_age=None):
+        """The value of a field.
+
+        :param default: Returned if the value is unknown or expired.
+
+        :param float max_age: Values set more than n seconds ago are
+          expired.
+        """
+        slot = self._slots.get(light_id)
+        if slot is None:
+            return default
+        return self._get(slot, field, default, max_age)
+
+    def state(self, light_id):
+        """The known fields of a light as a dictionary."""
+        slot = self._slots.get(light_id)
+        if slot is None:
+            return {}
+        out = {}
+        for field in self.fields:
+            if not math.isnan(self._stamps[field][slot]):
+                out[field] = self._decode(field, slot)
+        return out
+
+    def view(self, light_id):
+        """:return: :class:`lively_lights.store.LightState`"""
+        return LightState(self, light_id)
+
+    def discard(self, light_ids=None, fields=None):
+        """Make fields unknown. The slots are kept.
+
+        :param list light_ids: The IDs of the lights, None for all lights.
+        :param list fields: The fields, None for all fields. Fields that
+          are not stored are ignored.
+        """
+        if light_ids is None:
+            slots = range(len(self._light_ids))
+        else:
+            slots = [self._slots[light_id] for light_id in light_ids
+                     if light_id in self._slots]
+        if fields is None:
+            fields = self.fields
+        else:
+            fields = [field for field in fields if field in self._stamps]
+        for field in fields:
+            stamps = self._stamps[field]
+            for slot in slots:
+                stamps[slot] = math.nan
+                if self._overflow:
+                    self._overflow.pop((field, slot), None)
+
+    def stats(self):
+        """Return store statistics.
+
+        .. code-block:: python
+
+            {
+                'lights': 50,
+                'bytes': 4000,
+                'overflow': 0,
+            }
+        """
+        size = 0
+        for column in list(self._values.values()) + \
+                list(self._stamps.values()):
+            size += column.buffer_info()[1] * column.itemsize
+        return {
+            'lights': len(self._light_ids),
+            'bytes': size,
+            'overflow': len(self._overflow),
+        }
+
+
+class LightState(object):
+    """A view of the state of one light in a
+    :class:`lively_lights.store.LightStateStore`. The fields are read and
+    set as attributes, unknown fields read as None.
+
+    :param store: :class:`lively_lights.store.LightStateStore`
+    :param light_id: The ID of the light.
+    """
+
+    __slots__ = ('store', 'light_id', 'slot')
+
+    def __init__(self, store, light_id):
+        object.__setattr__(self, 'store', store)
+        object.__setattr__(self, 'light_id', light_id)
+        object.__setattr__(self, 'slot', store.slot(light_id))
+
+    def __getattr__(self, name):
+        if name in LightState.__slots__ or name not in self.store.fields:
+            raise AttributeError(name)
+        return self.store._get(self.slot, name)
+
+    def __setattr__(self, name, value):
+        if name not in self.store.fields:
+            raise AttributeError(name)
+        self.store.set(self.light_id, name, value)
+
+    def __repr__(self):
+        return '<LightState {} {}>'.format(self.light_id,
+                                           self.store.state(self.light_id))
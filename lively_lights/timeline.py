@@ -0,0 +1,153 @@
+"""Precomputed scene timelines.
+
+A scene can be compiled into a :class:`lively_lights.timeline.Timeline` of
+`(t, light_ids, state)` events ahead of time (see
+:meth:`lively_lights.scenes.Scene.compile`). The
+:class:`lively_lights.timeline.TimelinePlayer` then only waits for the
+deadlines and hands the states to the dispatcher.
+"""
+
+from lively_lights._utils import set_light_multiple, set_lights_multiple
+from lively_lights.scheduler import default_clock
+import array
+
+FIELDS = ('on', 'bri', 'hue', 'sat', 'transitiontime')
+"""The light state fields a timeline can store."""
+
+
+class Timeline(object):
+    """A compact list of light state events sorted by time.
+
+    The events are stored column by column in :mod:`array` arrays (one
+    number per field, `-1` if the field is not set). The light IDs of an
+    event are stored once per distinct set of lights.
+
+    .. code-block:: python
+
+        timeline.append(0.0, (1, 2), {'hue': 4000, 'on': True})
+        for t, light_ids, state in timeline:
+            ...
+
+    :param float begin: The time the timeline starts at, relative to the
+      start of the scene.
+
+    :param float end: The time the timeline ends at.
+    """
+
+    def __init__(self, begin=0, end=None):
+        self.begin = begin
+        """The start of the timeline in seconds."""
+
+        self.end = end
+        """The end of the timeline in seconds."""
+
+        self._times = array.array('d')
+        self._targets = array.array('I')
+        self._fields = {field: array.array('i') for field in FIELDS}
+        self._target_ids = []
+        """The distinct tuples of light IDs."""
+        self._target_index = {}
+
+    def __len__(self):
+        return len(self._times)
+
+    def __iter__(self):
+        columns = [(field, self._fields[field]) for field in FIELDS]
+        for index, t in enumerate(self._times):
+            state = {}
+            for field, column in columns:
+                value = column[index]
+                if value != -1:
+                    state[field] = bool(value) if field == 'on' else value
+            yield t, self._target_ids[self._targets[index]], state
+
+    def append(self, t, light_ids, state):
+        """Add an event. The events must be appended in chronological
+        order.
+
+        :param float t: Seconds since the start of the scene.
+        :param light_ids: The IDs of the lights.
+        :param dict state: The light state, only the :data:`FIELDS`.
+        """
+        if self._times and t < self._times[-1]:
+            raise ValueError('The events must be in chronological order.')
+        unknown = set(state) - set(FIELDS)
+        if unknown:
+            raise ValueError('Unsupported fields: {}'.format(
+                ', '.join(sorted(unknown))))
+        light_ids = tuple(light_ids)
+        if light_ids not in self._target_index:
+            self._target_index[light_ids] = len(self._target_ids)
+            self._target_ids.append(light_ids)
+        self._times.append(t)
+        self._targets.append(self._target_index[light_ids])
+        for field in FIELDS:
+            self._fields[field].append(int(state.get(field, -1)))
+
+
+class TimelinePlayer(object):
+    """Play timelines: wait for the time of each event and dispatch the
+    state.
+
+    :param bridge: The bridge object.
+    :type bridge: lively_lights.phue.Bridge
+
+    :param reachable_lights: Skip lights that are not reachable at play
+      time.
+    :type reachable_lights: lively_lights.environment.ReachableLights
+
+    :param clock: The clock, by default the shared
+      :data:`lively_lights.scheduler.default_clock`.
+    :type clock: lively_lights.scheduler.Clock
+    """
+
+    def __init__(self, bridge, reachable_lights=None, clock=None):
+        self.bridge = bridge
+        self.reachable_lights = reachable_lights
+        if clock is None:
+            clock = default_clock
+        self.clock = clock
+
+        self.drift = None
+        """How many seconds the last event was late."""
+
+        self.max_drift = None
+        """The largest drift of all events in seconds."""
+
+    def _dispatch(self, light_ids, state):
+        if self.reachable_lights is not None:
+            light_ids = [light_id for light_id in light_ids
+                         if self.reachable_lights.is_reachable(light_id)]
+        if len(light_ids) == 1:
+            set_light_multiple(self.bridge, light_ids[0], state)
+        elif light_ids:
+            set_lights_multiple(self.bridge, light_ids, state)
+
+    def play(self, timelines, begin=None, stop=None):
+        """Play one timeline or an iterable of consecutive timelines.
+
+        :param timelines: A :class:`lively_lights.timeline.Timeline` or an
+          iterable of them (e. g. the generator
+          :meth:`lively_lights.scenes.Scene.timelines`).
+
+        :param float begin: The clock time the scene started at, by default
+          now.
+
+        :param stop: Return early if this :class:`threading.Event` is set.
+        """
+        if isinstance(timelines, Timeline):
+            timelines = (timelines, )
+        if begin is None:
+            begin = self.clock.now()
+        for timeline in timelines:
+            for t, light_ids, state in timeline:
+                drift = self.clock.sleep_until(begin + t, stop)
+                if stop is not None and stop.is_set():
+                    return
+                self.drift = drift
+                self.max_drift = max(self.max_drift or 0, drift)
+                self._dispatch(light_ids, state)
+            if timeline.end is not None:
+                self.clock.sleep_until(begin + timeline.end, stop)
+            if stop is not None and stop.is_set():
+                return
@@ -66,7 +66,16 @@ def hue_list(value):
 
 
 def light_id(value):
-    """Light IDS are integer values starting with 1."""
+    """Light IDS are integer values starting with 1. Lights of a
+    :class:`lively_lights.multibridge.MultiBridge` are addressed as
+    `bridge:id` (e. g. `living:3`), which becomes the tuple
+    `('living', 3)`."""
+    if isinstance(value, str) and ':' in value:
+        value = value.split(':', 1)
+    if isinstance(value, (tuple, list)):
+        if len(value) != 2 or not str(value[0]):
+            raise ValueError('Light addresses are “bridge:id” pairs.')
+        return (str(value[0]), light_id(value[1]))
     value = int(value)
     if value < 1:
         raise ValueError('Light IDS are greater or equal to 1')
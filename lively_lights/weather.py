@@ -0,0 +1,304 @@
+"""Provide weather values to the scenes without waiting for the network.
+
+A :class:`lively_lights.weather.WeatherProvider` caches the last sample of
+a backend, refreshes it in a background thread when the time to live
+expires and persists it to disk, so that a restart does not fetch it
+again. Reading a value is a dictionary lookup.
+
+.. code-block:: python
+
+    provider = WeatherProvider(
+        OpenWeatherMapBackend(api_key, 49.455556, 11.078611),
+        cache_file='~/.cache/lively-lights/weather.json',
+    )
+    provider.start()
+    provider.get_temperature()
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('temperature', 'wind_speed', 'wind_deg')
+"""The values of a weather sample."""
+
+RETRY_INTERVAL = 60
+"""Wait at least n seconds after a failed fetch before the next one."""
+
+
+class WeatherBackend(object):
+    """The base class of the weather backends."""
+
+    name = None
+    """Identifies the source of a persisted sample, e. g.
+    `openweathermap:49.455556,11.078611`."""
+
+    def fetch(self):
+        """Fetch the current weather. Should be overwritten.
+
+        :return: A dictionary with the keys `temperature` (degree Celsius),
+          `wind_speed` (m/s) and `wind_deg` or None if there is no weather
+          data.
+        """
+        return None
+
+
+class OpenWeatherMapBackend(WeatherBackend):
+    """Fetch the weather of a coordinate from OpenWeatherMap.
+
+    :param string openweathermap_api_key:
+      https://home.openweathermap.org/api_keys
+    :param float latitude: e. g. 49.455556
+    :param float longitude: e. g. 11.078611
+    """
+
+    def __init__(self, openweathermap_api_key, latitude, longitude):
+        self.openweathermap_api_key = openweathermap_api_key
+        self.latitude = float(latitude)
+        self.longitude = float(longitude)
+        self.name = 'openweathermap:{},{}'.format(self.latitude,
+                                                  self.longitude)
+        self._weather_manager = None
+
+    def fetch(self):
+        if self._weather_manager is None:
+            import pyowm
+            owm = pyowm.OWM(self.openweathermap_api_key)
+            self._weather_manager = owm.weather_manager()
+        weather = self._weather_manager.weather_at_coords(
+            self.latitude,
+            self.longitude,
+        ).weather
+        wind = weather.wind()
+        return {
+            'temperature': weather.temperature('celsius')['temp'],
+            'wind_speed': wind['speed'],
+            'wind_deg': wind.get('deg'),
+        }
+
+
+class JsonFileBackend(WeatherBackend):
+    """Read the weather from a local JSON file, e. g. in tests or written by
+    an own weather station.
+
+    .. code-block:: json
+
+        {"temperature": 9.7, "wind_speed": 4.6, "wind_deg": 330}
+
+    :param str path: The path of the JSON file.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+        self.name = 'file:{}'.format(os.path.abspath(self.path))
+
+    def fetch(self):
+        with open(self.path) as json_file:
+            return json.load(json_file)
+
+
+class WeatherProvider(object):
+    """Cache, refresh and persist the samples of a weather backend.
+
+    :param backend: :class:`lively_lights.weather.WeatherBackend`
+
+    :param float ttl: Fetch a new sample after n seconds.
+
+    :param str cache_file: Persist the last sample to this JSON file. After
+      a restart the persisted sample of the same backend is used and only
+      fetched again when it is older than `ttl`.
+    """
+
+    def __init__(self, backend, ttl=600, cache_file=None):
+        self.backend = backend
+        self.ttl = ttl
+        self.cache_file = os.path.expanduser(cache_file) if cache_file \
+            else None
+
+        self._sample = None
+        self._fetched_at = None
+        """The (wall clock) time stamp of the sample."""
+
+        self._attempted_at = None
+        """The time stamp of the last fetch, also if it failed."""
+
+        self._initialized = False
+        self._initialize_lock = threading.Lock()
+        """Held while the first sample is loaded or fetched, so that
+        concurrent first reads wait for it."""
+
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._thread = None
+        self._stop = threading.Event()
+        self._counters = {'fetches': 0, 'errors': 0, 'loads': 0}
+
+    def _due(self):
+        """True if the sample is expired and the last fetch is not too
+        recent."""
+        now = time.time()
+        if self._sample is not None and now - self._fetched_at < self.ttl:
+            return False
+        return self._attempted_at is None or \
+            now - self._attempted_at >= min(self.ttl, RETRY_INTERVAL)
+
+    def _load(self):
+        """Load the persisted sample if it is from the same backend."""
+        if not self.cache_file:
+            return
+        try:
+            with open(self.cache_file) as cache_file:
+                data = json.load(cache_file)
+        except (OSError, ValueError):
+            return
+        if data.get('source') != self.backend.name or \
+           not isinstance(data.get('sample'), dict):
+            return
+        self._sample = data['sample']
+        self._fetched_at = data['fetched_at']
+        self._counters['loads'] += 1
+
+    def _save(self):
+        if not self.cache_file:
+            return
+        data = {
+            'source': self.backend.name,
+            'fetched_at': self._fetched_at,
+            'sample': self._sample,
+        }
+        directory = os.path.dirname(self.cache_file)
+        tmp_file = self.cache_file + '.tmp'
+        try:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(tmp_file, 'w') as cache_file:
+                json.dump(data, cache_file)
+            os.replace(tmp_file, self.cache_file)
+        except OSError:
+            logger.exception('Writing the weather cache {} failed.'.format(
+                self.cache_file))
+
+    def refresh(self):
+        """Fetch a new sample now. On errors the old sample is kept.
+
+        :return: True if a new sample was fetched.
+        """
+        self._attempted_at = time.time()
+        try:
+            sample = self.backend.fetch()
+        except Exception:
+            logger.exception('Fetching the weather failed.')
+            with self._lock:
+                self._counters['errors'] += 1
+            return False
+        if sample is None:
+            return False
+        sample = {field: sample.get(field) for field in FIELDS}
+        with self._lock:
+            self._sample = sample
+            self._fetched_at = time.time()
+            self._counters['fetches'] += 1
+            self._save()
+        return True
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        finally:
+            self._refreshing = False
+
+    def _initialize(self):
+        """Load the persisted sample or fetch the first one."""
+        with self._initialize_lock:
+            if self._initialized:
+                return
+            with self._lock:
+                self._load()
+            if self._sample is None:
+                self.refresh()
+            self._initialized = True
+
+    def sample(self):
+        """The cached sample. Only the first use without a valid cache
+        file waits for the backend. An expired sample is returned while a
+        new one is fetched in a background thread.
+
+        :return: A dictionary with the keys of
+          :data:`lively_lights.weather.FIELDS` or None if no sample could
+          be fetched.
+        """
+        if not self._initialized:
+            self._initialize()
+        elif self._thread is None and self._due():
+            with self._lock:
+                start = not self._refreshing
+                self._refreshing = True
+            if start:
+                thread = threading.Thread(target=self._refresh_in_background,
+                                          name='lively-lights-weather')
+                thread.daemon = True
+                thread.start()
+        return self._sample
+
+    def get(self, field):
+        sample = self.sample()
+        if sample is None:
+            return None
+        return sample.get(field)
+
+    def get_temperature(self):
+        """The temperature in degree Celsius."""
+        return self.get('temperature')
+
+    def get_wind(self):
+        """The wind speed in m/s."""
+        return self.get('wind_speed')
+
+    def age(self):
+        """The age of the sample in seconds or None."""
+        if self._fetched_at is None:
+            return None
+        return time.time() - self._fetched_at
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats['age'] = self.age()
+        return stats
+
+    def _loop(self):
+        while True:
+            age = self.age()
+            wait = 0 if age is None else max(self.ttl - age, 0)
+            if self._stop.wait(wait):
+                return
+            if not self.refresh():
+                # Do not hammer a failing backend.
+                if self._stop.wait(min(self.ttl, RETRY_INTERVAL)):
+                    return
+
+    def start(self):
+        """Refresh the sample in a background thread whenever the time to
+        live expires."""
+        if self._thread and self._thread.is_alive():
+            return
+        with self._initialize_lock:
+            if not self._initialized:
+                with self._lock:
+                    self._load()
+                self._initialized = True
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop,
+                                        name='lively-lights-weather')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
@@ -2,6 +2,7 @@ import os
 from unittest import mock
 import lively_lights
 from lively_lights.environment import DayNight
+from lively_lights.scheduler import Clock
 
 command_name = 'lively-lights.py'
 
@@ -59,4 +60,28 @@ def mock_bridge(light_configs):
     bridge = mock.MagicMock()
     bridge.lights = lights
     bridge.__getitem__ = mock_get_item
+    bridge.get_light.return_value = {
+        str(light.light_id): {'state': {'reachable': light.reachable}}
+        for light in lights
+    }
     return bridge
+
+
+class FakeClock(object):
+    """A clock that only moves on when sleeping. Requests to the bridge
+    take 0.3 seconds."""
+
+    def __init__(self, now=0):
+        self.now = now
+        self.clock = Clock(lambda: self.now, self.sleep)
+        self.calls = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def request(self, *args):
+        self.calls.append(self.now)
+        self.now += 0.3
@@ -0,0 +1,67 @@
+from lively_lights import benchmark
+from lively_lights.cli import get_parser
+import json
+import os
+import tempfile
+import unittest
+
+
+class TestFunctions(unittest.TestCase):
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 50), 51)
+        self.assertEqual(benchmark.percentile(values, 99), 99)
+        self.assertEqual(benchmark.percentile(values, 100), 100)
+        self.assertEqual(benchmark.percentile([], 50), None)
+
+    def test_summarize(self):
+        self.assertEqual(benchmark.summarize([3, 1, 2]),
+                         {'p50': 2, 'p95': 3, 'p99': 3, 'max': 3})
+
+    def test_compare(self):
+        old = {
+            'client': {'commands_per_second': 100, 'latency': {'p50': 0.01}},
+            'scenes': {'breath-10': {'memory_peak': 1000}},
+        }
+        new = {
+            'client': {'commands_per_second': 50, 'latency': {'p50': 0.005}},
+            'scenes': {'breath-10': {'memory_peak': 1050}},
+        }
+        rows = benchmark.compare(old, new)
+        self.assertEqual(rows, [
+            ('client.commands_per_second', 100, 50, -0.5, 'regression'),
+            ('client.latency.p50', 0.01, 0.005, -0.5, 'improvement'),
+            ('scenes.breath-10.memory_peak', 1000, 1050, 0.05, ''),
+        ])
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_client(self):
+        result = benchmark.benchmark_client(light_count=3, requests=20,
+                                            threads=2)
+        self.assertEqual(result['requests'], 20)
+        self.assertGreater(result['commands_per_second'], 0)
+        self.assertGreater(result['latency']['p99'], 0)
+        self.assertGreater(result['memory_peak'], 0)
+
+    def test_scene(self):
+        result = benchmark.benchmark_scene('sequence', light_count=3,
+                                           duration=1.2)
+        self.assertGreater(result['commands'], 0)
+        self.assertIsNotNone(result['tick_jitter']['p50'])
+        self.assertGreaterEqual(result['drift'], 0)
+
+    def test_main(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            args = get_parser().parse_args([
+                '-D', '1', 'benchmark', '-l', '2', '-r', '10',
+                '-s', 'pendulum', '-o', output,
+            ])
+            benchmark.main(args)
+            with open(output) as results:
+                results = json.load(results)
+        self.assertEqual(list(results['scenes']), ['pendulum-2'])
+        self.assertEqual(results['options']['duration'], 1)
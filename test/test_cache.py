@@ -0,0 +1,193 @@
+from lively_lights.cache import StateCache, UNKNOWN
+from lively_lights.phue import Bridge
+from unittest import mock
+import copy
+import unittest
+
+API = {
+    'lights': {
+        '1': {'name': 'Lamp 1', 'state': {'on': True, 'bri': 1,
+                                          'reachable': True}},
+        '2': {'name': 'Lamp 2', 'state': {'on': False, 'bri': 2,
+                                          'reachable': False}},
+    },
+    'groups': {
+        '1': {'name': 'Kitchen', 'lights': ['1', '2'],
+              'action': {'on': True, 'bri': 3}},
+    },
+    'sensors': {
+        '1': {'name': 'Daylight', 'state': {'daylight': True}},
+    },
+    'config': {'name': 'Philips hue'},
+}
+
+
+def get_cache(ttl=60):
+    bridge = mock.Mock()
+    bridge.get_api.return_value = copy.deepcopy(API)
+    return StateCache(bridge, ttl=ttl)
+
+
+class TestClassStateCache(unittest.TestCase):
+
+    def test_get(self):
+        cache = get_cache()
+        self.assertEqual(cache.get('lights', 1, 'state', 'bri'), 1)
+        self.assertEqual(cache.get('groups', '1', 'name'), 'Kitchen')
+        self.assertEqual(cache.get('config', 'name'), 'Philips hue')
+        self.assertEqual(cache.get('lights', 3), None)
+        cache.bridge.get_api.assert_called_once_with()
+        self.assertEqual(cache.stats()['hits'], 3)
+
+    def test_get_copy(self):
+        cache = get_cache()
+        state = cache.get('lights', 1, 'state')
+        state['bri'] = 100
+        self.assertEqual(cache.get('lights', 1, 'state', 'bri'), 1)
+        cache.push([(['lights', '1', 'state', 'bri'], 50)])
+        self.assertEqual(state['bri'], 100)
+
+    def test_ttl(self):
+        cache = get_cache(ttl=0.0001)
+        cache.get('lights')
+        cache._fetched_at -= 1
+        cache.get('lights')
+        self.assertEqual(cache.bridge.get_api.call_count, 2)
+
+    def test_disabled(self):
+        cache = get_cache(ttl=0)
+        self.assertEqual(cache.get('lights'), None)
+        cache.bridge.get_api.assert_not_called()
+
+    def test_error(self):
+        cache = get_cache()
+        cache.bridge.get_api.return_value = [{'error': {'type': 1}}]
+        self.assertEqual(cache.get('lights'), None)
+
+    def test_update_put(self):
+        cache = get_cache()
+        cache.snapshot()
+        cache.update('PUT', [
+            {'success': {'/lights/1/state/bri': 200}},
+            {'error': {'address': '/lights/1/state/hue'}},
+        ])
+        self.assertEqual(cache.get('lights', 1, 'state', 'bri'), 200)
+
+    def test_update_group_action(self):
+        cache = get_cache()
+        cache.snapshot()
+        cache.update('PUT', [{'success': {'/groups/1/action/bri': 100}}])
+        self.assertEqual(cache.get('groups', 1, 'action', 'bri'), 100)
+        self.assertEqual(cache.get('lights', 1, 'state', 'bri'), 100)
+        self.assertEqual(cache.get('lights', 2, 'state', 'bri'), 100)
+
+    def test_update_group_0(self):
+        cache = get_cache()
+        cache.snapshot()
+        cache.update('PUT', [{'success': {'/groups/0/action/on': False}}])
+        self.assertEqual(cache.get('lights', 1, 'state', 'on'), False)
+
+    def test_update_post(self):
+        cache = get_cache()
+        cache.snapshot()
+        cache.update('POST', [{'success': {'id': '2'}}])
+        cache.snapshot()
+        self.assertEqual(cache.bridge.get_api.call_count, 2)
+
+    def test_push(self):
+        cache = get_cache()
+        cache.push([(['lights', '1', 'state', 'bri'], 100)])
+        self.assertIsNone(cache.pushed_at)
+        cache.snapshot()
+        cache.push([(['lights', '1', 'state', 'bri'], 100),
+                    (['lights', '2', 'state', 'reachable'], True),
+                    (['lights', '3', 'state', 'bri'], 100)])
+        self.assertEqual(cache.get('lights', 1, 'state', 'bri'), 100)
+        self.assertEqual(cache.get('lights', 2, 'state', 'reachable'), True)
+        self.assertEqual(cache.get('lights', 3), None)
+        self.assertIsNotNone(cache.pushed_at)
+        self.assertEqual(cache.stats()['pushed'], 3)
+
+    def test_push_unknown(self):
+        cache = get_cache()
+        cache.bridge.username = 'user'
+        cache.bridge.request.return_value = {'state': {'on': True, 'bri': 5,
+                                                       'hue': 10}}
+        cache.snapshot()
+        cache.push([(['lights', '1', 'state', 'hue'], UNKNOWN)])
+        self.assertEqual(cache.get('groups', 1, 'name'), 'Kitchen')
+        cache.bridge.request.assert_not_called()
+        self.assertEqual(cache.get('lights', 1, 'state', 'hue'), 10)
+        cache.bridge.request.assert_called_once_with('GET',
+                                                     '/api/user/lights/1')
+        self.assertEqual(cache.get('lights', 1, 'state', 'hue'), 10)
+        self.assertEqual(cache.bridge.request.call_count, 1)
+        self.assertEqual(cache.stats()['refreshes'], 1)
+
+        cache.push([(['lights', '1', 'state', 'hue'], UNKNOWN),
+                    (['lights', '2', 'state', 'hue'], UNKNOWN)])
+        cache.bridge.request.return_value = copy.deepcopy(API['lights'])
+        self.assertEqual(cache.get('lights')['2']['name'], 'Lamp 2')
+        cache.bridge.request.assert_called_with('GET', '/api/user/lights')
+        self.assertEqual(cache.stats()['refreshes'], 2)
+        cache.bridge.get_api.assert_called_once_with()
+
+    def test_push_unknown_error(self):
+        cache = get_cache()
+        cache.bridge.request.return_value = [{'error': {'type': 3}}]
+        cache.snapshot()
+        cache.push([(['lights', '3', 'state', 'hue'], UNKNOWN)])
+        self.assertIsNone(cache.get('lights', 3))
+        self.assertEqual(cache.bridge.get_api.call_count, 2)
+
+    def test_live(self):
+        cache = get_cache(ttl=0.0001)
+        cache.live = True
+        cache.get('lights')
+        cache._fetched_at -= 1
+        cache.get('lights')
+        cache.bridge.get_api.assert_called_once_with()
+        cache.live = False
+        cache.get('lights')
+        self.assertEqual(cache.bridge.get_api.call_count, 2)
+
+
+class TestClassBridgeStateCache(unittest.TestCase):
+
+    def get_bridge(self, cache_ttl=60):
+        bridge = Bridge('127.0.0.1', 'user', cache_ttl=cache_ttl)
+        bridge.request = mock.Mock(return_value=copy.deepcopy(API))
+        return bridge
+
+    def test_light_properties(self):
+        bridge = self.get_bridge()
+        light = bridge[1]
+        self.assertEqual(light.brightness, 1)
+        self.assertEqual(light.on, True)
+        self.assertEqual(light.reachable, True)
+        self.assertEqual(bridge[2].reachable, False)
+        bridge.request.assert_called_once_with('GET', '/api/user')
+
+    def test_group_properties(self):
+        bridge = self.get_bridge()
+        self.assertEqual(bridge.get_group(1, 'name'), 'Kitchen')
+        self.assertEqual(bridge.get_group(1, 'bri'), 3)
+        bridge.request.assert_called_once_with('GET', '/api/user')
+
+    def test_get_light_copy(self):
+        bridge = self.get_bridge()
+        bridge.get_light(1)['state']['bri'] = 100
+        bridge.get_light()['1']['name'] = 'Lamp 3'
+        self.assertEqual(bridge.get_light(1, 'bri'), 1)
+        self.assertEqual(bridge.get_light(1, 'name'), 'Lamp 1')
+
+    def test_sensor_properties(self):
+        bridge = self.get_bridge()
+        self.assertEqual(bridge.get_sensor(1, 'name'), 'Daylight')
+        bridge.request.assert_called_once_with('GET', '/api/user')
+
+    def test_disabled(self):
+        bridge = self.get_bridge(cache_ttl=0)
+        bridge.request.return_value = API['lights']['1']
+        self.assertEqual(bridge.get_light(1, 'bri'), 1)
+        bridge.request.assert_called_once_with('GET', '/api/user/lights/1')
@@ -77,6 +77,26 @@ class TestCliUnit(unittest.TestCase):
         self.assertEqual(args.sleep_time, float(1))
         self.assertEqual(args.transition_time, int(1))
 
+    @mock.patch('sys.argv', ['.', '--socket', '/tmp/test.sock', 'scene',
+                             'sequence', '--brightness', '1'])
+    @mock.patch('lively_lights.Hue')
+    @mock.patch('lively_lights.control.ControlClient')
+    def test_scene_forwarded_to_daemon(self, ControlClient, Hue):
+        ControlClient.return_value.is_running.return_value = True
+        main()
+        ControlClient.assert_called_with('/tmp/test.sock')
+        request = ControlClient.return_value.request
+        self.assertEqual(request.call_args[0], ('scene', ))
+        self.assertEqual(request.call_args[1]['properties'],
+                         {'brightness': 1})
+        Hue.assert_not_called()
+
+    @mock.patch('sys.argv', ['.', 'daemon', 'stop'])
+    @mock.patch('lively_lights.control.ControlClient')
+    def test_daemon_stop(self, ControlClient):
+        main()
+        ControlClient.return_value.request.assert_called_with('stop')
+
 
 class TestCli(unittest.TestCase):
 
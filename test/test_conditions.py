@@ -0,0 +1,158 @@
+from _helper import get_day_night
+from freezegun import freeze_time
+from lively_lights.conditions import Condition, ConditionEngine, Daytime, \
+                                     HostUp, Night, TRANSITION_DELAY
+from unittest import mock
+import datetime
+import threading
+import time
+import unittest
+
+
+class FakeCondition(Condition):
+    """Active between `begin` and `end`."""
+
+    name = 'fake'
+
+    def __init__(self, begin, end):
+        self.begin = begin
+        self.end = end
+        self.checks = 0
+
+    def check(self, now):
+        self.checks += 1
+        if now < self.begin:
+            return False, self.begin
+        if now < self.end:
+            return True, self.end
+        return False, None
+
+
+class TestClassConditions(unittest.TestCase):
+
+    @freeze_time('2000-01-01 12:00:00')
+    def test_night(self):
+        day_night = get_day_night()
+        active, next_check = Night(day_night).check(time.time())
+        self.assertFalse(active)
+        sunset = datetime.datetime(2000, 1, 1, 15, 27, 48,
+                                   tzinfo=datetime.timezone.utc)
+        self.assertAlmostEqual(next_check,
+                               sunset.timestamp() + TRANSITION_DELAY,
+                               delta=1)
+
+    @freeze_time('2000-01-01 12:00:00')
+    def test_daytime(self):
+        active, _ = Daytime(get_day_night()).check(time.time())
+        self.assertTrue(active)
+
+    def test_host_up(self):
+        prober = mock.Mock()
+        prober.is_up.return_value = True
+        condition = HostUp(prober)
+        self.assertEqual(condition.check(100), (True, None))
+        engine = ConditionEngine([condition])
+        prober.start.assert_called_once_with()
+        callback = prober.subscribe.call_args[0][0]
+        self.assertTrue(engine.paused)
+        prober.is_up.return_value = False
+        self.assertTrue(engine.paused)
+        callback(False)
+        self.assertFalse(engine.paused)
+
+
+class TestClassConditionEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.condition = FakeCondition(10, 20)
+        self.engine = ConditionEngine([self.condition],
+                                      time_function=lambda: self.now)
+
+    def test_no_conditions(self):
+        self.assertFalse(ConditionEngine().paused)
+
+    def test_base_condition(self):
+        engine = ConditionEngine([Condition()])
+        self.assertFalse(engine.paused)
+        self.assertEqual(engine.active, [])
+
+    def test_evaluate_when_due(self):
+        for _ in range(100):
+            self.assertFalse(self.engine.paused)
+        self.assertEqual(self.condition.checks, 1)
+        self.now = 10
+        self.assertTrue(self.engine.paused)
+        self.assertEqual(self.engine.active, ['fake'])
+        self.now = 19.9
+        self.assertTrue(self.engine.paused)
+        self.assertEqual(self.condition.checks, 2)
+        self.now = 20
+        self.assertFalse(self.engine.paused)
+        self.assertEqual(self.engine.active, [])
+        self.now = 1000
+        self.assertFalse(self.engine.paused)
+        self.assertEqual(self.condition.checks, 3)
+
+    def test_refresh(self):
+        self.engine.paused
+        self.engine.refresh()
+        self.assertEqual(self.condition.checks, 2)
+
+    def test_failing_condition(self):
+        condition = mock.Mock()
+        condition.name = 'broken'
+        condition.check.side_effect = OSError
+        engine = ConditionEngine([condition], time_function=lambda: self.now)
+        with self.assertLogs('lively_lights.conditions'):
+            self.assertFalse(engine.paused)
+        engine.paused
+        condition.check.assert_called_once_with(0)
+
+    def test_wait_resumed_timeout(self):
+        self.engine._time = time.time
+        self.condition.begin = 0
+        self.condition.end = time.time() + 60
+        self.assertFalse(self.engine.wait_resumed(timeout=0.01))
+
+    def test_wait_resumed_stop(self):
+        self.engine._time = time.time
+        self.condition.begin = 0
+        self.condition.end = time.time() + 60
+        stop = threading.Event()
+        thread = threading.Thread(target=self.engine.wait_resumed,
+                                  kwargs={'stop': stop})
+        thread.start()
+        stop.set()
+        self.engine.wakeup()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+
+class TestClassConditionEngineWallTime(unittest.TestCase):
+
+    def setUp(self):
+        begin = time.time()
+        self.engine = ConditionEngine([FakeCondition(begin, begin + 0.1)])
+
+    def test_wait_resumed(self):
+        begin = time.time()
+        self.assertTrue(self.engine.paused)
+        self.assertTrue(self.engine.wait_resumed())
+        self.assertGreaterEqual(time.time() - begin, 0.09)
+
+    def test_subscribe(self):
+        resumed = threading.Event()
+        callback = mock.Mock(side_effect=lambda paused: resumed.set())
+        self.assertTrue(self.engine.paused)
+        self.engine.subscribe(callback)
+        self.assertTrue(resumed.wait(5))
+        callback.assert_called_once_with(False)
+        thread = self.engine._thread
+        self.engine.unsubscribe(callback)
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
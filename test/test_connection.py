@@ -0,0 +1,113 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from lively_lights.connection import ConnectionPool
+import json
+import threading
+import time
+import unittest
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        body = json.dumps({'path': self.path}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if self.path == '/close':
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+        if self.path == '/hang-up':
+            # Drop the connection without telling the client.
+            self.close_connection = True
+
+
+class TestClassConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.host = '127.0.0.1:{}'.format(self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def pool(self, **kwargs):
+        pool = ConnectionPool(self.host, **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_request(self):
+        pool = self.pool()
+        status, body = pool.request('GET', '/api')
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body.decode('utf-8')), {'path': '/api'})
+
+    def test_reuse(self):
+        pool = self.pool()
+        for _ in range(5):
+            pool.request('GET', '/api')
+        stats = pool.stats()
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['reused'], 4)
+        self.assertEqual(stats['requests'], 5)
+        self.assertEqual(stats['idle'], 1)
+        self.assertEqual(stats['in_use'], 0)
+
+    def test_connection_close(self):
+        pool = self.pool()
+        pool.request('GET', '/close')
+        pool.request('GET', '/api')
+        stats = pool.stats()
+        self.assertEqual(stats['created'], 2)
+        self.assertEqual(stats['discarded'], 1)
+
+    def test_reconnect_on_stale(self):
+        pool = self.pool()
+        pool.request('GET', '/hang-up')
+        time.sleep(0.1)
+        status, _ = pool.request('GET', '/api')
+        self.assertEqual(status, 200)
+        self.assertEqual(pool.stats()['reconnects'], 1)
+
+    def test_idle_timeout(self):
+        pool = self.pool(idle_timeout=0)
+        pool.request('GET', '/api')
+        pool.request('GET', '/api')
+        self.assertEqual(pool.stats()['created'], 2)
+
+    def test_size(self):
+        pool = self.pool(size=2)
+        threads = []
+        for _ in range(10):
+            thread = threading.Thread(target=pool.request,
+                                      args=('GET', '/api'))
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        stats = pool.stats()
+        self.assertLessEqual(stats['created'], 2)
+        self.assertEqual(stats['requests'], 10)
+
+    def test_close(self):
+        pool = self.pool()
+        pool.request('GET', '/api')
+        pool.close()
+        self.assertEqual(pool.stats()['idle'], 0)
+        status, _ = pool.request('GET', '/api')
+        self.assertEqual(status, 200)
+        self.assertEqual(pool.stats()['idle'], 0)
+
+    def test_invalid_size(self):
+        with self.assertRaises(ValueError):
+            ConnectionPool(self.host, size=0)
@@ -0,0 +1,243 @@
+from _helper import get_reachable_lights
+from lively_lights import control
+from lively_lights.control import ControlClient, ControlServer, Controller
+from unittest import mock
+import argparse
+import os
+import socket
+import tempfile
+import threading
+import unittest
+
+
+def get_bridge():
+    bridge = mock.Mock()
+    bridge.dispatcher.stats.return_value = {'queue_depth': 0}
+    bridge.state_cache.stats.return_value = {'hits': 0}
+    bridge.pool_stats.return_value = {'size': 4}
+    return bridge
+
+
+def get_controller():
+    reachable_lights = get_reachable_lights([1, 2])
+    reachable_lights.start_refresh_thread = mock.Mock()
+    reachable_lights.stop_refresh_thread = mock.Mock()
+    return Controller(get_bridge(), reachable_lights)
+
+
+class TestClassController(unittest.TestCase):
+
+    def setUp(self):
+        self.controller = get_controller()
+        self.controller.start()
+
+    def tearDown(self):
+        self.controller.close()
+
+    def test_unknown_command(self):
+        with self.assertRaises(ValueError):
+            self.controller.handle({'command': 'unknown'})
+        with self.assertRaises(ValueError):
+            self.controller.handle({'scene': 'breath'})
+
+    def test_ping(self):
+        response = self.controller.handle({'command': 'ping'})
+        self.assertEqual(response, {'ok': True, 'pid': os.getpid()})
+
+    @mock.patch('lively_lights.scenes.set_lights_multiple', mock.Mock())
+    def test_scene(self):
+        self.controller.handle({
+            'command': 'scene',
+            'scene': 'sequence',
+            'properties': {'brightness': 100, 'sleep_time': 10},
+        })
+        status = self.controller.handle({'command': 'status'})
+        self.assertEqual(status['scene'], 'sequence')
+        self.assertEqual(status['properties']['brightness'], 100)
+        self.assertEqual(status['dispatcher'], {'queue_depth': 0})
+
+        self.controller.handle({'command': 'set',
+                                'properties': {'brightness': 200}})
+        status = self.controller.status()
+        self.assertEqual(status['properties']['brightness'], 200)
+
+        self.assertEqual(self.controller.handle({'command': 'stop'}),
+                         {'ok': True, 'stopped': True})
+        self.assertIsNone(self.controller.status()['scene'])
+        self.assertEqual(self.controller.stop(), {'stopped': False})
+
+    @mock.patch('lively_lights.scenes.set_lights_multiple', mock.Mock())
+    def test_scene_replaces_running_scene(self):
+        default = self.controller.reachable_lights.light_ids
+        self.controller.start_scene('sequence', {'sleep_time': 10})
+        first = self.controller._runner
+        self.controller.start_scene('sequence', {'sleep_time': 10},
+                                    lights=[1])
+        self.assertIsNot(self.controller._runner, first)
+        self.assertEqual(self.controller.reachable_lights.light_ids, [1])
+        self.controller.start_scene('sequence', {'sleep_time': 10})
+        self.assertEqual(self.controller.reachable_lights.light_ids,
+                         default)
+
+    @mock.patch('lively_lights.scenes.set_lights_multiple', mock.Mock())
+    def test_scene_light_ids(self):
+        self.controller.start_scene('sequence', {'sleep_time': 10},
+                                    lights=[['living', '3'], 1])
+        self.assertEqual(self.controller.reachable_lights.light_ids,
+                         [('living', 3), 1])
+        for lights in ('12', [0], [['living']]):
+            with self.assertRaises(ValueError):
+                self.controller.start_scene('sequence', lights=lights)
+
+    @mock.patch('lively_lights.scenes.set_lights_multiple', mock.Mock())
+    def test_set_inconsistent_properties(self):
+        self.controller.start_scene('sequence', {'sleep_time': 10,
+                                                 'transition_time': 2})
+        with self.assertRaises(ValueError):
+            self.controller.set_properties({'transition_time': 11})
+        with self.assertRaises(ValueError):
+            self.controller.set_properties({'sleep_time': 1})
+        properties = self.controller.status()['properties']
+        self.assertEqual(properties['sleep_time'], 10)
+        self.assertEqual(properties['transition_time'], 2)
+        self.controller.set_properties({'sleep_time': 12,
+                                        'transition_time': 11})
+        self.assertEqual(self.controller._runner.transition_time, 11)
+
+    def test_metrics(self):
+        self.controller.bridge.add_hook.assert_called_with(
+            self.controller.request_metrics)
+        text = self.controller.handle({'command': 'metrics'})['text']
+        self.assertIn('lively_lights_requests_total', text)
+        self.assertIn('lively_lights_dispatcher_queue_depth 0', text)
+        self.assertIn('lively_lights_connections_size 4', text)
+
+    def test_set_without_scene(self):
+        with self.assertRaises(ValueError):
+            self.controller.set_properties({'brightness': 100})
+
+    def test_invalid_properties(self):
+        with self.assertRaises(ValueError):
+            self.controller.start_scene('sequence', {'brightness': 300})
+        self.assertIsNone(self.controller._runner)
+
+
+class TestClassServer(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.directory.name, 'control.sock')
+        self.controller = get_controller()
+        self.server = ControlServer(self.socket_path, self.controller)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.client = ControlClient(self.socket_path)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        self.controller.close()
+        self.directory.cleanup()
+
+    def test_request(self):
+        self.assertTrue(self.client.is_running())
+        self.assertEqual(self.client.request('ping'), {'pid': os.getpid()})
+        status = self.client.request('status')
+        self.assertIsNone(status['scene'])
+        self.assertEqual(status['connections'], {'size': 4})
+
+    def test_error(self):
+        with self.assertRaises(ValueError) as context:
+            self.client.request('set', properties={'brightness': 1})
+        self.assertIn('No scene', str(context.exception))
+        with self.assertRaises(ValueError):
+            self.client.request('ping', unexpected=1)
+
+    def test_invalid_json(self):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(self.socket_path)
+        connection.sendall(b'not json\n{"command": "ping"}\n')
+        with connection.makefile('rb') as stream:
+            self.assertIn(b'"ok": false', stream.readline())
+            self.assertIn(b'"ok": true', stream.readline())
+        connection.close()
+
+    def test_socket_permissions(self):
+        self.assertEqual(os.stat(self.socket_path).st_mode & 0o777, 0o600)
+
+    def test_already_running(self):
+        with self.assertRaises(RuntimeError):
+            ControlServer(self.socket_path, self.controller)
+
+    def test_shutdown(self):
+        self.client.request('shutdown')
+        self.thread.join(5)
+        self.assertFalse(self.thread.is_alive())
+
+
+class TestClassClient(unittest.TestCase):
+
+    def test_not_running(self):
+        with tempfile.TemporaryDirectory() as directory:
+            socket_path = os.path.join(directory, 'control.sock')
+            client = ControlClient(socket_path)
+            self.assertFalse(client.is_running())
+            with self.assertRaises(OSError):
+                client.request('ping')
+
+    def test_stale_socket(self):
+        with tempfile.TemporaryDirectory() as directory:
+            socket_path = os.path.join(directory, 'control.sock')
+            stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            stale.bind(socket_path)
+            stale.close()
+            self.assertFalse(ControlClient(socket_path).is_running())
+            server = ControlServer(socket_path, get_controller())
+            server.server_close()
+            self.assertFalse(os.path.exists(socket_path))
+
+
+class TestFunctions(unittest.TestCase):
+
+    def test_parse_assignments(self):
+        self.assertEqual(
+            control.parse_assignments(['hue_range=[0, 20000]',
+                                       'brightness=100',
+                                       'sleep-time=2.5']),
+            {'hue_range': [0, 20000], 'brightness': 100, 'sleep_time': 2.5})
+        with self.assertRaises(ValueError):
+            control.parse_assignments(['brightness'])
+
+    def test_properties_from_args(self):
+        args = argparse.Namespace(scene='breath', brightness_range=[1, 2],
+                                  hue_range=None, time_range=None)
+        self.assertEqual(control.properties_from_args(args),
+                         {'brightness_range': [1, 2]})
+
+    def test_format_status(self):
+        controller = get_controller()
+        out = control.format_status(controller.status())
+        self.assertIn('scene: -', out)
+        self.assertIn('connections: size=4', out)
+
+    def test_forward_launch(self):
+        client = mock.Mock()
+        args = argparse.Namespace(subcommand='launch', yamlfile='scenes.yml',
+                                  randomized=False, endless=True, duration=0,
+                                  lights=None)
+        control.forward(client, args)
+        arguments = client.request.call_args[1]
+        self.assertEqual(client.request.call_args[0], ('launch', ))
+        self.assertTrue(os.path.isabs(arguments['yamlfile']))
+        self.assertTrue(arguments['endless'])
+
+    def test_main_not_running(self):
+        args = argparse.Namespace(socket='/nonexistent/control.sock',
+                                  daemon='status')
+        with self.assertRaises(SystemExit):
+            control.main(args)
+
+
+if __name__ == '__main__':
+    unittest.main()
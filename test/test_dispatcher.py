@@ -0,0 +1,488 @@
+from _helper import FakeClock
+from lively_lights.dispatcher import Dispatcher, GroupCache, ShadowState, \
+    TokenBucket
+from unittest import mock
+import time
+import unittest
+
+
+def get_bridge(groups=None):
+    bridge = mock.Mock()
+    bridge.username = 'user'
+    bridge.request.return_value = [{'success': {}}]
+    bridge.get_light_objects.return_value = {1: None, 2: None, 3: None}
+    if groups is None:
+        groups = {}
+    bridge.get_group.return_value = groups
+    bridge.create_group.return_value = [{'success': {'id': '7'}}]
+    bridge.set_group.return_value = [[{'success': {}}]]
+    return bridge
+
+
+class TestClassTokenBucket(unittest.TestCase):
+
+    def test_consume(self):
+        clock = FakeClock()
+        bucket = TokenBucket(2, burst=2, clock=clock)
+        self.assertTrue(bucket.consume())
+        self.assertTrue(bucket.consume())
+        self.assertFalse(bucket.consume())
+        self.assertEqual(bucket.delay(), 0.5)
+        clock.now = 0.5
+        self.assertTrue(bucket.consume())
+        self.assertFalse(bucket.consume())
+
+    def test_burst_default(self):
+        bucket = TokenBucket(0.5, clock=FakeClock())
+        self.assertEqual(bucket.burst, 1)
+
+    def test_burst_capacity(self):
+        clock = FakeClock()
+        bucket = TokenBucket(10, burst=1, clock=clock)
+        clock.now = 100
+        self.assertTrue(bucket.consume())
+        self.assertFalse(bucket.consume())
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(0)
+
+
+class TestClassShadowState(unittest.TestCase):
+
+    def test_delta(self):
+        shadow = ShadowState(clock=FakeClock())
+        shadow.remember([1, 2], {'on': True, 'hue': 1, 'alert': 'select'})
+        self.assertEqual(
+            shadow.delta([1, 2], {'on': True, 'hue': 2, 'alert': 'select',
+                                  'transitiontime': 4}),
+            {'hue': 2, 'alert': 'select', 'transitiontime': 4})
+        self.assertEqual(shadow.delta([1], {'on': True, 'transitiontime': 4}),
+                         {})
+        self.assertEqual(shadow.delta([1, 3], {'on': True}), {'on': True})
+        self.assertEqual(shadow.delta(None, {'on': True}), {'on': True})
+
+    def test_ttl(self):
+        clock = FakeClock()
+        shadow = ShadowState(ttl=10, clock=clock)
+        shadow.remember([1], {'on': True})
+        clock.now = 10
+        self.assertEqual(shadow.delta([1], {'on': True}), {'on': True})
+
+    def test_disabled(self):
+        shadow = ShadowState(ttl=0)
+        shadow.remember([1], {'on': True})
+        self.assertEqual(shadow.delta([1], {'on': True}), {'on': True})
+
+    def test_increment(self):
+        shadow = ShadowState()
+        shadow.remember([1], {'bri': 10})
+        shadow.remember([1], {'bri_inc': 10})
+        self.assertEqual(shadow.delta([1], {'bri': 10}), {'bri': 10})
+
+    def test_forget(self):
+        shadow = ShadowState()
+        shadow.remember([1, 2], {'on': True, 'bri': 1})
+        shadow.forget([1], ['bri'])
+        self.assertEqual(shadow.delta([1], {'on': True, 'bri': 1}),
+                         {'bri': 1})
+        shadow.forget()
+        self.assertEqual(shadow.delta([2], {'on': True}), {'on': True})
+
+    def test_push(self):
+        shadow = ShadowState()
+        shadow.remember([1, 2], {'on': True, 'bri': 1})
+        shadow.push([
+            (['lights', '1', 'state', 'on'], False),
+            (['lights', '2', 'state', 'on'], True),
+            (['lights', '2', 'state', 'reachable'], True),
+            (['groups', '1', 'action', 'bri'], 5),
+        ])
+        self.assertEqual(shadow.delta([1], {'on': True, 'bri': 1}),
+                         {'on': True})
+        self.assertEqual(shadow.delta([2], {'on': True, 'bri': 1}), {})
+
+    def test_update(self):
+        shadow = ShadowState()
+        shadow.remember([1], {'hue': 1})
+        shadow.update([
+            {'success': {'/lights/1/state/on': True}},
+            {'error': {'type': 7, 'address': '/lights/1/state/hue'}},
+            {'success': {'/groups/3/action/bri': 5}},
+        ], {3: [2, 4]}.get)
+        self.assertEqual(shadow.delta([1], {'on': True, 'hue': 1}),
+                         {'hue': 1})
+        self.assertEqual(shadow.delta([2, 4], {'bri': 5}), {})
+
+    def test_update_unknown_group(self):
+        shadow = ShadowState()
+        shadow.remember([1], {'hue': 1})
+        shadow.update([{'success': {'/groups/9/action/bri': 5}}],
+                      lambda group_id: None)
+        self.assertEqual(shadow.delta([1], {'hue': 1}), {'hue': 1})
+
+    def test_update_sensor(self):
+        shadow = ShadowState()
+        shadow.remember([1, 2], {'hue': 1})
+        members = mock.Mock(return_value=None)
+        shadow.update([
+            {'success': {'/sensors/1/state/status': 1}},
+            {'error': {'type': 7, 'address': '/sensors/2/state/flag'}},
+        ], members)
+        members.assert_not_called()
+        self.assertEqual(shadow.delta([1, 2], {'hue': 1}), {})
+
+
+class TestClassDispatcher(unittest.TestCase):
+
+    def test_set_light(self):
+        bridge = get_bridge()
+        dispatcher = Dispatcher(bridge)
+        dispatcher.set_light(1, {'on': True})
+        self.assertTrue(dispatcher.flush(5))
+        bridge.request.assert_called_with('PUT', '/api/user/lights/1/state',
+                                          {'on': True})
+        self.assertEqual(dispatcher.stats()['lights_sent'], 1)
+
+    def test_set_group(self):
+        bridge = get_bridge()
+        dispatcher = Dispatcher(bridge)
+        dispatcher.set_group(2, {'on': False})
+        self.assertTrue(dispatcher.flush(5))
+        bridge.request.assert_called_with('PUT', '/api/user/groups/2/action',
+                                          {'on': False})
+        self.assertEqual(dispatcher.stats()['groups_sent'], 1)
+
+    def test_order(self):
+        bridge = get_bridge()
+        dispatcher = Dispatcher(bridge, light_rate=1000)
+        for light_id in range(1, 6):
+            dispatcher.set_light(light_id, {'bri': light_id})
+        dispatcher.flush(5)
+        addresses = [call[0][1] for call in bridge.request.call_args_list]
+        self.assertEqual(addresses, [
+            '/api/user/lights/{}/state'.format(light_id)
+            for light_id in range(1, 6)
+        ])
+
+    def test_rate_limit(self):
+        bridge = get_bridge()
+        dispatcher = Dispatcher(bridge, light_rate=20)
+        dispatcher._buckets['lights'] = TokenBucket(20, burst=1)
+        begin = time.monotonic()
+        with dispatcher._condition:
+            for light_id in range(1, 6):
+                dispatcher.set_light(light_id, {'on': True})
+        self.assertGreater(dispatcher.queue_depth, 0)
+        dispatcher.flush(5)
+        self.assertGreaterEqual(time.monotonic() - begin, 0.19)
+        self.assertEqual(bridge.request.call_count, 5)
+        self.assertEqual(dispatcher.stats()['max_queue_depth'], 5)
+
+    def test_coalescing(self):
+        bridge = get_bridge()
+        dispatcher = Dispatcher(bridge)
+        with dispatcher._condition:
+            dispatcher.set_light(1, {'hue': 1, 'bri': 1, 'on': True})
+            dispatcher.set_light(2, {'hue': 2})
+            dispatcher.set_light(1, {'hue': 3, 'transitiontime': 4})
+            self.assertEqual(dispatcher.queue_depth, 2)
+        dispatcher.flush(5)
+        self.assertEqual(bridge.request.call_args_list, [
+            mock.call('PUT', '/api/user/lights/1/state',
+                      {'hue': 3, 'bri': 1, 'on': True, 'transitiontime': 4}),
+            mock.call('PUT', '/api/user/lights/2/state', {'hue': 2}),
+        ])
+        self.assertEqual(dispatcher.stats()['coalesced'], 1)
+
+    def test_coalescing_copies_data(self):
+        bridge = get_bridge()
+        dispatcher = Dispatcher(bridge)
+        data = {'hue': 1}
+        with dispatcher._condition:
+            dispatcher.set_light(1, data)
+            dispatcher.set_light(1, {'hue': 2})
+        dispatcher.flush(5)
+        self.assertEqual(data, {'hue': 1})
+
+    def test_error(self):
+        bridge = get_bridge()
+        bridge.request.side_effect = OSError
+        dispatcher = Dispatcher(bridge)
+        dispatcher.set_light(1, {'on': True})
+        dispatcher.set_light(2, {'on': True})
+        dispatcher.flush(5)
+        self.assertEqual(dispatcher.stats()['errors'], 2)
+        self.assertEqual(dispatcher.shadow.delta([1], {'on': True}),
+                         {'on': True})
+
+    def test_delta(self):
+        bridge = get_bridge()
+        dispatcher = Dispatcher(bridge)
+        dispatcher.set_light(1, {'on': True, 'sat': 254, 'hue': 1})
+        dispatcher.flush(5)
+        dispatcher.set_light(1, {'on': True, 'sat': 254, 'hue': 2,
+                                 'transitiontime': 3})
+        dispatcher.flush(5)
+        bridge.request.assert_called_with(
+            'PUT', '/api/user/lights/1/state', {'hue': 2, 'transitiontime': 3})
+
+    def test_suppressed(self):
+        bridge = get_bridge()
+        dispatcher = Dispatcher(bridge)
+        dispatcher.set_light(1, {'on': True})
+        dispatcher.flush(5)
+        dispatcher.set_light(1, {'on': True, 'transitiontime': 3})
+        self.assertTrue(dispatcher.flush(5))
+        self.assertEqual(bridge.request.call_count, 1)
+        self.assertEqual(dispatcher.stats()['suppressed'], 1)
+
+
+class TestClassDispatcherFlows(unittest.TestCase):
+
+    def get_addresses(self, bridge):
+        return [int(call[0][1].split('/')[4])
+                for call in bridge.request.call_args_list]
+
+    def test_fair_queuing(self):
+        bridge = get_bridge()
+        dispatcher = Dispatcher(bridge, light_rate=1000)
+        busy = dispatcher.flow('busy')
+        quiet = dispatcher.flow('quiet')
+        with dispatcher._condition:
+            for light_id in range(1, 7):
+                busy.set_light(light_id, {'bri': 1})
+            for light_id in range(7, 10):
+                quiet.set_light(light_id, {'bri': 1})
+        dispatcher.flush(5)
+        self.assertEqual(self.get_addresses(bridge),
+                         [1, 7, 2, 8, 3, 9, 4, 5, 6])
+
+    def test_weights(self):
+        bridge = get_bridge()
+        dispatcher = Dispatcher(bridge, light_rate=1000)
+        busy = dispatcher.flow('busy')
+        quiet = dispatcher.flow('quiet', weight=2)
+        with dispatcher._condition:
+            for light_id in range(1, 7):
+                busy.set_light(light_id, {'bri': 1})
+            for light_id in range(7, 11):
+                quiet.set_light(light_id, {'bri': 1})
+        dispatcher.flush(5)
+        self.assertEqual(self.get_addresses(bridge),
+                         [7, 1, 8, 9, 2, 10, 3, 4, 5, 6])
+
+    def test_flow_stats(self):
+        bridge = get_bridge()
+        dispatcher = Dispatcher(bridge)
+        flow = dispatcher.flow('room')
+        with dispatcher._condition:
+            flow.set_light(1, {'bri': 1})
+            flow.set_light(1, {'bri': 2})
+            dispatcher.set_light(2, {'bri': 1})
+            self.assertEqual(flow.stats()['queue_depth'], 1)
+        dispatcher.flush(5)
+        flow.set_light(1, {'bri': 2})
+        dispatcher.flush(5)
+        stats = dispatcher.flow_stats()
+        self.assertEqual(stats['room'], {'weight': 1, 'queue_depth': 0,
+                                         'queued': 2, 'sent': 1,
+                                         'coalesced': 1, 'suppressed': 1})
+        self.assertEqual(stats[None]['sent'], 1)
+
+    def test_invalid_weight(self):
+        with self.assertRaises(ValueError):
+            Dispatcher(get_bridge()).flow('room', weight=0)
+
+
+class TestClassGroupCache(unittest.TestCase):
+
+    def test_all_lights(self):
+        cache = GroupCache(get_bridge())
+        self.assertEqual(cache.get_group_id([3, 2, 1]), 0)
+
+    def test_existing_group(self):
+        bridge = get_bridge({'3': {'name': 'Kitchen', 'lights': ['1', '2']}})
+        cache = GroupCache(bridge)
+        self.assertEqual(cache.get_group_id([2, 1]), 3)
+        bridge.create_group.assert_not_called()
+
+    def test_create(self):
+        bridge = get_bridge()
+        cache = GroupCache(bridge)
+        self.assertEqual(cache.get_group_id([1, 2]), 7)
+        self.assertEqual(cache.get_group_id([1, 2]), 7)
+        bridge.create_group.assert_called_once_with('lively-lights 1',
+                                                    [1, 2])
+
+    def test_create_unused_name(self):
+        bridge = get_bridge({
+            '4': {'name': 'lively-lights 2', 'lights': ['1']},
+            '5': {'name': 'lively-lights 3', 'lights': ['2']},
+        })
+        cache = GroupCache(bridge)
+        cache.get_group_id([1, 2])
+        bridge.create_group.return_value = [{'success': {'id': '8'}}]
+        cache.get_group_id([2, 3])
+        self.assertEqual(bridge.create_group.call_args_list, [
+            mock.call('lively-lights 1', [1, 2]),
+            mock.call('lively-lights 4', [2, 3]),
+        ])
+
+    def test_reassign(self):
+        bridge = get_bridge({
+            '4': {'name': 'lively-lights 1', 'lights': ['1']},
+            '5': {'name': 'lively-lights 2', 'lights': ['2']},
+        })
+        cache = GroupCache(bridge, max_groups=2)
+        self.assertEqual(cache.get_group_id([1]), 4)
+        self.assertEqual(cache.get_group_id([2]), 5)
+        self.assertEqual(cache.get_group_id([1, 2]), 4)
+        bridge.set_group.assert_called_with(4, 'lights', [1, 2])
+        self.assertEqual(cache.get_group_id([2, 3], busy={4, 5}), None)
+
+    def test_error(self):
+        bridge = get_bridge()
+        bridge.create_group.return_value = [{'error': {}}]
+        cache = GroupCache(bridge)
+        self.assertEqual(cache.get_group_id([1, 2]), None)
+        self.assertEqual(cache.get_group_id([1, 2]), None)
+        bridge.create_group.assert_called_once()
+
+    def test_throttle(self):
+        bridge = get_bridge()
+        throttle = mock.Mock(return_value=False)
+        cache = GroupCache(bridge, throttle=throttle)
+        self.assertEqual(cache.get_group_id([1, 2, 3]), 0)
+        self.assertEqual(cache.get_group_id([1, 2]), None)
+        bridge.create_group.assert_not_called()
+        throttle.return_value = True
+        self.assertEqual(cache.get_group_id([1, 2]), 7)
+        throttle.assert_called_with(False)
+
+    def test_remove(self):
+        bridge = get_bridge({
+            '3': {'name': 'Kitchen', 'lights': ['1']},
+            '4': {'name': 'lively-lights 1', 'lights': ['2']},
+        })
+        throttle = mock.Mock(return_value=True)
+        cache = GroupCache(bridge, throttle=throttle)
+        self.assertEqual(cache.get_group_id([1, 3]), 7)
+        cache.remove()
+        self.assertEqual(bridge.delete_group.call_args_list,
+                         [mock.call(4), mock.call(7)])
+        throttle.assert_called_with(True)
+        self.assertEqual(cache.get_light_ids(7), None)
+
+
+class TestClassDispatcherSetLights(unittest.TestCase):
+
+    def test_group_action(self):
+        bridge = get_bridge({'3': {'name': 'Kitchen', 'lights': ['1', '2']}})
+        dispatcher = Dispatcher(bridge)
+        dispatcher.set_lights([1, 2], {'hue': 1})
+        dispatcher.flush(5)
+        bridge.request.assert_called_once_with(
+            'PUT', '/api/user/groups/3/action', {'hue': 1})
+
+    def test_group_budget(self):
+        bridge = get_bridge()
+        dispatcher = Dispatcher(bridge, group_rate=1)
+        dispatcher.set_lights([1, 2], {'hue': 1})
+        # Creating the group took the only token: no second group.
+        dispatcher.set_lights([2, 3], {'bri': 1})
+        dispatcher.flush(5)
+        bridge.create_group.assert_called_once()
+        bridge.request.assert_any_call(
+            'PUT', '/api/user/groups/7/action', {'hue': 1})
+        bridge.request.assert_any_call(
+            'PUT', '/api/user/lights/3/state', {'bri': 1})
+
+    def test_close(self):
+        bridge = get_bridge()
+        dispatcher = Dispatcher(bridge, group_rate=100)
+        dispatcher.set_lights([1, 2], {'hue': 1})
+        dispatcher.close()
+        bridge.request.assert_called_once_with(
+            'PUT', '/api/user/groups/7/action', {'hue': 1})
+        bridge.delete_group.assert_called_once_with(7)
+
+    def test_close_ends_thread(self):
+        bridge = get_bridge()
+        dispatcher = Dispatcher(bridge)
+        dispatcher.set_light(1, {'hue': 1})
+        thread = dispatcher._thread
+        dispatcher.close()
+        self.assertFalse(thread.is_alive())
+        # Commands queued after closing are still sent.
+        dispatcher.set_light(1, {'hue': 2})
+        self.assertTrue(dispatcher.flush(5))
+        bridge.request.assert_called_with(
+            'PUT', '/api/user/lights/1/state', {'hue': 2})
+        thread = dispatcher._thread
+        if thread is not None:
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+
+    def test_single_light(self):
+        bridge = get_bridge()
+        dispatcher = Dispatcher(bridge)
+        dispatcher.set_lights([1], {'hue': 1})
+        dispatcher.flush(5)
+        bridge.request.assert_called_once_with(
+            'PUT', '/api/user/lights/1/state', {'hue': 1})
+
+    def test_fallback(self):
+        bridge = get_bridge()
+        bridge.create_group.side_effect = OSError
+        dispatcher = Dispatcher(bridge)
+        dispatcher.set_lights([1, 2], {'hue': 1})
+        dispatcher.flush(5)
+        self.assertEqual(bridge.request.call_count, 2)
+
+    def test_overwrite_pending_light_commands(self):
+        bridge = get_bridge({'3': {'name': 'Kitchen', 'lights': ['1', '2']}})
+        dispatcher = Dispatcher(bridge)
+        with dispatcher._condition:
+            dispatcher.set_light(1, {'hue': 5, 'transitiontime': 1})
+            dispatcher.set_light(2, {'hue': 5, 'bri': 6})
+            dispatcher.set_lights([1, 2], {'hue': 1, 'transitiontime': 2})
+            self.assertEqual(dispatcher.queue_depth, 2)
+        dispatcher.flush(5)
+        self.assertEqual(bridge.request.call_args_list, [
+            mock.call('PUT', '/api/user/groups/3/action',
+                      {'hue': 1, 'transitiontime': 2}),
+            mock.call('PUT', '/api/user/lights/2/state', {'bri': 6}),
+        ])
+
+    def test_light_waits_for_group(self):
+        bridge = get_bridge({'3': {'name': 'Kitchen', 'lights': ['1', '2']}})
+        dispatcher = Dispatcher(bridge)
+        dispatcher._buckets['groups'] = TokenBucket(10, burst=1)
+        dispatcher._buckets['groups'].consume()
+        with dispatcher._condition:
+            dispatcher.set_lights([1, 2], {'hue': 1})
+            dispatcher.set_light(1, {'bri': 2})
+        dispatcher.flush(5)
+        self.assertEqual(bridge.request.call_args_list, [
+            mock.call('PUT', '/api/user/groups/3/action', {'hue': 1}),
+            mock.call('PUT', '/api/user/lights/1/state', {'bri': 2}),
+        ])
+
+    def test_group_delta(self):
+        bridge = get_bridge({'3': {'name': 'Kitchen', 'lights': ['1', '2']}})
+        dispatcher = Dispatcher(bridge)
+        dispatcher.set_light(1, {'on': True})
+        dispatcher.flush(5)
+        dispatcher.set_lights([1, 2], {'on': True, 'hue': 1})
+        dispatcher.flush(5)
+        dispatcher.set_lights([1, 2], {'on': True, 'hue': 2})
+        dispatcher.flush(5)
+        dispatcher.set_light(2, {'on': True, 'hue': 2})
+        dispatcher.flush(5)
+        self.assertEqual(bridge.request.call_args_list, [
+            mock.call('PUT', '/api/user/lights/1/state', {'on': True}),
+            mock.call('PUT', '/api/user/groups/3/action',
+                      {'on': True, 'hue': 1}),
+            mock.call('PUT', '/api/user/groups/3/action', {'hue': 2}),
+        ])
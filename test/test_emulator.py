@@ -0,0 +1,210 @@
+from _helper import get_day_night
+from lively_lights.emulator import EmulatedBridge
+from lively_lights.environment import ReachableLights
+from lively_lights.phue import Bridge
+from lively_lights.events import parse_events
+from lively_lights.scenes import SceneSequence
+import http.client
+import json
+import time
+import unittest
+
+
+class EmulatorTestCase(unittest.TestCase):
+
+    emulator_options = {}
+
+    def setUp(self):
+        self.emulator = EmulatedBridge(light_count=3, **self.emulator_options)
+        self.emulator.start()
+        self.bridge = Bridge(self.emulator.address, self.emulator.username,
+                             cache_ttl=0)
+        self.addCleanup(self.bridge.close)
+
+    def tearDown(self):
+        self.emulator.stop()
+
+
+class TestClassEmulatedBridge(EmulatorTestCase):
+
+    def test_lights(self):
+        self.assertEqual([light.light_id for light in self.bridge.lights],
+                         [1, 2, 3])
+        self.assertEqual(self.bridge[2].name, 'Hue color lamp 2')
+
+    def test_set_light(self):
+        light = self.bridge[1]
+        light.on = True
+        light.brightness = 100
+        self.assertEqual(light.on, True)
+        self.assertEqual(light.brightness, 100)
+
+    def test_set_light_invalid_value(self):
+        result = self.bridge.set_light(1, {'sat': 255, 'hue': 5})
+        self.assertEqual(result[0][0]['error']['type'], 7)
+        self.assertEqual(result[0][1],
+                         {'success': {'/lights/1/state/hue': 5}})
+
+    def test_reachable(self):
+        self.emulator.set_reachable(2, False)
+        self.assertEqual(self.bridge[1].reachable, True)
+        self.assertEqual(self.bridge[2].reachable, False)
+
+    def test_groups(self):
+        result = self.bridge.create_group('Kitchen', [1, 2])
+        group_id = int(result[0]['success']['id'])
+        self.bridge.set_group(group_id, 'bri', 10)
+        self.assertEqual(self.bridge[1].brightness, 10)
+        self.assertEqual(self.bridge[3].brightness, 254)
+        self.assertEqual(self.bridge.groups[0].name, 'Kitchen')
+        self.bridge.delete_group(group_id)
+        self.assertEqual(self.bridge.get_group(), {})
+
+    def test_group_0(self):
+        self.bridge.set_group(0, 'on', True)
+        self.assertEqual(self.bridge[3].on, True)
+
+    def test_group_lights(self):
+        self.bridge.create_group('Kitchen', [1, 2])
+        group = self.bridge.groups[0]
+        self.assertIs(group.lights[1], self.bridge[2])
+        self.assertFalse(hasattr(group, '__dict__'))
+        self.assertFalse(hasattr(self.bridge[2], '__dict__'))
+
+    def test_sensors(self):
+        sensor_id, _ = self.bridge.create_sensor(
+            'Switch', 'model', '1.0', 'CLIPGenericStatus', 'unique',
+            'manufacturer', state={'status': 0})
+        self.bridge.set_sensor_state(int(sensor_id), 'status', 1)
+        self.assertEqual(self.bridge.get_sensor(int(sensor_id), 'state'),
+                         {'status': 1})
+
+    def test_schedules(self):
+        self.bridge.create_schedule('Wake up', '2000-01-01T00:00:00', 1,
+                                    {'on': True})
+        self.assertEqual(self.bridge.get_schedule(1, None)['name'],
+                         'Wake up')
+
+    def test_config(self):
+        self.bridge.name = 'Emulator'
+        self.assertEqual(self.bridge.name, 'Emulator')
+
+    def test_scenes(self):
+        self.assertEqual(self.bridge.scenes, [])
+
+    def test_get_api(self):
+        api = self.bridge.get_api()
+        self.assertEqual(len(api['lights']), 3)
+
+    def test_unauthorized_user(self):
+        bridge = Bridge(self.emulator.address, 'xxx', cache_ttl=0)
+        self.addCleanup(bridge.close)
+        self.assertEqual(bridge.get_api()[0]['error']['type'], 1)
+
+    def test_stats(self):
+        self.bridge.get_api()
+        self.bridge.set_light(1, 'on', True)
+        stats = self.emulator.stats()
+        self.assertEqual(stats['GET'], 1)
+        self.assertEqual(stats['PUT lights'], 1)
+
+    def test_keep_alive(self):
+        for _ in range(5):
+            self.bridge.get_api()
+        self.assertEqual(self.bridge.pool_stats()['created'], 1)
+
+    def open_event_stream(self, username):
+        connection = http.client.HTTPConnection(self.emulator.address,
+                                                timeout=5)
+        connection.request('GET', '/eventstream/clip/v2',
+                           headers={'hue-application-key': username})
+        return connection.getresponse()
+
+    def test_event_stream(self):
+        response = self.open_event_stream(self.emulator.username)
+        self.assertEqual(response.getheader('Content-Type'),
+                         'text/event-stream')
+        self.bridge.set_group(0, 'bri', 127)
+        events = parse_events(response)
+        event_id, data = next(events)
+        response.close()
+        event = json.loads(data)[0]
+        self.assertEqual(event['type'], 'update')
+        self.assertEqual([(resource['id_v1'], resource['dimming'])
+                          for resource in event['data']],
+                         [('/lights/{}'.format(light_id),
+                           {'brightness': 50.0})
+                          for light_id in (1, 2, 3)])
+        self.assertEqual(self.emulator.stats()['events'], 1)
+
+    def test_event_stream_unauthorized(self):
+        self.assertEqual(self.open_event_stream('xxx').status, 403)
+
+
+class TestClassEmulatedBridgeLatency(EmulatorTestCase):
+
+    emulator_options = {'latency': 0.05}
+
+    def test_latency(self):
+        begin = time.monotonic()
+        self.bridge.get_api()
+        self.assertGreaterEqual(time.monotonic() - begin, 0.05)
+
+
+class TestClassEmulatedBridgeRateLimitError(EmulatorTestCase):
+
+    emulator_options = {'light_rate': 1, 'rate_limit_mode': 'error'}
+
+    def test_rate_limit(self):
+        self.bridge.set_light(1, 'on', True)
+        result = self.bridge.set_light(1, 'on', True)
+        self.assertEqual(result[0][0]['error']['type'], 901)
+        self.assertEqual(self.emulator.stats()['rate_limited'], 1)
+
+
+class TestClassEmulatedBridgeRateLimitDelay(EmulatorTestCase):
+
+    emulator_options = {'light_rate': 10}
+
+    def test_rate_limit(self):
+        begin = time.monotonic()
+        for _ in range(15):
+            self.bridge.set_light(1, 'on', True)
+        self.assertGreaterEqual(time.monotonic() - begin, 0.4)
+
+
+class TestClassEmulatedBridgeFailures(EmulatorTestCase):
+
+    emulator_options = {'failure_rate': 1, 'failure_mode': 'error'}
+
+    def test_failure(self):
+        self.assertEqual(self.bridge.get_api()[0]['error']['type'], 901)
+        self.assertEqual(self.emulator.stats()['failures'], 1)
+
+
+class TestClassEmulatedBridgeDrop(EmulatorTestCase):
+
+    emulator_options = {'failure_rate': 1}
+
+    def test_failure(self):
+        with self.assertRaises(ConnectionError):
+            self.bridge.get_api()
+
+
+class TestClassEmulatedScene(EmulatorTestCase):
+
+    def test_scene_sequence(self):
+        self.emulator.set_reachable(3, False)
+        reachable_lights = ReachableLights(self.bridge, get_day_night())
+        scene = SceneSequence(self.bridge, reachable_lights, brightness=100,
+                              hue_sequence=(1000, ), sleep_time=0.2,
+                              transition_time=0.1)
+        scene.start(0.5)
+        self.bridge.dispatcher.flush(5)
+        lights = self.emulator.state['lights']
+        self.assertEqual(lights['1']['state']['hue'], 1000)
+        self.assertEqual(lights['2']['state']['bri'], 100)
+        self.assertEqual(lights['3']['state']['hue'], 8418)
+        stats = self.emulator.stats()
+        self.assertEqual(stats['POST groups'], 1)
+        self.assertNotIn('PUT lights', stats)
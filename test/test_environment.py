@@ -1,15 +1,21 @@
 from lively_lights.environment import \
     DayNight, \
     host_up, \
+    HostProber, \
     HostUp, \
     ReachableLights, \
     ReachableLightsFactory, \
     Weather
+from lively_lights.conditions import ConditionEngine
 from _helper import mock_bridge, get_day_night
 from freezegun import freeze_time
+import datetime
 import os
 import pwd
+import socket
+import time
 import unittest
+from unittest import mock
 
 
 INTERNET_CONNECTIFITY = host_up.is_up('8.8.8.8:53')
@@ -68,6 +74,92 @@ class TestClassHostUp(unittest.TestCase):
         self.assertFalse(self.host_up.is_up('192.0.0.1'))
 
 
+class TestClassHostProber(unittest.TestCase):
+
+    def get_prober(self, *addresses, **kwargs):
+        self.states = {}
+        host_up = mock.Mock()
+        host_up.is_up.side_effect = lambda address: self.states[address]
+        return HostProber(addresses, host_up=host_up, **kwargs)
+
+    def test_open_port_keeps_default_timeout(self):
+        with mock.patch('socket.create_connection') as create_connection:
+            self.assertTrue(HostUp()._open_port('192.0.0.1', 22))
+        create_connection.assert_called_once_with(('192.0.0.1', 22),
+                                                  timeout=3)
+        self.assertIsNone(socket.getdefaulttimeout())
+
+    def test_any(self):
+        prober = self.get_prober('a', 'b')
+        self.states = {'a': False, 'b': True}
+        self.assertFalse(prober.is_up())
+        self.assertTrue(prober.probe())
+        self.assertTrue(prober.is_up())
+        self.assertEqual(prober.hosts(), {'a': False, 'b': True})
+
+    def test_all(self):
+        prober = self.get_prober('a', 'b', mode='all')
+        self.states = {'a': False, 'b': True}
+        self.assertFalse(prober.probe())
+        self.states['a'] = True
+        self.assertTrue(prober.probe())
+
+    def test_hysteresis(self):
+        prober = self.get_prober('a', rise=2, fall=3)
+        self.states = {'a': True}
+        self.assertTrue(prober.probe())
+        self.states['a'] = False
+        self.assertTrue(prober.probe())
+        self.assertTrue(prober.probe())
+        self.assertFalse(prober.probe())
+        self.states['a'] = True
+        self.assertFalse(prober.probe())
+        self.assertTrue(prober.probe())
+
+    def test_flapping(self):
+        prober = self.get_prober('a', fall=2)
+        self.states = {'a': True}
+        prober.probe()
+        for up in (False, True, False, True):
+            self.states['a'] = up
+            self.assertTrue(prober.probe())
+
+    def test_subscribe(self):
+        prober = self.get_prober('a', fall=1)
+        callback = mock.Mock()
+        prober.subscribe(callback)
+        self.states = {'a': True}
+        prober.probe()
+        prober.probe()
+        self.states['a'] = False
+        prober.probe()
+        self.assertEqual(callback.call_args_list,
+                         [mock.call(True), mock.call(False)])
+
+    def test_failing_probe(self):
+        prober = self.get_prober('a')
+        with self.assertLogs('lively_lights.environment'):
+            self.assertFalse(prober.probe())
+
+    def test_start(self):
+        prober = self.get_prober('a', interval=0.01)
+        self.states = {'a': True}
+        prober.start()
+        self.assertTrue(prober.is_up())
+        time.sleep(0.1)
+        prober.stop()
+        self.assertGreater(prober.host_up.is_up.call_count, 2)
+
+    def test_addresses(self):
+        prober = HostProber('192.168.3.11:22, 192.168.3.12')
+        self.assertEqual(prober.addresses,
+                         ('192.168.3.11:22', '192.168.3.12'))
+        with self.assertRaises(ValueError):
+            HostProber('')
+        with self.assertRaises(ValueError):
+            HostProber('a', mode='some')
+
+
 class TestClassDayNight(unittest.TestCase):
 
     def setUp(self):
@@ -94,6 +186,56 @@ class TestClassDayNight(unittest.TestCase):
     def test_is_day_close(self):
         self.assertTrue(self.day_night.is_day())
 
+    @freeze_time('2000-01-01 16:27:48.5+01')
+    def test_is_night_after_sunset(self):
+        self.assertTrue(self.day_night.is_night())
+
+    @freeze_time('2000-01-01 12:00:00')
+    def test_next_transition(self):
+        moment, kind = self.day_night.next_transition()
+        self.assertEqual(kind, 'sunset')
+        self.assertEqual(moment.strftime('%Y-%m-%d %H:%M:%S%z'),
+                         '2000-01-01 16:27:48+0100')
+
+    @freeze_time('2000-01-01 20:00:00')
+    def test_next_transition_tomorrow(self):
+        moment, kind = self.day_night.next_transition()
+        self.assertEqual(kind, 'sunrise')
+        self.assertEqual(moment.strftime('%Y-%m-%d %H:%M'),
+                         '2000-01-02 08:09')
+
+    def test_table_built_once(self):
+        with mock.patch.object(self.day_night, '_build_table',
+                               wraps=self.day_night._build_table) as build:
+            with freeze_time('2000-01-01 12:00:00'):
+                for _ in range(10):
+                    self.day_night.is_day()
+                self.day_night.next_transition()
+            self.assertEqual(build.call_count, 1)
+
+    def test_table_rolls(self):
+        day_night = get_day_night()
+        day_night.days = 4
+        with freeze_time('2000-01-01 12:00:00') as frozen:
+            self.assertTrue(day_night.is_day())
+            first = day_night._table
+            frozen.move_to('2000-01-02 12:00:00')
+            self.assertTrue(day_night.is_day())
+            self.assertIs(day_night._table, first)
+            frozen.move_to('2000-01-03 23:00:00')
+            self.assertTrue(day_night.is_night())
+            self.assertIsNot(day_night._table, first)
+            frozen.move_to('2000-06-03 12:00:00')
+            self.assertTrue(day_night.is_day())
+
+    def test_polar(self):
+        day_night = DayNight(78.22, 15.65, 'Arctic/Longyearbyen', 0, days=3)
+        with freeze_time('2000-01-10 12:00:00'):
+            self.assertTrue(day_night.is_night())
+            self.assertIsNone(day_night.next_transition())
+        with freeze_time('2000-06-10 00:00:00'):
+            self.assertTrue(day_night.is_day())
+
     @freeze_time('2000-01-01 23:00:00')
     def test_overview(self):
         self.assertEqual(
@@ -136,8 +278,45 @@ class TestClassReachableLights(unittest.TestCase):
     def test_method_list(self):
         lights = self.get_reachable_lights([1, True], [2, True])
         self.assertEqual(lights.get_light_ids(), [1, 2])
-        self.assertTrue(lights._lights_refresh_state[1][1])
-        self.assertTrue(lights._lights_refresh_state[2][1])
+        self.assertTrue(lights._reachable_state[1])
+        self.assertTrue(lights._reachable_state[2])
+
+    def test_method_is_reachable_one_request(self):
+        lights = self.get_reachable_lights([1, True], [2, False], [3, True])
+        self.assertTrue(lights.is_reachable(1))
+        self.assertFalse(lights.is_reachable(2))
+        self.assertTrue(lights.is_reachable(3))
+        self.assertFalse(lights.is_reachable(4))
+        lights._bridge.get_light.assert_called_once_with()
+
+    def test_method_is_reachable_refresh_interval(self):
+        lights = self.get_reachable_lights([1, True], refresh_interval=0)
+        lights.is_reachable(1)
+        lights.is_reachable(1)
+        self.assertEqual(lights._bridge.get_light.call_count, 2)
+
+    def test_method_refresh_reachable_forget_shadow(self):
+        lights = self.get_reachable_lights([1, False], [2, True])
+        lights.refresh_reachable()
+        lights._bridge.get_light.return_value['1']['state']['reachable'] = \
+            True
+        lights.refresh_reachable()
+        lights._bridge.dispatcher.shadow.forget.assert_called_once_with([1])
+
+    def test_method_start_refresh_thread(self):
+        lights = self.get_reachable_lights([1, True], refresh_interval=0.01)
+        lights.start_refresh_thread()
+        time.sleep(0.1)
+        lights.stop_refresh_thread()
+        self.assertGreater(lights._bridge.get_light.call_count, 2)
+
+    def test_method_is_reachable_refresh_thread(self):
+        lights = self.get_reachable_lights([1, True])
+        lights.start_refresh_thread()
+        lights._reachable_refreshed_at -= 120
+        self.assertTrue(lights.is_reachable(1))
+        lights._bridge.get_light.assert_called_once_with()
+        lights.stop_refresh_thread()
 
     def test_iterator_all_reachable(self):
         lights = self.get_reachable_lights([1, True], [2, True])
@@ -219,6 +398,26 @@ class TestClassReachableLights(unittest.TestCase):
         self.assertEqual(lights._bridge[1].on, False)
         self.assertTrue(lights._lights_turn_off_state[1])
 
+    def test_conditions_evaluated_at_transitions(self):
+        day_night = mock.Mock()
+        day_night.is_night.return_value = False
+        day_night.next_transition.return_value = (
+            datetime.datetime.now(datetime.timezone.utc) +
+            datetime.timedelta(hours=1), 'sunset')
+        lights = ReachableLights(mock_bridge([[1, True]]), day_night,
+                                 not_at_night=True)
+        for _ in range(10):
+            self.assertEqual(lights.get_light_ids(), [1])
+        day_night.is_night.assert_called_once_with()
+        self.assertEqual([condition.name for condition
+                          in lights.conditions.conditions], ['night'])
+
+    def test_conditions_shared(self):
+        engine = ConditionEngine()
+        lights = ReachableLights(mock_bridge([[1, True]]), get_day_night(),
+                                 not_at_night=True, conditions=engine)
+        self.assertIs(lights.conditions, engine)
+
 
 class TestClassReachableLightsFactory(unittest.TestCase):
 
@@ -0,0 +1,218 @@
+from lively_lights.emulator import EmulatedBridge
+from lively_lights.environment import ReachableLights
+from lively_lights import events
+from lively_lights.cache import UNKNOWN
+from lively_lights.events import EventStream, parse_events, translate
+from lively_lights.phue import Bridge
+from unittest import mock
+import time
+import unittest
+
+
+def wait_for(function, timeout=5):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if function():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestFunctions(unittest.TestCase):
+
+    def test_parse_events(self):
+        lines = [b': hi\n', b'\n',
+                 b'id: 1:0\n', b'data: [1,\n', b'data: 2]\n', b'\n',
+                 b'data:3\r\n', b'\r\n']
+        self.assertEqual(list(parse_events(lines)),
+                         [('1:0', '[1,\n2]'), ('1:0', '3')])
+
+    def test_translate_light(self):
+        self.assertEqual(translate({
+            'id_v1': '/lights/3',
+            'type': 'light',
+            'on': {'on': True},
+            'dimming': {'brightness': 0.2},
+            'color': {'xy': {'x': 0.1, 'y': 0.2}},
+            'color_temperature': {'mirek': None, 'mirek_valid': False},
+        }), [
+            (['lights', '3', 'state', 'on'], True),
+            (['lights', '3', 'state', 'bri'], 1),
+            (['lights', '3', 'state', 'xy'], [0.1, 0.2]),
+            (['lights', '3', 'state', 'hue'], UNKNOWN),
+            (['lights', '3', 'state', 'sat'], UNKNOWN),
+            (['lights', '3', 'state', 'colormode'], UNKNOWN),
+        ])
+
+    def test_translate_reachable(self):
+        self.assertEqual(translate({
+            'id_v1': '/lights/3',
+            'type': 'zigbee_connectivity',
+            'status': 'connectivity_issue',
+        }), [(['lights', '3', 'state', 'reachable'], False)])
+
+    def test_translate_group(self):
+        self.assertEqual(translate({
+            'id_v1': '/groups/2',
+            'type': 'grouped_light',
+            'on': {'on': False},
+        }), [(['groups', '2', 'action', 'on'], False)])
+
+    def test_translate_other(self):
+        self.assertEqual(translate({'id_v1': '/sensors/2',
+                                    'type': 'motion'}), [])
+        self.assertEqual(translate({'type': 'entertainment'}), [])
+
+
+class TestClassEventStream(unittest.TestCase):
+
+    def setUp(self):
+        self.emulator = EmulatedBridge(light_count=3).start()
+        self.bridge = Bridge(self.emulator.address, self.emulator.username,
+                             cache_ttl=0.01)
+        self.addCleanup(self.bridge.close)
+        self.stream = EventStream(self.bridge, secure=False,
+                                  retry_interval=0.01)
+
+    def tearDown(self):
+        self.stream.stop()
+        self.emulator.stop()
+
+    def set_brightness(self, light_id, brightness):
+        # Another app changes the light.
+        other = Bridge(self.emulator.address, self.emulator.username,
+                       cache_ttl=0)
+        other.set_light(light_id, 'bri', brightness)
+        other.close()
+
+    def test_push(self):
+        self.stream.start()
+        self.assertTrue(self.stream.wait_connected(5))
+        self.assertTrue(self.bridge.state_cache.live)
+        self.assertEqual(self.bridge.get_light(1, 'bri'), 254)
+        self.set_brightness(1, 42)
+        self.assertTrue(wait_for(
+            lambda: self.bridge.get_light(1, 'bri') == 42))
+        # The snapshot does not expire while the stream is connected.
+        stats = self.bridge.state_cache.stats()
+        self.assertEqual(stats['fetches'], 1)
+        self.assertGreater(stats['pushed'], 0)
+        self.assertEqual(self.stream.stats()['connects'], 1)
+
+    def test_color(self):
+        self.stream.start()
+        self.assertTrue(self.stream.wait_connected(5))
+        light = self.bridge[1]
+        self.assertEqual(light.colormode, 'ct')
+        other = Bridge(self.emulator.address, self.emulator.username,
+                       cache_ttl=0)
+        other.set_light(1, {'hue': 1000, 'sat': 200})
+        other.close()
+        self.assertTrue(wait_for(lambda: light.hue == 1000))
+        self.assertEqual(light.saturation, 200)
+        self.assertEqual(light.colormode, 'hs')
+        stats = self.bridge.state_cache.stats()
+        self.assertEqual(stats['fetches'], 1)
+        self.assertGreater(stats['refreshes'], 0)
+
+    def test_shadow(self):
+        self.stream.start()
+        self.assertTrue(self.stream.wait_connected(5))
+        dispatcher = self.bridge.dispatcher
+        dispatcher.set_light(1, {'on': True})
+        self.assertTrue(dispatcher.flush(5))
+        # Another app switches the light off.
+        other = Bridge(self.emulator.address, self.emulator.username,
+                       cache_ttl=0)
+        other.set_light(1, 'on', False)
+        other.close()
+        self.assertTrue(wait_for(
+            lambda: not self.bridge.get_light(1, 'on')))
+        dispatcher.set_light(1, {'on': True})
+        self.assertTrue(dispatcher.flush(5))
+        self.assertEqual(dispatcher.stats()['suppressed'], 0)
+        self.assertTrue(self.emulator.state['lights']['1']['state']['on'])
+
+    def test_listener(self):
+        callback = mock.Mock()
+        self.stream.subscribe(callback)
+        self.stream.start()
+        self.assertTrue(self.stream.wait_connected(5))
+        self.bridge.get_api()
+        self.bridge.get_light(1)
+        self.emulator.set_reachable(2, False)
+        self.assertTrue(wait_for(lambda: callback.called))
+        callback.assert_called_with(
+            [(['lights', '2', 'state', 'reachable'], False)])
+
+    def test_reachable_lights(self):
+        reachable_lights = ReachableLights(self.bridge, None,
+                                           refresh_interval=3600)
+        self.stream.start()
+        self.assertTrue(self.stream.wait_connected(5))
+        self.assertEqual(reachable_lights.get_light_ids(), [1, 2, 3])
+        self.emulator.set_reachable(2, False)
+        self.assertTrue(wait_for(
+            lambda: reachable_lights.get_light_ids() == [1, 3]))
+
+    def test_add_invalidates(self):
+        self.stream.start()
+        self.assertTrue(self.stream.wait_connected(5))
+        self.bridge.get_light(1)
+        self.emulator.handle('POST', '/api/{}/groups'.format(
+            self.emulator.username), b'{"name": "Kitchen", "lights": ["1"]}')
+        self.assertTrue(wait_for(
+            lambda: self.bridge.state_cache.stats()['invalidations'] > 1))
+
+    def test_stop(self):
+        self.stream.start()
+        self.assertTrue(self.stream.wait_connected(5))
+        self.stream.stop()
+        self.assertFalse(self.stream.connected)
+        self.assertFalse(self.bridge.state_cache.live)
+
+    def test_thread_ends(self):
+        def loop():
+            self.stream._set_connected(True)
+        with mock.patch.object(self.stream, '_loop', loop):
+            self.stream.start()
+            self.stream._thread.join(5)
+        self.assertFalse(self.stream.connected)
+        self.assertFalse(self.bridge.state_cache.live)
+
+    def test_fork(self):
+        self.stream._set_connected(True)
+        events._after_fork()
+        self.assertFalse(self.stream.connected)
+        self.assertFalse(self.bridge.state_cache.live)
+        self.assertIsNone(self.stream._thread)
+
+    def test_reconnect(self):
+        self.stream.start()
+        self.assertTrue(self.stream.wait_connected(5))
+        for messages in list(self.emulator._streams):
+            # The bridge closes the stream.
+            messages.put(None)
+        self.assertTrue(wait_for(
+            lambda: self.stream.stats()['connects'] == 2))
+        self.assertTrue(self.stream.connected)
+
+    def test_unsupported(self):
+        self.emulator.event_stream = False
+        with self.assertLogs('lively_lights.events', 'INFO'):
+            self.stream.start()
+            self.assertTrue(wait_for(lambda: self.stream.supported is False))
+            self.stream._thread.join(5)
+        self.assertFalse(self.bridge.state_cache.live)
+
+    def test_unauthorized(self):
+        self.bridge.username = 'xxx'
+        with self.assertLogs('lively_lights.events', 'WARNING'):
+            self.stream.start()
+            self.assertTrue(wait_for(
+                lambda: self.stream.stats()['errors'] > 0))
+        self.assertFalse(self.stream.connected)
+
+
+if __name__ == '__main__':
+    unittest.main()
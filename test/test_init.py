@@ -1,9 +1,18 @@
 from _helper import config_file
+from lively_lights import phue
 from unittest import mock
 import lively_lights
 import os
+import subprocess
+import sys
 import unittest
 
+IMPORT_TIME_BUDGET = 0.1
+"""Seconds `import lively_lights` may take."""
+
+HEAVY_MODULES = ('astral', 'colors', 'daemon', 'lockfile', 'ping3',
+                 'pygments', 'pyowm', 'requests', 'yaml')
+
 
 class TestClassHue(unittest.TestCase):
 
@@ -14,14 +23,30 @@ class TestClassHue(unittest.TestCase):
 
         lively_lights.Hue(config_environ_prefix='LL')
         bridge.assert_called_with('1.2.3.4', 'test', colorize_output=False,
-                                  verbosity_level=0)
+                                  verbosity_level=0, pool_size=4,
+                                  light_rate=10, group_rate=1, cache_ttl=1,
+                                  shadow_ttl=30)
 
     @mock.patch('lively_lights.Bridge')
     def test_ini(self, bridge):
         lively_lights.Hue(config_environ_prefix='XX',
                           config_file_path=config_file)
         bridge.assert_called_with('192.168.3.60', 'joseffriedrich',
-                                  colorize_output=False, verbosity_level=0)
+                                  colorize_output=False, verbosity_level=0,
+                                  pool_size=4, light_rate=10, group_rate=1,
+                                  cache_ttl=1, shadow_ttl=30)
+
+    @mock.patch('lively_lights.events.EventStream')
+    @mock.patch('lively_lights.Bridge')
+    def test_event_stream(self, bridge, EventStream):
+        hue = lively_lights.Hue(config_environ_prefix='XX',
+                                config_file_path=config_file,
+                                event_stream=True)
+        EventStream.assert_called_once_with(hue.bridge)
+        EventStream.return_value.start.assert_not_called()
+        self.assertEqual(len(hue.event_streams), 1)
+        hue.start_event_streams()
+        EventStream.return_value.start.assert_called_once_with()
 
 
 class TestClassConfiguration(unittest.TestCase):
@@ -46,3 +71,34 @@ class TestClassConfiguration(unittest.TestCase):
     def test_float_conversion(self):
         config = lively_lights.Configuration(config_file_path=config_file)
         self.assertEqual(config.get('location', 'latitude'), 49.455556)
+
+
+class TestLazyImports(unittest.TestCase):
+
+    def run_python(self, code, *options):
+        return subprocess.run([sys.executable] + list(options) + ['-c', code],
+                              check=True, encoding='utf-8',
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def test_parse_args(self):
+        run = self.run_python(
+            'import sys, lively_lights\n'
+            'lively_lights.get_parser().parse_args(["info", "daynight"])\n'
+            'print(" ".join(sys.modules))'
+        )
+        modules = {module.split('.')[0] for module in run.stdout.split()}
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, modules)
+
+    def test_import_time(self):
+        run = self.run_python('import lively_lights', '-X', 'importtime')
+        line = run.stderr.strip().splitlines()[-1]
+        _, cumulative, module = line.split('|')
+        self.assertEqual(module.strip(), 'lively_lights')
+        self.assertLess(int(cumulative) / 1e6, IMPORT_TIME_BUDGET)
+
+    def test_lazy_attributes(self):
+        self.assertIs(lively_lights.Bridge, phue.Bridge)
+        self.assertTrue(lively_lights.__version__)
+        with self.assertRaises(AttributeError):
+            lively_lights.xxx
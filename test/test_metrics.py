@@ -0,0 +1,175 @@
+from lively_lights._utils import RestDebug
+from lively_lights.emulator import EmulatedBridge
+from lively_lights.metrics import Histogram, RequestEvent, RequestHook, \
+                                  RequestMetrics, endpoint, format_stats, \
+                                  light_id
+from lively_lights.phue import Bridge
+from unittest import mock
+import unittest
+
+
+class TestFunctions(unittest.TestCase):
+
+    def test_endpoint(self):
+        self.assertEqual(endpoint('/api/user/lights/3/state'),
+                         '/lights/{id}/state')
+        self.assertEqual(endpoint('/api/user/groups/0/action'),
+                         '/groups/{id}/action')
+        self.assertEqual(endpoint('/api/user'), '/')
+        self.assertEqual(endpoint('/api'), '/')
+
+    def test_light_id(self):
+        self.assertEqual(light_id('/api/user/lights/3/state'), 3)
+        self.assertEqual(light_id('/api/user/lights'), None)
+        self.assertEqual(light_id('/api/user/groups/3/action'), None)
+
+    def test_format_stats(self):
+        out = format_stats('cache', {'hits': 2, 'ratio': 0.5, 'name': 'x'})
+        self.assertIn('# TYPE lively_lights_cache_hits gauge\n', out)
+        self.assertIn('lively_lights_cache_hits 2\n', out)
+        self.assertIn('lively_lights_cache_ratio 0.5\n', out)
+        self.assertNotIn('name', out)
+        self.assertEqual(format_stats('cache', {}), '')
+
+
+class TestClassHistogram(unittest.TestCase):
+
+    def test_cumulative(self):
+        histogram = Histogram((0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative(),
+                         [(0.1, 2), (1, 3), ('+Inf', 4)])
+        self.assertEqual(histogram.count, 4)
+        self.assertAlmostEqual(histogram.sum, 3.65)
+
+
+def get_event(path='/api/user/lights/1/state', status=200, result=None,
+              error=None, latency=0.02):
+    event = RequestEvent('PUT', path, {'on': True}, '{"on": true}')
+    event.status = status
+    event.response_bytes = 10
+    event.latency = latency
+    event.result = result
+    event.error = error
+    return event
+
+
+class TestClassRequestMetrics(unittest.TestCase):
+
+    def test_snapshot(self):
+        metrics = RequestMetrics()
+        metrics.after(get_event(result=[{'success': {}}]))
+        metrics.after(get_event(result=[{'error': {'type': 201}}]))
+        metrics.after(get_event(status=None, error=OSError(), latency=None))
+        snapshot = metrics.snapshot()
+        key = ('PUT', '/lights/{id}/state')
+        self.assertEqual(snapshot['requests'],
+                         {key + (200, ): 2, key + ('error', ): 1})
+        self.assertEqual(snapshot['errors'],
+                         {key + ('bridge', ): 1, key + ('OSError', ): 1})
+        self.assertEqual(snapshot['lights'], {1: 3})
+        self.assertEqual(snapshot['bytes'], {'sent': 36, 'received': 30})
+        self.assertEqual(snapshot['latency'][key]['count'], 2)
+        metrics.reset()
+        self.assertEqual(metrics.snapshot()['requests'], {})
+
+    def test_prometheus(self):
+        metrics = RequestMetrics(buckets=(0.01, 0.1))
+        metrics.after(get_event())
+        out = metrics.prometheus()
+        labels = 'endpoint="/lights/{id}/state",method="PUT"'
+        self.assertIn('# TYPE lively_lights_request_duration_seconds '
+                      'histogram', out)
+        self.assertIn('lively_lights_request_duration_seconds_bucket{'
+                      + labels + ',le="0.01"} 0', out)
+        self.assertIn('lively_lights_request_duration_seconds_bucket{'
+                      + labels + ',le="+Inf"} 1', out)
+        self.assertIn('lively_lights_request_duration_seconds_count{'
+                      + labels + '} 1', out)
+        self.assertIn('lively_lights_requests_total{' + labels
+                      + ',status="200"} 1', out)
+        self.assertIn('lively_lights_light_requests_total{light="1"} 1', out)
+        self.assertIn('lively_lights_bytes_total{direction="sent"} 12', out)
+        self.assertTrue(out.endswith('\n'))
+
+
+class TestClassBridgeHooks(unittest.TestCase):
+
+    def setUp(self):
+        self.emulator = EmulatedBridge(light_count=3)
+        self.emulator.start()
+        self.bridge = Bridge(self.emulator.address, self.emulator.username,
+                             cache_ttl=0)
+        self.addCleanup(self.bridge.close)
+
+    def tearDown(self):
+        self.emulator.stop()
+
+    def test_hook(self):
+        hook = mock.Mock()
+        self.bridge.add_hook(hook)
+        self.bridge.set_light(1, 'bri', 100)
+        before = hook.before.call_args[0][0]
+        event = hook.after.call_args[0][0]
+        self.assertIs(before, event)
+        self.assertEqual(event.method, 'PUT')
+        self.assertEqual(event.path, '/api/{}/lights/1/state'.format(
+            self.emulator.username))
+        self.assertEqual(event.data, {'bri': 100})
+        self.assertEqual(event.request_bytes, len('{"bri": 100}'))
+        self.assertEqual(event.status, 200)
+        self.assertGreater(event.response_bytes, 0)
+        self.assertGreater(event.latency, 0)
+        self.assertIn('success', event.result[0])
+        self.assertIsNone(event.error)
+
+        self.bridge.remove_hook(hook)
+        self.bridge.set_light(1, 'bri', 110)
+        self.assertEqual(hook.after.call_count, 1)
+
+    def test_failing_hook(self):
+        hook = mock.Mock()
+        hook.after.side_effect = RuntimeError
+        self.bridge.add_hook(hook)
+        with self.assertLogs('phue'):
+            result = self.bridge.set_light(1, 'bri', 100)
+        self.assertIn('success', result[0][0])
+
+    def test_error(self):
+        hook = RequestHook()
+        hook.after = mock.Mock()
+        self.bridge.add_hook(hook)
+        self.emulator.stop()
+        with self.assertRaises(Exception):
+            self.bridge.request('GET', '/api/user/lights')
+        event = hook.after.call_args[0][0]
+        self.assertIsNotNone(event.error)
+        self.assertIsNone(event.status)
+
+    @mock.patch('lively_lights.phue.RequestEvent')
+    def test_no_hooks(self, Event):
+        self.assertEqual(self.bridge.hooks, ())
+        self.bridge.set_light(1, 'bri', 100)
+        Event.assert_not_called()
+
+    def test_metrics(self):
+        metrics = RequestMetrics()
+        self.bridge.add_hook(metrics)
+        self.bridge.set_light(1, 'bri', 100)
+        self.bridge.set_light(2, 'bri', 100)
+        self.assertEqual(metrics.snapshot()['lights'], {1: 1, 2: 1})
+
+    def test_rest_debug(self):
+        bridge = Bridge(self.emulator.address, self.emulator.username,
+                        verbosity_level=2)
+        self.addCleanup(bridge.close)
+        self.assertIsInstance(bridge.hooks[0], RestDebug)
+        with mock.patch('builtins.print') as print_:
+            bridge.set_light(1, 'bri', 100)
+        self.assertIn('PUT lights/1/state', print_.call_args_list[0][0][0])
+        self.assertIn('success', print_.call_args_list[1][0][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+from _helper import config_file
+from lively_lights import Hue, types
+from lively_lights.emulator import EmulatedBridge
+from lively_lights.environment import ReachableLights
+from lively_lights.multibridge import MultiBridge, split_light_ids, sum_stats
+from lively_lights.phue import Bridge
+from lively_lights.scenes import SceneSequence
+from unittest import mock
+import os
+import tempfile
+import unittest
+
+
+class TestFunctions(unittest.TestCase):
+
+    def test_split_light_ids(self):
+        self.assertEqual(
+            split_light_ids([('a', 1), ('b', 1), ('a', 2)]),
+            {'a': [1, 2], 'b': [1]})
+
+    def test_sum_stats(self):
+        self.assertEqual(
+            sum_stats([{'sent': 1, 'max_queue_depth': 3, 'name': 'x'},
+                       {'sent': 2, 'max_queue_depth': 2}]),
+            {'sent': 3, 'max_queue_depth': 3})
+
+    def test_light_id(self):
+        self.assertEqual(types.light_id('living:3'), ('living', 3))
+        self.assertEqual(types.light_id(['living', '3']), ('living', 3))
+        self.assertEqual(types.light_id_comma('a:1,b:2'),
+                         (('a', 1), ('b', 2)))
+        with self.assertRaises(ValueError):
+            types.light_id('living:0')
+        with self.assertRaises(ValueError):
+            types.light_id(':1')
+
+
+class TestClassMultiBridge(unittest.TestCase):
+
+    def setUp(self):
+        self.emulators = {
+            'living': EmulatedBridge(light_count=3).start(),
+            'bedroom': EmulatedBridge(light_count=2).start(),
+        }
+        self.bridge = MultiBridge(
+            (name, Bridge(emulator.address, emulator.username, cache_ttl=0,
+                          shadow_ttl=0))
+            for name, emulator in self.emulators.items())
+        self.addCleanup(self.bridge.close)
+
+    def tearDown(self):
+        for emulator in self.emulators.values():
+            emulator.stop()
+
+    def light_state(self, name, light_id):
+        return self.emulators[name].state['lights'][str(light_id)]['state']
+
+    def test_invalid_names(self):
+        with self.assertRaises(ValueError):
+            MultiBridge({})
+        with self.assertRaises(ValueError):
+            MultiBridge({'a:b': mock.Mock()})
+
+    def test_lights(self):
+        light_ids = [light.light_id for light in self.bridge.lights]
+        self.assertEqual(light_ids, [('living', 1), ('living', 2),
+                                     ('living', 3), ('bedroom', 1),
+                                     ('bedroom', 2)])
+        light = self.bridge[('bedroom', 2)]
+        self.assertEqual(light.light_id, ('bedroom', 2))
+        light.brightness = 100
+        self.assertEqual(self.light_state('bedroom', 2)['bri'], 100)
+        self.assertNotEqual(self.light_state('living', 2)['bri'], 100)
+
+    def test_get_light(self):
+        lights = self.bridge.get_light()
+        self.assertEqual(len(lights), 5)
+        self.assertIn(('bedroom', 2), lights)
+        self.assertEqual(self.bridge.get_light(('living', 1), 'name'),
+                         lights[('living', 1)]['name'])
+
+    def test_dispatcher(self):
+        self.bridge.dispatcher.set_lights(
+            [('living', 1), ('bedroom', 1), ('bedroom', 2)], {'bri': 42})
+        self.bridge.dispatcher.set_light(('living', 2), {'bri': 43})
+        self.assertTrue(self.bridge.dispatcher.flush(5))
+        self.assertEqual(self.light_state('living', 1)['bri'], 42)
+        self.assertEqual(self.light_state('bedroom', 2)['bri'], 42)
+        self.assertEqual(self.light_state('living', 2)['bri'], 43)
+        self.assertNotEqual(self.light_state('living', 3)['bri'], 42)
+        stats = self.bridge.dispatcher.stats()
+        self.assertEqual(stats['queue_depth'], 0)
+        self.assertEqual(stats['lights_sent'] + stats['groups_sent'],
+                         sum(s['lights_sent'] + s['groups_sent']
+                             for s in self.bridge.stats().values()))
+
+    def test_reachable_lights(self):
+        self.emulators['living'].set_reachable(2, False)
+        reachable_lights = ReachableLights(self.bridge, None)
+        self.assertEqual(reachable_lights.get_light_ids(),
+                         [('living', 1), ('living', 3), ('bedroom', 1),
+                          ('bedroom', 2)])
+        reachable_lights.light_ids = [('bedroom', 2)]
+        self.assertEqual(reachable_lights.get_light_ids(), [('bedroom', 2)])
+
+    def test_scene(self):
+        reachable_lights = ReachableLights(self.bridge, None)
+        scene = SceneSequence(self.bridge, reachable_lights, brightness=77,
+                              sleep_time=0.1, transition_time=0.1)
+        scene.start(0.1)
+        self.assertTrue(self.bridge.dispatcher.flush(5))
+        for name, light_id in reachable_lights.get_light_ids():
+            self.assertEqual(self.light_state(name, light_id)['bri'], 77)
+
+    def test_hooks(self):
+        hook = mock.Mock()
+        self.bridge.add_hook(hook)
+        self.bridge.get_light()
+        self.assertEqual(hook.after.call_count, 2)
+        self.bridge.remove_hook(hook)
+        self.bridge.get_light()
+        self.assertEqual(hook.after.call_count, 2)
+
+
+class TestClassHue(unittest.TestCase):
+
+    @mock.patch('lively_lights.Bridge')
+    def test_bridge_sections(self, bridge):
+        with open(config_file) as ini:
+            config = ini.read()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'lively-lights.ini')
+            with open(path, 'w') as ini:
+                ini.write(config)
+                ini.write('\n[bridge:living]\nip = 192.168.3.60\n'
+                          'username = one\n'
+                          '\n[bridge:bedroom]\nip = 192.168.3.61\n'
+                          'username = two\n')
+            hue = Hue(config_environ_prefix='XX', config_file_path=path)
+        self.assertIsInstance(hue.bridge, MultiBridge)
+        self.assertEqual(list(hue.bridge.bridges), ['living', 'bedroom'])
+        self.assertEqual(bridge.call_args_list[1][0],
+                         ('192.168.3.61', 'two'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+from lively_lights.emulator import EmulatedBridge
+from lively_lights.environment import ReachableLights
+from lively_lights.orchestrator import Orchestrator
+from lively_lights.phue import Bridge
+from unittest import mock
+import unittest
+
+
+def sequence(brightness):
+    return [{
+        'scene_name': 'sequence',
+        'duration': 0.3,
+        'properties': {
+            'brightness': brightness,
+            'sleep_time': 0.1,
+            'transition_time': 0.1,
+        },
+    }]
+
+
+class TestClassOrchestrator(unittest.TestCase):
+
+    def setUp(self):
+        self.emulator = EmulatedBridge(light_count=4).start()
+        self.bridge = Bridge(self.emulator.address, self.emulator.username,
+                             cache_ttl=0)
+        self.addCleanup(self.bridge.close)
+        self.orchestrator = Orchestrator(self.bridge)
+
+    def tearDown(self):
+        self.orchestrator.stop()
+        self.emulator.stop()
+
+    def brightness(self, light_id):
+        return self.emulator.state['lights'][str(light_id)]['state']['bri']
+
+    def test_rooms(self):
+        bedroom = self.orchestrator.add_room('bedroom', [1, 2],
+                                             scene_configs=sequence(10))
+        self.orchestrator.add_room('living', [3, 4], weight=2,
+                                   scene_configs=sequence(20))
+        self.assertIs(bedroom.launcher.scheduler, self.orchestrator.scheduler)
+        self.orchestrator.start(endless=False)
+        self.assertTrue(self.orchestrator.join(10))
+        self.assertTrue(self.bridge.dispatcher.flush(5))
+        self.assertEqual([self.brightness(light_id)
+                          for light_id in range(1, 5)], [10, 10, 20, 20])
+
+        stats = self.orchestrator.stats()
+        self.assertEqual(set(stats), {'bedroom', 'living'})
+        self.assertGreater(stats['bedroom']['queued'], 0)
+        self.assertEqual(stats['living']['weight'], 2)
+        self.assertIn('sent_per_second', stats['living'])
+        self.assertIsNone(stats['living']['scene'])
+
+    def test_shared_bridge(self):
+        room = self.orchestrator.add_room('bedroom', [1],
+                                          scene_configs=sequence(10))
+        bridge = room.launcher.bridge
+        self.assertIs(bridge.state_cache, self.bridge.state_cache)
+        self.assertIs(bridge.connection_pool, self.bridge.connection_pool)
+        self.assertIs(bridge.dispatcher, room.flow)
+        self.assertEqual(bridge[1].light_id, 1)
+
+    def test_reachable_lights_object(self):
+        reachable_lights = ReachableLights(self.bridge, None, light_ids=[1])
+        room = self.orchestrator.add_room('bedroom', reachable_lights,
+                                          scene_configs=sequence(10))
+        self.assertIs(room.reachable_lights, reachable_lights)
+
+    def test_duplicate_room(self):
+        self.orchestrator.add_room('bedroom', [1])
+        with self.assertRaises(ValueError):
+            self.orchestrator.add_room('bedroom', [2])
+
+    def test_stop(self):
+        self.orchestrator.add_room('bedroom', [1, 2],
+                                   scene_configs=sequence(10))
+        self.orchestrator.start(endless=True)
+        self.orchestrator.stop()
+        self.assertTrue(self.orchestrator.join(0))
+        self.assertFalse(self.orchestrator.scheduler.running)
+
+    def test_failing_room(self):
+        room = self.orchestrator.add_room('bedroom', [1])
+        room.launcher.launch = mock.Mock(side_effect=RuntimeError)
+        with self.assertLogs('lively_lights.orchestrator'):
+            self.orchestrator.start(endless=False)
+            self.orchestrator.join(5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+from lively_lights._random import Generator
+import unittest
+
+
+class TestClassGenerator(unittest.TestCase):
+
+    def test_integers(self):
+        values = Generator().integers(3, 5, 1000)
+        self.assertEqual(len(values), 1000)
+        self.assertEqual(set(values), {3, 4, 5})
+
+    def test_times(self):
+        values = Generator().times(1, 1.5, 1000, decimal_places=1)
+        self.assertEqual(set(values), {1.0, 1.1, 1.2, 1.3, 1.4, 1.5})
+
+    def test_time(self):
+        value = Generator().time(1, 2, decimal_places=2)
+        self.assertGreaterEqual(value, 1)
+        self.assertLessEqual(value, 2)
+        self.assertEqual(value, round(value, 2))
+
+    def test_seed(self):
+        self.assertEqual(Generator(7).integers(0, 65535, 10),
+                         Generator(7).integers(0, 65535, 10))
+        self.assertEqual(Generator(7).hue(), Generator(7).hue())
+
+
+if __name__ == '__main__':
+    unittest.main()
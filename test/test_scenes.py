@@ -1,12 +1,15 @@
-from _helper import get_reachable_lights
+from _helper import FakeClock, get_reachable_lights
 from lively_lights import scenes, types
 from lively_lights.scenes import Launcher, \
                                  Scene, \
                                  SceneBreath, \
                                  ScenePendulum, \
                                  SceneSequence
+from lively_lights.conditions import ConditionEngine
+from lively_lights.scheduler import Scheduler
 import unittest
 from unittest import mock
+import threading
 import time
 import os
 
@@ -80,6 +83,43 @@ class TestClassSceneBreath(unittest.TestCase):
         self.assertTrue(scene.hue_range)
         self.assertTrue(scene.time_range)
 
+    @mock.patch('lively_lights.scenes.set_light_multiple')
+    def test_start_many_lights(self, set_light_multiple):
+        light_ids = list(range(1, 101))
+        reachable_lights = get_reachable_lights(light_ids)
+        scene = SceneBreath(mock.Mock(), reachable_lights,
+                            time_range=(0.3, 0.4))
+        threads = threading.active_count()
+        thread = threading.Thread(target=scene.start, args=(1, ))
+        thread.start()
+        time.sleep(0.5)
+        self.assertEqual(threading.active_count(), threads + 1)
+        thread.join()
+        called = [call[0][1] for call in set_light_multiple.call_args_list]
+        for light_id in light_ids:
+            self.assertGreaterEqual(called.count(light_id), 2)
+        self.assertEqual(scene._timers, {})
+        self.assertEqual(len(scene.scheduler), 0)
+
+    @mock.patch('lively_lights.scenes.set_light_multiple')
+    def test_shared_scheduler(self, set_light_multiple):
+        scheduler = Scheduler()
+        scheduler.start()
+        scenes = [
+            SceneBreath(mock.Mock(), get_reachable_lights([1, 2]),
+                        scheduler=scheduler, time_range=(0.3, 0.4))
+            for _ in range(2)
+        ]
+        threads = [threading.Thread(target=scene.start, args=(0.5, ))
+                   for scene in scenes]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        scheduler.stop()
+        self.assertGreaterEqual(set_light_multiple.call_count, 4)
+        self.assertEqual(len(scheduler), 0)
+
 
 class TestClassScenePendulum(unittest.TestCase):
 
@@ -120,10 +160,10 @@ class TestClassSceneSequence(unittest.TestCase):
         self.assertTrue(scene.sleep_time)
         self.assertTrue(scene.transition_time)
 
-    @mock.patch('lively_lights.scenes.set_light_multiple')
-    def test_start(self, set_light_multiple):
+    @mock.patch('lively_lights.scenes.set_lights_multiple')
+    def test_start(self, set_lights_multiple):
         reachable_lights = mock.Mock()
-        reachable_lights.get_light_objects.return_value = [mock.Mock()]
+        reachable_lights.get_light_ids.return_value = [1, 2]
         scene = SceneSequence(
             mock.Mock(),
             reachable_lights,
@@ -133,7 +173,9 @@ class TestClassSceneSequence(unittest.TestCase):
             transition_time=0.5,
         )
         scene.start(5)
-        call_list = set_light_multiple.call_args_list
+        call_list = set_lights_multiple.call_args_list
+
+        self.assertEqual(call_list[0][0][1], [1, 2])
 
         self.assertEqual(call_list[0][0][2]['hue'], 1)
         self.assertEqual(call_list[1][0][2]['hue'], 100)
@@ -143,6 +185,244 @@ class TestClassSceneSequence(unittest.TestCase):
         self.assertEqual(call_list[0][0][2]['transitiontime'], 5)
 
 
+class TestClassSceneDeadlines(unittest.TestCase):
+
+    def test_sequence(self):
+        fake = FakeClock()
+        reachable_lights = mock.Mock()
+        reachable_lights.get_light_ids.return_value = [1, 2]
+        scene = SceneSequence(mock.Mock(), reachable_lights, clock=fake.clock,
+                              sleep_time=2, transition_time=1)
+        with mock.patch('lively_lights.scenes.set_lights_multiple',
+                        fake.request):
+            scene.start(10)
+        self.assertEqual(fake.calls, [0, 2, 4, 6, 8])
+        self.assertEqual(scene.actual_duration, 10)
+        self.assertEqual(scene.drift, 0)
+
+    def test_pendulum(self):
+        fake = FakeClock()
+        scene = ScenePendulum(mock.Mock(), mock.Mock(), clock=fake.clock,
+                              lights1=[1], lights2=[2], sleep_time=1,
+                              transition_time=0.5)
+        with mock.patch('lively_lights.scenes.set_lights_multiple',
+                        fake.request):
+            scene.start(3)
+        self.assertEqual([round(call, 1) for call in fake.calls],
+                         [0, 0.3, 1, 1.3, 2, 2.3])
+        self.assertEqual(scene.actual_duration, 3)
+
+    def test_drift(self):
+        fake = FakeClock()
+        scene = ScenePendulum(mock.Mock(), mock.Mock(), clock=fake.clock,
+                              lights1=[1], lights2=[2], sleep_time=0.5,
+                              transition_time=0.1)
+        with mock.patch('lively_lights.scenes.set_lights_multiple',
+                        fake.request):
+            scene.start(2)
+        # Sending takes longer than sleep_time: the scene falls behind.
+        self.assertEqual(round(fake.calls[2], 1), 0.6)
+        self.assertEqual(round(scene.max_drift, 1), 0.4)
+
+
+class TestClassScenePause(unittest.TestCase):
+
+    def get_reachable_lights(self, seconds):
+        begin = time.time()
+        condition = mock.Mock()
+        condition.name = 'fake'
+        condition.check.side_effect = lambda now: \
+            (True, begin + seconds) if now < begin + seconds else (False, None)
+        reachable_lights = mock.Mock()
+        reachable_lights.conditions = ConditionEngine([condition])
+        reachable_lights.get_light_ids.return_value = [1]
+        return reachable_lights
+
+    def test_sequence_resumes_at_transition(self):
+        calls = []
+        begin = time.monotonic()
+        scene = SceneSequence(mock.Mock(), self.get_reachable_lights(0.1),
+                              sleep_time=0.2, transition_time=0.1)
+        with mock.patch('lively_lights.scenes.set_lights_multiple',
+                        lambda *args: calls.append(time.monotonic() - begin)):
+            scene.start(0.45)
+        self.assertEqual(len(calls), 2)
+        self.assertGreaterEqual(calls[0], 0.09)
+        self.assertAlmostEqual(calls[1] - calls[0], 0.2, delta=0.05)
+
+    def test_paused_until_end(self):
+        scene = SceneSequence(mock.Mock(), self.get_reachable_lights(60),
+                              sleep_time=0.2, transition_time=0.1)
+        with mock.patch('lively_lights.scenes.set_lights_multiple') as set_:
+            scene.start(0.1)
+        set_.assert_not_called()
+
+    def test_breath_restarts_on_resume(self):
+        calls = []
+        begin = time.monotonic()
+        reachable_lights = self.get_reachable_lights(0.1)
+        reachable_lights.refresh_interval = 60
+        reachable_lights.get_light_objects.return_value = [mock.Mock(
+            light_id=1)]
+        scene = SceneBreath(mock.Mock(), reachable_lights,
+                            time_range=(0.3, 0.4))
+        with mock.patch('lively_lights.scenes.set_light_multiple',
+                        lambda *args: calls.append(time.monotonic() - begin)):
+            scene.start(0.6)
+        # Dropped while paused, breathing again right after the transition.
+        self.assertEqual(len(calls), 1)
+        self.assertGreaterEqual(calls[0], 0.09)
+        self.assertLess(calls[0], 0.2)
+
+
+class TestClassSceneCompile(unittest.TestCase):
+
+    def test_sequence(self):
+        scene = SceneSequence(mock.Mock(), mock.Mock(), brightness=100,
+                              hue_sequence=(1, 2), sleep_time=2,
+                              transition_time=1)
+        timeline = scene.compile([1, 2], 5)
+        self.assertEqual(list(timeline), [
+            (0, (1, 2), {'hue': 1, 'bri': 100, 'transitiontime': 10,
+                         'sat': 255, 'on': True}),
+            (2, (1, 2), {'hue': 2, 'bri': 100, 'transitiontime': 10,
+                         'sat': 255, 'on': True}),
+            (4, (1, 2), {'hue': 1, 'bri': 100, 'transitiontime': 10,
+                         'sat': 255, 'on': True}),
+        ])
+        self.assertEqual(timeline.end, 5)
+
+    def test_pendulum(self):
+        scene = ScenePendulum(mock.Mock(), mock.Mock(), color1=1, color2=2,
+                              lights1=[1, 3], lights2=[2], sleep_time=2,
+                              transition_time=1)
+        events = [(t, light_ids, state['hue'])
+                  for t, light_ids, state in scene.compile([1, 2], 4)]
+        self.assertEqual(events, [
+            (0, (1, ), 1), (0, (2, ), 2), (2, (1, ), 2), (2, (2, ), 1),
+        ])
+
+    def test_breath(self):
+        scene = SceneBreath(mock.Mock(), mock.Mock(), time_range=(1, 2))
+        timeline = scene.compile([1, 2, 3], 60)
+        ends = {}
+        previous = 0
+        for t, light_ids, state in timeline:
+            self.assertGreaterEqual(t, previous)
+            previous = t
+            light_id, = light_ids
+            if light_id in ends:
+                self.assertAlmostEqual(ends[light_id], t)
+            ends[light_id] = t + state['transitiontime'] / 10 + 0.2
+        self.assertEqual(sorted(ends), [1, 2, 3])
+        for end in ends.values():
+            self.assertLessEqual(end, 60.01)
+        self.assertGreater(len(timeline), 3 * 30)
+
+    def test_breath_seed(self):
+        def compile(seed):
+            scene = SceneBreath(mock.Mock(), mock.Mock(), seed=seed)
+            return list(scene.compile([1, 2, 3], 60))
+        self.assertEqual(compile(1), compile(1))
+        self.assertNotEqual(compile(1), compile(2))
+
+    def test_timelines(self):
+        scene = SceneSequence(mock.Mock(), mock.Mock(), hue_sequence=(1, 2),
+                              sleep_time=1, transition_time=1)
+        timelines = scene.timelines([1], chunk_duration=2.5)
+        chunks = [next(timelines) for _ in range(3)]
+        self.assertEqual([(chunk.begin, chunk.end) for chunk in chunks],
+                         [(0, 2.5), (2.5, 5), (5, 7.5)])
+        self.assertEqual([[t for t, _, _ in chunk] for chunk in chunks],
+                         [[0, 1, 2], [3, 4], [5, 6, 7]])
+
+    def test_no_lights(self):
+        scene = ScenePendulum(mock.Mock(), mock.Mock(), lights1=[1],
+                              lights2=[2])
+        self.assertEqual(len(scene.compile([], 10)), 0)
+
+    @mock.patch('lively_lights.timeline.set_lights_multiple')
+    def test_no_events(self, set_lights_multiple):
+        scene = SceneTest(mock.Mock(), get_reachable_lights([1]),
+                          clock=FakeClock().clock, speed=1, color=2)
+        self.assertEqual(len(scene.compile([1], 10)), 0)
+        scene.play(10)
+        set_lights_multiple.assert_not_called()
+        self.assertEqual(scene.actual_duration, 10)
+
+    @mock.patch('lively_lights.timeline.set_lights_multiple')
+    def test_play(self, set_lights_multiple):
+        fake = FakeClock()
+        reachable_lights = get_reachable_lights([1, 2])
+        scene = SceneSequence(mock.Mock(), reachable_lights,
+                              clock=fake.clock, hue_sequence=(1, 2),
+                              sleep_time=2, transition_time=1)
+        scene.play(10)
+        self.assertEqual(set_lights_multiple.call_count, 5)
+        self.assertEqual(scene.actual_duration, 10)
+
+
+class TestClassSceneStop(unittest.TestCase):
+
+    def assertStops(self, scene):
+        thread = threading.Thread(target=scene.start)
+        begin = time.monotonic()
+        thread.start()
+        time.sleep(0.05)
+        scene.stop()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertLess(time.monotonic() - begin, 5)
+
+    @mock.patch('lively_lights.scenes.set_lights_multiple', mock.Mock())
+    def test_sequence(self):
+        self.assertStops(SceneSequence(mock.Mock(),
+                                       get_reachable_lights([1, 2]),
+                                       sleep_time=10, transition_time=1))
+
+    @mock.patch('lively_lights.scenes.set_light_multiple', mock.Mock())
+    def test_breath(self):
+        self.assertStops(SceneBreath(mock.Mock(),
+                                     get_reachable_lights([1, 2])))
+
+    @mock.patch('lively_lights.scenes.set_light_multiple', mock.Mock())
+    def test_breath_shared_scheduler(self):
+        scheduler = Scheduler()
+        scheduler.start()
+        self.assertStops(SceneBreath(mock.Mock(),
+                                     get_reachable_lights([1, 2]),
+                                     scheduler=scheduler))
+        scheduler.stop()
+
+    @mock.patch('lively_lights.scenes.set_lights_multiple', mock.Mock())
+    def test_launcher(self):
+        launcher = Launcher(mock.Mock(), get_reachable_lights([1, 2]),
+                            scene_configs=[{
+                                'scene_name': 'sequence',
+                                'duration': 60,
+                                'properties': {'sleep_time': 10},
+                            }])
+        thread = threading.Thread(target=launcher.launch,
+                                  kwargs={'endless': True})
+        thread.start()
+        time.sleep(0.05)
+        launcher.stop()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertIsNone(launcher.scene)
+
+    def test_set_properties(self):
+        scene = SceneSequence(mock.Mock(), get_reachable_lights([1, 2]),
+                              brightness=100)
+        scene.set_properties({'brightness': '200'})
+        self.assertEqual(scene.brightness, 200)
+        with self.assertRaises(ValueError):
+            scene.set_properties({'brightness': 300})
+        with self.assertRaises(ValueError):
+            scene.set_properties({'unknown': 1})
+        self.assertEqual(scene.brightness, 200)
+
+
 class TestClassSceneTimeOuts(unittest.TestCase):
 
     @mock.patch('lively_lights.scenes.set_light_multiple', mock.Mock())
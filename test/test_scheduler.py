@@ -0,0 +1,110 @@
+from lively_lights.scheduler import Clock, Scheduler
+import threading
+import time
+import unittest
+
+
+class TestClassScheduler(unittest.TestCase):
+
+    def test_order(self):
+        scheduler = Scheduler()
+        calls = []
+        now = scheduler.clock()
+        scheduler.call_at(now + 0.03, calls.append, 3)
+        scheduler.call_at(now + 0.01, calls.append, 1)
+        scheduler.call_at(now + 0.01, calls.append, 2)
+        scheduler.run()
+        self.assertEqual(calls, [1, 2, 3])
+        self.assertEqual(len(scheduler), 0)
+
+    def test_deadline(self):
+        scheduler = Scheduler()
+        calls = []
+        begin = scheduler.clock()
+        scheduler.call_later(0.05, lambda: calls.append(scheduler.clock()))
+        scheduler.run()
+        self.assertGreaterEqual(calls[0] - begin, 0.05)
+
+    def test_cancel(self):
+        scheduler = Scheduler()
+        calls = []
+        timer = scheduler.call_later(0, calls.append, 1)
+        timer.cancel()
+        self.assertEqual(len(scheduler), 0)
+        scheduler.run()
+        self.assertEqual(calls, [])
+
+    def test_until(self):
+        scheduler = Scheduler()
+        calls = []
+        scheduler.call_later(0, calls.append, 1)
+        scheduler.call_later(10, calls.append, 2)
+        begin = time.monotonic()
+        scheduler.run(until=scheduler.clock() + 0.05)
+        self.assertLess(time.monotonic() - begin, 1)
+        self.assertEqual(calls, [1])
+        self.assertEqual(len(scheduler), 1)
+
+    def test_reschedule(self):
+        scheduler = Scheduler()
+        calls = []
+
+        def tick(count):
+            calls.append(count)
+            if count < 3:
+                scheduler.call_later(0.01, tick, count + 1)
+
+        scheduler.call_later(0, tick, 1)
+        scheduler.run()
+        self.assertEqual(calls, [1, 2, 3])
+
+    def test_exception(self):
+        scheduler = Scheduler()
+        calls = []
+        scheduler.call_later(0, lambda: 1 / 0)
+        scheduler.call_later(0.01, calls.append, 1)
+        with self.assertLogs('lively_lights.scheduler'):
+            scheduler.run()
+        self.assertEqual(calls, [1])
+
+    def test_background_thread(self):
+        scheduler = Scheduler()
+        event = threading.Event()
+        scheduler.start()
+        self.assertTrue(scheduler.running)
+        scheduler.call_later(0.01, event.set)
+        self.assertTrue(event.wait(5))
+        scheduler.stop()
+        self.assertFalse(scheduler.running)
+
+    def test_stop_event(self):
+        scheduler = Scheduler()
+        stop = threading.Event()
+        scheduler.call_later(10, stop.set)
+        threading.Timer(0.05, lambda: (stop.set(), scheduler.wakeup())).start()
+        begin = time.monotonic()
+        scheduler.run(stop=stop)
+        self.assertLess(time.monotonic() - begin, 5)
+        self.assertEqual(len(scheduler), 1)
+
+
+class TestClassClock(unittest.TestCase):
+
+    def test_sleep_until_stop(self):
+        clock = Clock()
+        stop = threading.Event()
+        threading.Timer(0.05, stop.set).start()
+        begin = clock.now()
+        self.assertEqual(clock.sleep_until(begin + 10, stop), 0)
+        self.assertLess(clock.now() - begin, 5)
+
+    def test_wait_event_own_sleep_function(self):
+        now = [0]
+        clock = Clock(lambda: now[0], lambda seconds: now.__setitem__(
+            0, now[0] + seconds))
+        stop = threading.Event()
+        self.assertFalse(clock.wait_event(stop, 3))
+        self.assertEqual(now[0], 3)
+        stop.set()
+        self.assertTrue(clock.wait_event(stop, 3))
+        self.assertEqual(now[0], 3)
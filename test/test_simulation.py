@@ -0,0 +1,127 @@
+from lively_lights import simulation
+from lively_lights.cli import get_parser
+from lively_lights.scenes import Launcher, SceneBreath, SceneSequence
+from lively_lights.simulation import Command, SimulationEnd, VirtualClock
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+
+class TestClassVirtualClock(unittest.TestCase):
+
+    def test_sleep(self):
+        clock = VirtualClock()
+        begin = time.monotonic()
+        clock.sleep(3600)
+        self.assertEqual(clock.now(), 3600)
+        self.assertEqual(clock.sleep_until(3000), 600)
+        clock.sleep_until(7200)
+        self.assertEqual(clock.now(), 7200)
+        self.assertLess(time.monotonic() - begin, 1)
+
+    def test_limit(self):
+        clock = VirtualClock(limit=10)
+        with self.assertRaises(SimulationEnd):
+            clock.sleep(11)
+        self.assertEqual(clock.now(), 10)
+
+    def test_wait(self):
+        clock = VirtualClock()
+        condition = threading.Condition()
+        with condition:
+            clock.wait(condition, 5)
+            with self.assertRaises(SimulationEnd):
+                clock.wait(condition)
+        self.assertEqual(clock.now(), 5)
+
+
+class TestFunctionSimulate(unittest.TestCase):
+
+    def test_sequence(self):
+        def run(bridge, reachable_lights, clock):
+            SceneSequence(bridge, reachable_lights, clock=clock,
+                          hue_sequence=(1, 2), sleep_time=10,
+                          transition_time=1).start(3600)
+
+        begin = time.monotonic()
+        commands = simulation.simulate(run, [1, 2])
+        self.assertLess(time.monotonic() - begin, 5)
+        self.assertEqual(len(commands), 360)
+        self.assertEqual(commands[1].time, 10)
+        self.assertEqual(commands[1].kind, 'groups')
+        self.assertEqual(commands[1].light_ids, (1, 2))
+        self.assertEqual(commands[1].data['hue'], 2)
+
+    def test_breath_limit(self):
+        def run(bridge, reachable_lights, clock):
+            SceneBreath(bridge, reachable_lights, clock=clock,
+                        time_range=(1, 2)).start()
+
+        commands = simulation.simulate(run, [1, 2, 3], limit=600)
+        self.assertEqual({command.light_ids for command in commands},
+                         {(1, ), (2, ), (3, )})
+        self.assertGreater(len(commands), 3 * 300)
+        self.assertLess(commands[-1].time, 600)
+
+    def test_launcher_endless(self):
+        configs = [{
+            'scene_name': 'sequence',
+            'duration': 60,
+            'properties': {'hue_sequence': [1, 2], 'sleep_time': 1,
+                           'transition_time': 1},
+        }]
+
+        def run(bridge, reachable_lights, clock):
+            Launcher(bridge, reachable_lights, scene_configs=configs,
+                     clock=clock).launch(endless=True)
+
+        commands = simulation.simulate(run, limit=12 * 3600)
+        self.assertEqual(len(commands), 12 * 3600)
+
+
+class TestFunctionReport(unittest.TestCase):
+
+    def get_commands(self):
+        return [
+            Command(0.1, 'lights', (1, ), {}),
+            Command(0.2, 'groups', (1, 2), {}),
+            Command(0.3, 'groups', (1, 2), {}),
+            Command(2.5, 'lights', (2, ), {}),
+        ]
+
+    def test_rates(self):
+        self.assertEqual(simulation.rates(self.get_commands()),
+                         [(0, 1, 2), (1, 0, 0), (2, 1, 0)])
+        self.assertEqual(simulation.rates([]), [])
+
+    def test_report(self):
+        summary = simulation.report(self.get_commands())
+        self.assertEqual(summary['commands'], 4)
+        self.assertEqual(summary['seconds'], 3)
+        self.assertEqual(summary['max_group_commands_per_second'], 2)
+        self.assertEqual(summary['seconds_over_budget'], 1)
+
+    def test_write_log(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'log')
+            simulation.write_log([Command(1, 'groups', (1, 2),
+                                          {'hue': 1})], path)
+            with open(path) as log:
+                self.assertEqual(log.read(),
+                                 '1.000\tgroups\t1,2\t{"hue": 1}\n')
+
+
+class TestFunctionMain(unittest.TestCase):
+
+    def test_scene(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'log')
+            args = get_parser().parse_args([
+                '--dry-run', '100', '--dry-run-log', path, '-l', '1,2',
+                'scene', 'sequence', '-s', '5', '-t', '1',
+            ])
+            simulation.main(args)
+            with open(path) as log:
+                self.assertEqual(len(log.readlines()), 20)
@@ -0,0 +1,94 @@
+from _helper import FakeClock
+from lively_lights.store import LightStateStore
+import unittest
+
+
+class TestClassLightStateStore(unittest.TestCase):
+
+    def test_update(self):
+        store = LightStateStore()
+        state = {'on': True, 'bri': 254, 'hue': 65535, 'sat': 0,
+                 'xy': [0.4573, 0.41], 'ct': 366, 'effect': 'none',
+                 'alert': 'select', 'colormode': 'ct', 'reachable': False}
+        store.update(3, dict(state, mode='homeautomation'))
+        self.assertEqual(store.state(3), state)
+        self.assertEqual(store.get(3, 'hue'), 65535)
+        self.assertIs(store.get(3, 'on'), True)
+        self.assertEqual(store.stats()['overflow'], 0)
+
+    def test_unknown(self):
+        store = LightStateStore()
+        self.assertIsNone(store.get(1, 'bri'))
+        self.assertEqual(store.get(1, 'bri', 'x'), 'x')
+        self.assertNotIn(1, store)
+        store.set(1, 'on', False)
+        self.assertIn(1, store)
+        self.assertIsNone(store.get(1, 'bri'))
+        self.assertEqual(store.state(1), {'on': False})
+
+    def test_overflow(self):
+        store = LightStateStore()
+        store.set(1, 'bri', 127.5)
+        store.set(1, 'hue', 2 ** 70)
+        store.set(1, 'xy', (0.1, 0.2))
+        store.set(1, 'on', 1)
+        self.assertEqual(store.state(1), {'bri': 127.5, 'hue': 2 ** 70,
+                                          'xy': (0.1, 0.2), 'on': 1})
+        self.assertEqual(store.stats()['overflow'], 4)
+        store.set(1, 'bri', 127)
+        self.assertEqual(store.get(1, 'bri'), 127)
+        self.assertEqual(store.stats()['overflow'], 3)
+
+    def test_max_age(self):
+        clock = FakeClock(100.0)
+        store = LightStateStore(clock=clock)
+        store.set(1, 'bri', 10)
+        clock.now += 10
+        self.assertEqual(store.get(1, 'bri', max_age=11), 10)
+        self.assertIsNone(store.get(1, 'bri', max_age=10))
+        store.set(1, 'bri', 20, stamp=50)
+        self.assertIsNone(store.get(1, 'bri', max_age=10))
+
+    def test_discard(self):
+        store = LightStateStore()
+        for light_id in (1, 2, 3):
+            store.update(light_id, {'on': True, 'bri': 1})
+        store.discard([1, 4], ['bri', 'alert'])
+        self.assertEqual(store.state(1), {'on': True})
+        self.assertEqual(store.state(2), {'on': True, 'bri': 1})
+        store.discard()
+        self.assertEqual(store.state(2), {})
+        self.assertEqual(store.light_ids(), [1, 2, 3])
+
+    def test_fields(self):
+        store = LightStateStore(('on', 'bri'))
+        store.update(1, {'on': True, 'bri': 1, 'hue': 1})
+        self.assertEqual(store.state(1), {'on': True, 'bri': 1})
+        with self.assertRaises(ValueError):
+            LightStateStore(('on', 'brightness'))
+
+    def test_view(self):
+        store = LightStateStore()
+        light = store.view(2)
+        self.assertIsNone(light.bri)
+        light.bri = 100
+        light.xy = [0.1, 0.2]
+        self.assertEqual(store.get(2, 'bri'), 100)
+        self.assertEqual(light.xy, [0.1, 0.2])
+        with self.assertRaises(AttributeError):
+            light.brightness
+        with self.assertRaises(AttributeError):
+            light.brightness = 1
+
+    def test_stats(self):
+        store = LightStateStore()
+        for light_id in range(100):
+            store.update(light_id, {'on': True, 'bri': 1})
+        stats = store.stats()
+        self.assertEqual(stats['lights'], 100)
+        # The values and time stamps of ten fields.
+        self.assertLess(stats['bytes'], 100 * 120)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+from _helper import FakeClock
+from lively_lights.timeline import Timeline, TimelinePlayer
+from unittest import mock
+import unittest
+
+
+class TestClassTimeline(unittest.TestCase):
+
+    def test_append(self):
+        timeline = Timeline()
+        timeline.append(0, [1, 2], {'hue': 1, 'on': True})
+        timeline.append(1.5, (3, ), {'bri': 0, 'on': False})
+        timeline.append(2, (1, 2), {'transitiontime': 4})
+        self.assertEqual(len(timeline), 3)
+        self.assertEqual(list(timeline), [
+            (0, (1, 2), {'hue': 1, 'on': True}),
+            (1.5, (3, ), {'bri': 0, 'on': False}),
+            (2, (1, 2), {'transitiontime': 4}),
+        ])
+        self.assertEqual(timeline._target_ids, [(1, 2), (3, )])
+
+    def test_order(self):
+        timeline = Timeline()
+        timeline.append(1, [1], {'hue': 1})
+        with self.assertRaises(ValueError):
+            timeline.append(0, [1], {'hue': 1})
+
+    def test_unsupported_field(self):
+        with self.assertRaises(ValueError):
+            Timeline().append(0, [1], {'xy': [0.1, 0.2]})
+
+
+@mock.patch('lively_lights.timeline.set_lights_multiple')
+@mock.patch('lively_lights.timeline.set_light_multiple')
+class TestClassTimelinePlayer(unittest.TestCase):
+
+    def get_timeline(self):
+        timeline = Timeline(0, 3)
+        timeline.append(0, [1, 2], {'hue': 1})
+        timeline.append(1, [1], {'hue': 2})
+        timeline.append(2, [2], {'hue': 3})
+        return timeline
+
+    def test_play(self, set_light_multiple, set_lights_multiple):
+        fake = FakeClock()
+        player = TimelinePlayer('bridge', clock=fake.clock)
+        times = []
+        set_light_multiple.side_effect = lambda *args: times.append(fake.now)
+        player.play(self.get_timeline())
+        set_lights_multiple.assert_called_once_with('bridge', (1, 2),
+                                                    {'hue': 1})
+        self.assertEqual(set_light_multiple.call_args_list, [
+            mock.call('bridge', 1, {'hue': 2}),
+            mock.call('bridge', 2, {'hue': 3}),
+        ])
+        self.assertEqual(times, [1, 2])
+        self.assertEqual(fake.now, 3)
+        self.assertEqual(player.max_drift, 0)
+
+    def test_unreachable(self, set_light_multiple, set_lights_multiple):
+        reachable_lights = mock.Mock()
+        reachable_lights.is_reachable.side_effect = lambda light_id: \
+            light_id == 1
+        player = TimelinePlayer('bridge', reachable_lights,
+                                clock=FakeClock().clock)
+        player.play(self.get_timeline())
+        set_lights_multiple.assert_not_called()
+        self.assertEqual(set_light_multiple.call_args_list, [
+            mock.call('bridge', 1, {'hue': 1}),
+            mock.call('bridge', 1, {'hue': 2}),
+        ])
+
+    def test_play_chunks(self, set_light_multiple, set_lights_multiple):
+        fake = FakeClock()
+        first = Timeline(0, 1)
+        first.append(0, [1], {'hue': 1})
+        second = Timeline(1, 2)
+        second.append(1.5, [1], {'hue': 2})
+        TimelinePlayer('bridge', clock=fake.clock).play(iter([first, second]))
+        self.assertEqual(set_light_multiple.call_count, 2)
+        self.assertEqual(fake.now, 2)
@@ -0,0 +1,138 @@
+from lively_lights.environment import Weather
+from lively_lights.weather import JsonFileBackend, WeatherBackend, \
+    WeatherProvider
+from unittest import mock
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+
+class TestClassWeatherProvider(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.weather_file = self.write_weather(temperature=9.7,
+                                               wind_speed=4.6)
+        self.cache_file = os.path.join(self.directory.name, 'cache',
+                                       'weather.json')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_weather(self, **sample):
+        path = os.path.join(self.directory.name, 'weather.json')
+        with open(path, 'w') as weather_file:
+            json.dump(sample, weather_file)
+        return path
+
+    def get_provider(self, **kwargs):
+        return WeatherProvider(JsonFileBackend(self.weather_file),
+                               cache_file=self.cache_file, **kwargs)
+
+    def test_cached(self):
+        provider = self.get_provider()
+        with mock.patch.object(provider.backend, 'fetch',
+                               wraps=provider.backend.fetch) as fetch:
+            for _ in range(100):
+                self.assertEqual(provider.get_temperature(), 9.7)
+                self.assertEqual(provider.get_wind(), 4.6)
+        fetch.assert_called_once_with()
+        self.assertEqual(provider.sample()['wind_deg'], None)
+
+    def test_persisted(self):
+        self.get_provider().sample()
+        self.write_weather(temperature=20)
+        provider = self.get_provider()
+        with mock.patch.object(provider.backend, 'fetch') as fetch:
+            self.assertEqual(provider.get_temperature(), 9.7)
+        fetch.assert_not_called()
+        self.assertEqual(provider.stats()['loads'], 1)
+
+    def test_persisted_other_backend(self):
+        self.get_provider().sample()
+        provider = WeatherProvider(
+            JsonFileBackend(os.path.join(self.directory.name, 'other.json')),
+            cache_file=self.cache_file)
+        with self.assertLogs('lively_lights.weather'):
+            self.assertIsNone(provider.get_temperature())
+
+    def test_expired(self):
+        provider = self.get_provider(ttl=0.05)
+        self.assertEqual(provider.get_temperature(), 9.7)
+        self.write_weather(temperature=20)
+        time.sleep(0.06)
+        # The old sample while the new one is fetched in the background.
+        self.assertEqual(provider.get_temperature(), 9.7)
+        for _ in range(100):
+            if provider.get_temperature() == 20:
+                break
+            time.sleep(0.01)
+        self.assertEqual(provider.get_temperature(), 20)
+
+    def test_error_keeps_sample(self):
+        provider = self.get_provider()
+        provider.sample()
+        os.remove(self.weather_file)
+        with self.assertLogs('lively_lights.weather'):
+            self.assertFalse(provider.refresh())
+        self.assertEqual(provider.get_temperature(), 9.7)
+        self.assertEqual(provider.stats()['errors'], 1)
+
+    def test_concurrent_first_read(self):
+        provider = self.get_provider()
+        fetch = provider.backend.fetch
+        fetching = threading.Event()
+
+        def slow_fetch():
+            fetching.set()
+            time.sleep(0.1)
+            return fetch()
+
+        samples = []
+        with mock.patch.object(provider.backend, 'fetch',
+                               side_effect=slow_fetch):
+            thread = threading.Thread(
+                target=lambda: samples.append(provider.sample()))
+            thread.start()
+            self.assertTrue(fetching.wait(5))
+            samples.append(provider.sample())
+            thread.join()
+        self.assertEqual([sample['temperature'] for sample in samples],
+                         [9.7, 9.7])
+        self.assertEqual(provider.stats()['fetches'], 1)
+
+    def test_no_data(self):
+        provider = WeatherProvider(WeatherBackend())
+        self.assertIsNone(provider.get_temperature())
+        self.assertEqual(provider.stats()['fetches'], 0)
+
+    def test_start(self):
+        provider = self.get_provider(ttl=0.02)
+        provider.start()
+        time.sleep(0.1)
+        provider.stop()
+        self.assertGreater(provider.stats()['fetches'], 2)
+
+
+class TestClassWeather(unittest.TestCase):
+
+    def test_backend(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as json_file:
+            json.dump({'temperature': 9.7, 'wind_speed': 4.6}, json_file)
+            json_file.flush()
+            weather = Weather(backend=JsonFileBackend(json_file.name))
+            self.assertEqual(weather.get_temperature(), 9.7)
+            self.assertEqual(weather.get_wind(), 4.6)
+
+    def test_no_request_in_constructor(self):
+        with mock.patch('lively_lights.weather.OpenWeatherMapBackend.fetch') \
+                as fetch:
+            Weather('key', 49.455556, 11.078611)
+        fetch.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()